@@ -1,28 +1,110 @@
 import sqlite3
+import threading
 from pathlib import Path
 from contextlib import contextmanager
 import hashlib
 import json
 
+# Connection tuning applied to every pooled connection.
+# WAL lets the GUI thread (scheduler, play logs) read while the web thread writes.
+BUSY_TIMEOUT_SECONDS = 5.0
+CACHE_SIZE_KB = 16 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
 class DBManager:
     def __init__(self, db_path="data/led.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._pool = {}
+        self._pool_lock = threading.Lock()
+        self._change_listeners = []
         self.init_db()
         self.ensure_extra_schema()
 
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _get_connection(self):
+        """Return this thread's pooled connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        conn = self._connect()
+        self._local.conn = conn
+        ident = threading.get_ident()
+        with self._pool_lock:
+            alive = {t.ident for t in threading.enumerate()}
+            for tid in [tid for tid in self._pool if tid not in alive or tid == ident]:
+                try:
+                    self._pool.pop(tid).close()
+                except Exception:
+                    pass
+            self._pool[ident] = conn
+        return conn
+
+    def close_all(self):
+        """Close every pooled connection (used on shutdown)"""
+        with self._pool_lock:
+            conns = list(self._pool.values())
+            self._pool.clear()
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    def add_change_listener(self, callback):
+        """Register callback() to run (on the writing thread) after any commit that changed rows"""
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        try:
+            self._change_listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def _notify_change(self):
+        for callback in list(self._change_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"DB change listener failed: {e}")
+
+    def data_version(self):
+        """PRAGMA data_version of this thread's connection; changes when another connection commits"""
+        return self._get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def change_log_seq(self):
+        """Highest change_log id ever assigned (AUTOINCREMENT), 0 if none yet"""
+        row = self._get_connection().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'"
+        ).fetchone()
+        return row[0] if row else 0
+
     @contextmanager
     def get_cursor(self):
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        conn = self._get_connection()
+        changes_before = conn.total_changes
+        cursor = conn.cursor()
         try:
-            yield conn.cursor()
+            yield cursor
             conn.commit()
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            cursor.close()
+        if conn.total_changes != changes_before:
+            self._notify_change()
 
     def init_db(self):
         """Initialize database with schema if tables don't exist"""
@@ -52,6 +134,9 @@ class DBManager:
                     FOREIGN KEY (schedule_id) REFERENCES schedules(id)
                 )
             """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_play_logs_start_time ON play_logs(start_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_play_logs_media_start ON play_logs(media_id, start_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_play_logs_schedule ON play_logs(schedule_id)")
             # Ensure schedules has text style columns
             def has_column(table, column):
                 cur = conn.execute(f"PRAGMA table_info({table})")
@@ -87,6 +172,175 @@ class DBManager:
                 conn.execute("ALTER TABLE screen_config ADD COLUMN extended_scale_mode TEXT")
 
             conn.execute("INSERT OR IGNORE INTO screen_config (id) VALUES (1)")
+
+            if not has_column("media", "status"):
+                conn.execute("ALTER TABLE media ADD COLUMN status TEXT DEFAULT 'ready'")
+            if not has_column("media", "content_hash"):
+                conn.execute("ALTER TABLE media ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_media_content_hash ON media(content_hash)")
+            # Probed metadata (utils.media_probe) and preview proxy (utils.media_proxy);
+            # duration stays the image/text display time
+            for column, kind in (
+                ("duration_ms", "INTEGER"),
+                ("width", "INTEGER"),
+                ("height", "INTEGER"),
+                ("fps", "REAL"),
+                ("video_codec", "TEXT"),
+                ("audio_codec", "TEXT"),
+                ("bit_rate", "INTEGER"),
+                ("keyframe_interval", "REAL"),
+                ("probed_at", "DATETIME"),
+                ("proxy_path", "TEXT"),
+            ):
+                if not has_column("media", column):
+                    conn.execute(f"ALTER TABLE media ADD COLUMN {column} {kind}")
+
+            # Background media processing jobs (transcode, ...), see utils.media_jobs
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    media_id INTEGER,
+                    kind TEXT NOT NULL,
+                    status TEXT DEFAULT 'queued',
+                    priority INTEGER DEFAULT 0,
+                    progress REAL DEFAULT 0,
+                    src_path TEXT,
+                    error TEXT,
+                    created_at DATETIME,
+                    started_at DATETIME,
+                    finished_at DATETIME
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_media_jobs_status ON media_jobs(status)")
+
+            # Resumable chunked uploads, see utils.upload_sessions
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS upload_sessions (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT,
+                    media_type TEXT,
+                    priority INTEGER DEFAULT 0,
+                    total_size INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    status TEXT DEFAULT 'open',
+                    media_id INTEGER,
+                    created_at DATETIME,
+                    updated_at DATETIME
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS upload_chunks (
+                    session_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    start_offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    sha256 TEXT,
+                    PRIMARY KEY (session_id, idx)
+                )
+            """)
+
+            # Thumbnail cache index (utils.media_thumbs); last_access drives LRU eviction
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS thumb_cache (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT,
+                    bytes INTEGER DEFAULT 0,
+                    sprite_frames INTEGER,
+                    sprite_columns INTEGER,
+                    sprite_interval REAL,
+                    created_at DATETIME,
+                    last_access DATETIME
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_thumb_cache_access ON thumb_cache(last_access)")
+
+            # Camera-vs-output verification (utils.screen_health), kept alongside play_logs
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS screen_health_checks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    checked_at DATETIME,
+                    camera_id INTEGER,
+                    media_id INTEGER,
+                    schedule_id INTEGER,
+                    status TEXT,
+                    similarity REAL,
+                    camera_level REAL,
+                    output_level REAL,
+                    dead_cells INTEGER DEFAULT 0,
+                    dead_map TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_screen_health_checks_time ON screen_health_checks(checked_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS screen_health_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at DATETIME,
+                    ended_at DATETIME,
+                    camera_id INTEGER,
+                    media_id INTEGER,
+                    schedule_id INTEGER,
+                    min_similarity REAL,
+                    message TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_screen_health_alerts_start ON screen_health_alerts(started_at)")
+
+            # Play statistics aggregates, advanced from play_logs by database.play_stats
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS play_stats_daily (
+                    media_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    play_count INTEGER DEFAULT 0,
+                    total_seconds INTEGER DEFAULT 0,
+                    PRIMARY KEY (media_id, day)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_play_stats_daily_day ON play_stats_daily(day)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS play_stats_total (
+                    media_id INTEGER PRIMARY KEY,
+                    play_count INTEGER DEFAULT 0,
+                    total_seconds INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER DEFAULT 0
+                )
+            """)
+
+            # Change log consumed by the scheduler to update its in-memory index incrementally
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS change_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_id INTEGER
+                )
+            """)
+            for event, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_schedules_{event.lower()}
+                    AFTER {event} ON schedules
+                    BEGIN
+                        INSERT INTO change_log (table_name, row_id) VALUES ('schedules', {ref}.id);
+                    END
+                """)
+            for event, ref in (("UPDATE", "NEW"), ("DELETE", "OLD")):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_media_{event.lower()}
+                    AFTER {event} ON media
+                    BEGIN
+                        INSERT INTO change_log (table_name, row_id) VALUES ('media', {ref}.id);
+                    END
+                """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_screen_config_update
+                AFTER UPDATE ON screen_config
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id) VALUES ('screen_config', NEW.id);
+                END
+            """)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS camera_config (
                     id INTEGER PRIMARY KEY,
@@ -118,6 +372,17 @@ class DBManager:
             cursor.execute(sql, params)
             return cursor.lastrowid
 
+    def execute_many(self, sql, seq_of_params):
+        """Run one statement for many parameter rows inside a single transaction"""
+        with self.get_cursor() as cursor:
+            cursor.executemany(sql, seq_of_params)
+            return cursor.rowcount
+
+    def checkpoint(self):
+        """Fold the WAL back into the main database file (used for durable shutdown)"""
+        with self.get_cursor() as cursor:
+            cursor.execute("PRAGMA wal_checkpoint(FULL)")
+
     def fetch_all(self, sql, params=()):
         with self.get_cursor() as cursor:
             cursor.execute(sql, params)
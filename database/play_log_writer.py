@@ -0,0 +1,164 @@
+import atexit
+import threading
+import time
+
+from database.db_manager import db
+from database.play_stats import rollup_play_stats
+
+INSERT_SQL = """
+    INSERT INTO play_logs (media_id, schedule_id, start_time, end_time, duration_seconds)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+class PlayLogWriter:
+    """Buffers play-log rows in memory and writes them from a background thread.
+
+    Rows are flushed in a single transaction once max_batch rows are pending or
+    the oldest pending row is max_delay seconds old, so a media transition on the
+    GUI thread only appends to a list. Failed flushes keep their rows for retry.
+    """
+
+    def __init__(self, manager, max_batch=50, max_delay=5.0):
+        self.db = manager
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._flush_requested = False
+        self._flushed_gen = 0
+        self._stats = {
+            "flushed_rows": 0,
+            "flush_count": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None,
+            "last_error": None,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="PlayLogWriter", daemon=True)
+            self._thread.start()
+
+    def write(self, media_id, schedule_id, start_time, end_time, duration_seconds):
+        """Queue one play-log row; never blocks on the database"""
+        self.start()
+        with self._cond:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((media_id, schedule_id, start_time, end_time, duration_seconds))
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self, timeout=5.0):
+        """Ask the writer to flush now and wait until pending rows are written"""
+        with self._cond:
+            if not self._pending or not (self._thread and self._thread.is_alive()):
+                return not self._pending
+            target = self._flushed_gen + 1
+            self._flush_requested = True
+            self._cond.notify()
+            deadline = time.monotonic() + timeout
+            while self._flushed_gen < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._pending
+
+    def close(self, timeout=10.0):
+        """Flush everything, checkpoint the WAL and stop the thread (called from quit_app)"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread:
+            thread.join(timeout)
+        # Anything the thread could not write (e.g. it never started) goes out synchronously
+        if self._pending:
+            self._flush_once()
+        try:
+            self.db.checkpoint()
+        except Exception as e:
+            print(f"Play log checkpoint failed: {e}")
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data["queue_depth"] = len(self._pending)
+            data["oldest_pending_seconds"] = round(time.monotonic() - self._oldest, 3) if self._pending else 0
+        return data
+
+    def _due(self):
+        if not self._pending:
+            return False
+        if self._stopping or self._flush_requested or len(self._pending) >= self.max_batch:
+            return True
+        return time.monotonic() - self._oldest >= self.max_delay
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due() and not self._stopping:
+                    wait = None
+                    if self._pending:
+                        wait = max(0.0, self.max_delay - (time.monotonic() - self._oldest))
+                    self._cond.wait(wait)
+                stopping = self._stopping
+            self._flush_once()
+            with self._cond:
+                if stopping and not self._pending:
+                    return
+                if stopping and self._stats["failed_flushes"] and self._stats["last_error"]:
+                    # Give up retrying in a tight loop on shutdown; close() retries once more
+                    return
+
+    def _flush_once(self):
+        with self._cond:
+            rows = self._pending
+            self._pending = []
+            self._oldest = None
+            self._flush_requested = False
+        if not rows:
+            return
+        started = time.perf_counter()
+        try:
+            self.db.execute_many(INSERT_SQL, rows)
+        except Exception as e:
+            with self._cond:
+                # Put the rows back in front of anything queued meanwhile
+                self._pending = rows + self._pending
+                self._oldest = time.monotonic()
+                self._stats["failed_flushes"] += 1
+                self._stats["last_error"] = str(e)
+                self._flushed_gen += 1
+                self._cond.notify_all()
+            print(f"Failed to write play logs: {e}")
+            time.sleep(1.0)
+            return
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        with self._cond:
+            self._stats["flushed_rows"] += len(rows)
+            self._stats["flush_count"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"] or 0, elapsed_ms)
+            self._stats["last_error"] = None
+            self._flushed_gen += 1
+            self._cond.notify_all()
+        try:
+            rollup_play_stats(self.db)
+        except Exception as e:
+            # Aggregates catch up from their high-water mark on the next rollup
+            print(f"Failed to roll up play stats: {e}")
+
+
+# Global instance
+play_log_writer = PlayLogWriter(db)
+atexit.register(play_log_writer.close)
@@ -0,0 +1,61 @@
+from database.db_manager import db
+
+ROLLUP_NAME = "play_logs"
+
+
+def _read_marks(manager=db, cursor=None):
+    sql = """
+        SELECT COALESCE((SELECT last_id FROM rollup_state WHERE name = ?), 0) AS hwm,
+               COALESCE((SELECT MAX(id) FROM play_logs), 0) AS max_id
+    """
+    if cursor is None:
+        row = manager.fetch_one(sql, (ROLLUP_NAME,))
+    else:
+        cursor.execute(sql, (ROLLUP_NAME,))
+        row = cursor.fetchone()
+    return row["hwm"], row["max_id"]
+
+
+def rollup_play_stats(manager=db):
+    """Fold play_logs rows above the high-water mark into the aggregate tables.
+
+    play_stats_daily holds per media per day counts, play_stats_total the
+    all-time counts per media. Both are only ever advanced by the rows added
+    since the last rollup, so the cost is independent of history length.
+    Returns the number of play_logs rows folded in.
+    """
+    hwm, max_id = _read_marks(manager)
+    if max_id <= hwm:
+        return 0
+    with manager.get_cursor() as cursor:
+        # Take the write lock up front so concurrent rollups (writer thread, web
+        # requests) serialize instead of double counting or failing on upgrade
+        cursor.execute("BEGIN IMMEDIATE")
+        hwm, max_id = _read_marks(cursor=cursor)
+        if max_id <= hwm:
+            return 0
+        cursor.execute("""
+            INSERT INTO play_stats_daily (media_id, day, play_count, total_seconds)
+            SELECT media_id, substr(start_time, 1, 10), COUNT(*), COALESCE(SUM(duration_seconds), 0)
+            FROM play_logs
+            WHERE id > ? AND id <= ?
+            GROUP BY media_id, substr(start_time, 1, 10)
+            ON CONFLICT(media_id, day) DO UPDATE SET
+                play_count = play_count + excluded.play_count,
+                total_seconds = total_seconds + excluded.total_seconds
+        """, (hwm, max_id))
+        cursor.execute("""
+            INSERT INTO play_stats_total (media_id, play_count, total_seconds)
+            SELECT media_id, COUNT(*), COALESCE(SUM(duration_seconds), 0)
+            FROM play_logs
+            WHERE id > ? AND id <= ?
+            GROUP BY media_id
+            ON CONFLICT(media_id) DO UPDATE SET
+                play_count = play_count + excluded.play_count,
+                total_seconds = total_seconds + excluded.total_seconds
+        """, (hwm, max_id))
+        cursor.execute("""
+            INSERT INTO rollup_state (name, last_id) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id
+        """, (ROLLUP_NAME, max_id))
+        return max_id - hwm
@@ -23,15 +23,24 @@ if getattr(sys, 'frozen', False):
 import faulthandler
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QTabWidget, QSystemTrayIcon, QMenu, 
                              QMessageBox, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton, QSpinBox)
-from PyQt6.QtGui import QIcon, QAction, QPixmap
-from PyQt6.QtCore import Qt, QTimer, QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QIcon, QAction
+from PyQt6.QtCore import Qt, QTimer
 from web_server import start_web_server, restart_web_server
 from player.media_player import MediaPlayer
 from player.scheduler import Scheduler
 from player.output_window import OutputWindow
+from player.frame_capture import OutputFrameCapture
 from utils.config import config
-from utils.runtime_state import set_play_start, set_time, clear as clear_runtime, set_snapshot, current as runtime_current
+from utils.runtime_state import set_play_start, set_time, set_transition, clear as clear_runtime
 from database.db_manager import db
+from database.play_log_writer import play_log_writer
+from utils.command_bus import command_bus
+from utils.media_jobs import media_jobs
+from utils.media_probe import backfill_probes
+from utils.media_proxy import backfill_proxies
+from utils.upload_sessions import upload_sessions
+from utils.camera_capture import camera_capture
+from utils.screen_health import screen_health
 import json
 from pathlib import Path
 import socket
@@ -39,7 +48,6 @@ import traceback
 from datetime import datetime
 from utils.logger import logger as app_logger
 import vlc
-import subprocess
 
 LOG_DIR = Path("logs")
 LOG_FILE = LOG_DIR / "error.log"
@@ -307,6 +315,20 @@ class LEDController(QMainWindow):
         self.update_output_button_label()
 
     def init_services(self):
+        # Background media jobs (transcoding) run independently of the web requests
+        media_jobs.start()
+        backfill_probes()
+        backfill_proxies()
+        # Abandoned chunked uploads keep pre-sized files on disk until expired
+        self._expire_uploads()
+        self._upload_expire_timer = QTimer(self)
+        self._upload_expire_timer.timeout.connect(self._expire_uploads)
+        self._upload_expire_timer.start(3600 * 1000)
+        # Camera streams stay open; the web API serves their latest frame from memory
+        camera_capture.sync()
+        # Compares what the camera sees with the rendered output; idle without a camera
+        if config.get("screen_health.enabled", True):
+            screen_health.start()
         # Start Web Server
         port = config.get("server.port", 8080)
         start_web_server(port=port)
@@ -361,23 +383,29 @@ class LEDController(QMainWindow):
         
         # Connect signals
         self.scheduler.play_media.connect(self.on_play_media)
+        self.scheduler.prefetch_window.connect(self.player_widget.prefetch_window)
         self.scheduler.prefetch_media.connect(self.player_widget.prefetch_next)
         self.player_widget.time_updated.connect(self.scheduler.on_time_tick)
         self.player_widget.media_finished.connect(self.scheduler.on_media_finished)
         self.player_widget.time_updated.connect(self.on_time_updated)
+        self.player_widget.transition_timed.connect(set_transition)
         self.scheduler.stop_requested.connect(self.player_widget.stop)
         
         # Initial check
         self.scheduler.check_schedule()
         self.update_output_button_label()
         
-        self._cmd_timer = QTimer(self)
-        self._cmd_timer.timeout.connect(self._check_commands)
-        self._cmd_timer.start(200)
+        # Commands from the web API are pushed onto this thread as they arrive
+        command_bus.register("OUTPUT_SET", self._handle_output_set)
+        command_bus.register("OUTPUT_TEST_COLOR", self._handle_test_color)
+        for name in ("FORCE_PLAY", "STOP_ALL", "START_ALL"):
+            command_bus.register(name, lambda data, name=name: self.scheduler.handle_command(name, data))
+        command_bus.attach_qt()
 
-        self._snapshot_timer = QTimer(self)
-        self._snapshot_timer.timeout.connect(self.capture_output_snapshot)
-        self._snapshot_timer.start(1000)
+        # Snapshot of the rendered output for the web dashboard (on demand, encoded off the GUI thread)
+        self.frame_capture = OutputFrameCapture(lambda: (self.output_window, getattr(self, "player_widget", None)), self)
+        command_bus.register("PREVIEW_DEMAND", lambda data: self.frame_capture.wake())
+        self.frame_capture.start()
 
         self._heartbeat_timer = QTimer(self)
         self._heartbeat_timer.timeout.connect(self._log_heartbeat)
@@ -411,13 +439,8 @@ class LEDController(QMainWindow):
         except Exception:
             pass
         try:
-            if hasattr(self, "_snapshot_timer") and self._snapshot_timer:
-                self._snapshot_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "_cmd_timer") and self._cmd_timer:
-                self._cmd_timer.stop()
+            if hasattr(self, "frame_capture") and self.frame_capture:
+                self.frame_capture.stop()
         except Exception:
             pass
         try:
@@ -435,12 +458,35 @@ class LEDController(QMainWindow):
                     w.close()
             except Exception:
                 pass
+        try:
+            media_jobs.stop()
+        except Exception:
+            pass
+        try:
+            screen_health.stop()
+            camera_capture.stop_all()
+        except Exception:
+            pass
+        try:
+            play_log_writer.close()
+        except Exception:
+            pass
+        try:
+            db.close_all()
+        except Exception:
+            pass
         QApplication.quit()
         
     def closeEvent(self, event):
         self.quit_app()
         event.accept()
 
+    def _expire_uploads(self):
+        try:
+            upload_sessions.expire()
+        except Exception as e:
+            app_logger.error("Upload session cleanup failed: %s", e)
+
     def _log_heartbeat(self):
         self._heartbeat_counter += 1
         try:
@@ -468,58 +514,49 @@ class LEDController(QMainWindow):
         except Exception:
             pass
     
-    def _check_commands(self):
-        from utils.command_bus import command_bus
-        cmd = command_bus.get()
-        if not cmd:
-            return
-        name = cmd.get("command")
-        data = cmd.get("data")
-        if name == "OUTPUT_SET":
-            mode = (data or {}).get("mode") or "specified"
-            targets = (data or {}).get("targets") or []
-            scale_mode = (data or {}).get("scale_mode")
-            if mode == "specified":
-                idx = targets[0] if targets else config.get("player.target_screen_index", 1)
-                config.set("player.target_screen_index", idx)
-                if self.output_window:
-                    return
-                self.setup_output_window(idx)
-            elif mode == "sync":
-                indices = targets if targets else [config.get("player.target_screen_index", 1)]
-                self.setup_output_windows(indices)
-            elif mode == "extended":
-                indices = targets if targets else [config.get("player.target_screen_index", 1)]
-                self.setup_extended_output(indices)
-                if scale_mode:
-                    self.player_widget.set_extended_scale_mode(scale_mode)
-            elif mode == "off":
-                if self.output_window:
-                    try:
-                        for w in self.output_windows:
-                            w.close()
-                    except Exception:
-                        pass
-                self.output_windows = []
-                self.output_window = None
-                self.player_widget.set_output_windows([])
-                self.player_widget.set_extended_active(False)
-                self.update_output_button_label()
-        elif name == "OUTPUT_TEST_COLOR":
-            color = (data or {}).get("color") or "#FF0000"
-            targets = (data or {}).get("targets") or []
-            if targets:
-                self.setup_output_windows(targets)
-            for w in self.output_windows:
+    def _handle_output_set(self, data):
+        mode = (data or {}).get("mode") or "specified"
+        targets = (data or {}).get("targets") or []
+        scale_mode = (data or {}).get("scale_mode")
+        if mode == "specified":
+            idx = targets[0] if targets else config.get("player.target_screen_index", 1)
+            config.set("player.target_screen_index", idx)
+            if self.output_window:
+                return {"mode": mode, "applied": False}
+            self.setup_output_window(idx)
+        elif mode == "sync":
+            indices = targets if targets else [config.get("player.target_screen_index", 1)]
+            self.setup_output_windows(indices)
+        elif mode == "extended":
+            indices = targets if targets else [config.get("player.target_screen_index", 1)]
+            self.setup_extended_output(indices)
+            if scale_mode:
+                self.player_widget.set_extended_scale_mode(scale_mode)
+        elif mode == "off":
+            if self.output_window:
                 try:
-                    w.show_fill_color(color)
+                    for w in self.output_windows:
+                        w.close()
                 except Exception:
                     pass
-        elif name in ("FORCE_PLAY", "STOP_ALL", "START_ALL"):
+            self.output_windows = []
+            self.output_window = None
+            self.player_widget.set_output_windows([])
+            self.player_widget.set_extended_active(False)
+            self.update_output_button_label()
+        return {"mode": mode, "applied": True}
+
+    def _handle_test_color(self, data):
+        color = (data or {}).get("color") or "#FF0000"
+        targets = (data or {}).get("targets") or []
+        if targets:
+            self.setup_output_windows(targets)
+        for w in self.output_windows:
             try:
-                command_bus.send(name, data)
+                w.show_fill_color(color)
             except Exception:
                 pass
+        return {"color": color, "windows": len(self.output_windows)}
     
     def on_time_updated(self, elapsed, total):
         self.update_time_labels(elapsed, total)
@@ -545,120 +582,6 @@ class LEDController(QMainWindow):
         except Exception:
             pass
 
-    def capture_output_snapshot(self):
-        try:
-            if not hasattr(self, "player_widget"):
-                return
-            player = self.player_widget
-            if not self.output_window and not getattr(player, "extended_active", False):
-                set_snapshot(None)
-                return
-            try:
-                if getattr(player, "text_mode", False):
-                    pix = None
-                    if self.output_window:
-                        try:
-                            pix = self.output_window.grab()
-                        except Exception as e:
-                            pix = None
-                            try:
-                                app_logger.error("snapshot grab output_window failed: %s", e)
-                            except Exception:
-                                pass
-                    if (pix is None or pix.isNull()) and hasattr(player, "preview_text") and player.preview_text.isVisible():
-                        try:
-                            pix = player.preview_text.grab()
-                        except Exception as e:
-                            pix = None
-                            try:
-                                app_logger.error("snapshot grab preview_text failed: %s", e)
-                            except Exception:
-                                pass
-                    if pix is None or pix.isNull():
-                        set_snapshot(None)
-                        return
-                else:
-                    media_path = runtime_current.get("path")
-                    media_type = runtime_current.get("media_type")
-                    if not media_path:
-                        set_snapshot(None)
-                        return
-                    p = Path(media_path)
-                    if not p.exists():
-                        set_snapshot(None)
-                        return
-                    suffix = p.suffix.lower()
-                    if media_type == "image" or suffix in (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"):
-                        pix = QPixmap(str(p))
-                        if pix.isNull():
-                            set_snapshot(None)
-                            return
-                    else:
-                        tmp_dir = Path("resources") / "tmp"
-                        try:
-                            tmp_dir.mkdir(parents=True, exist_ok=True)
-                        except Exception:
-                            pass
-                        tmp_path = tmp_dir / "snapshot_ffmpeg.jpg"
-                        try:
-                            tmp_path.unlink(missing_ok=True)
-                        except Exception:
-                            pass
-                        elapsed = runtime_current.get("elapsed") or 0
-                        cmd = ["ffmpeg", "-y", "-loglevel", "error"]
-                        if elapsed and elapsed > 1:
-                            cmd += ["-ss", str(max(0, int(elapsed) - 1))]
-                        cmd += ["-i", str(p), "-frames:v", "1", "-q:v", "5", str(tmp_path)]
-                        
-                        startupinfo = None
-                        if hasattr(subprocess, 'STARTUPINFO'):
-                            startupinfo = subprocess.STARTUPINFO()
-                            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-                        try:
-                            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5, startupinfo=startupinfo)
-                            if result.returncode != 0 or not tmp_path.exists():
-                                set_snapshot(None)
-                                return
-                        except Exception as e:
-                            try:
-                                app_logger.error("snapshot ffmpeg failed: %s", e)
-                            except Exception:
-                                pass
-                            set_snapshot(None)
-                            return
-                        try:
-                            data = tmp_path.read_bytes()
-                        except Exception as e:
-                            try:
-                                app_logger.error("snapshot ffmpeg read failed: %s", e)
-                            except Exception:
-                                pass
-                            set_snapshot(None)
-                            return
-                        try:
-                            tmp_path.unlink(missing_ok=True)
-                        except Exception:
-                            pass
-                        set_snapshot(data)
-                        return
-                image = pix.toImage()
-                ba = QByteArray()
-                buf = QBuffer(ba)
-                if not buf.open(QIODevice.OpenModeFlag.WriteOnly):
-                    return
-                image.save(buf, "JPEG", 80)
-                buf.close()
-                set_snapshot(bytes(ba))
-            except Exception as e:
-                try:
-                    app_logger.error("snapshot unexpected exception: %s", e)
-                except Exception:
-                    pass
-                return
-        except Exception:
-            pass
-
     def _get_remote_manage_text(self, port: int) -> str:
         ip = self._get_local_ip()
         return f"http://{ip}:{port}"
@@ -0,0 +1,184 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, QTimer, Qt, QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QImage
+
+from utils.config import config
+from utils.logger import logger
+from utils.preview_hls import hls_preview
+from utils.runtime_state import set_snapshot, set_snapshot_capturing, snapshot_demand_age, snapshot_stream_age
+
+# Frames are compared on a tiny RGB thumbnail before paying for a JPEG encode
+SIGNATURE_WIDTH = 32
+SIGNATURE_HEIGHT = 18
+
+
+def encode_jpeg(image, max_width, quality):
+    """Downscale and JPEG-encode a QImage; safe off the GUI thread (QImage, not QPixmap)"""
+    if image.width() > max_width:
+        image = image.scaledToWidth(max_width, Qt.TransformationMode.SmoothTransformation)
+    ba = QByteArray()
+    buf = QBuffer(ba)
+    if not buf.open(QIODevice.OpenModeFlag.WriteOnly):
+        return None
+    image.save(buf, "JPEG", quality)
+    buf.close()
+    return bytes(ba)
+
+
+def frame_signature(image):
+    """32x18 RGB thumbnail of a frame; smooth scaling averages away single-pixel noise"""
+    small = image.scaled(
+        SIGNATURE_WIDTH, SIGNATURE_HEIGHT,
+        Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation,
+    ).convertToFormat(QImage.Format.Format_RGB888)
+    return small.constBits().asstring(small.sizeInBytes())
+
+
+def frames_differ(a, b, threshold):
+    """True if any thumbnail channel moved by more than threshold (0-255)"""
+    if a is None or b is None or len(a) != len(b):
+        return True
+    return any(abs(x - y) > threshold for x, y in zip(a, b))
+
+
+class OutputFrameCapture(QObject):
+    """Snapshot of the rendered output, produced only while someone is watching.
+
+    Capture is idle (no timer) until a preview endpoint asks for it with
+    wake(), and goes idle again once no client has asked for
+    preview.snapshot_demand_seconds (or the HLS preview has lost its viewers).
+    While a live stream viewer is connected the tick rate rises to
+    preview.stream_fps; while the HLS preview is watched every grab is also
+    handed to its encoder. The grab itself (framebuffer readback) has to
+    happen on the GUI thread and is cheap; the change check, scaling and JPEG
+    encoding run on a single worker thread. Frames that look the same as the
+    last published one are not encoded, so the snapshot (and its ETag) stays
+    put. If the worker is still busy the snapshot is skipped, so a slow encode
+    never queues up work or stalls playback.
+    """
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        # source() -> (output_window or None, media player widget)
+        self.source = source
+        self.max_width = int(config.get("preview.snapshot_width", 640) or 640)
+        self.quality = int(config.get("preview.snapshot_quality", 75) or 75)
+        self.interval_ms = int(config.get("preview.snapshot_interval_ms", 1000) or 1000)
+        self.stream_interval_ms = max(1, int(1000 / float(config.get("preview.stream_fps", 5) or 5)))
+        self.demand_seconds = float(config.get("preview.snapshot_demand_seconds", 5) or 5)
+        self.change_threshold = int(config.get("preview.snapshot_change_threshold", 4) or 4)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SnapshotEncode")
+        self._pending = None
+        self._signature = None
+        self._snapshot_due = 0.0
+        self._enabled = False
+        self.last_grab_ms = 0.0
+        self.last_encode_ms = 0.0
+        self.frames_skipped = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.capture)
+
+    def start(self):
+        """Enable capture; it still only runs while there is demand"""
+        self._enabled = True
+        self.wake()
+
+    def stop(self):
+        self._enabled = False
+        self._sleep()
+        hls_preview.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def wake(self):
+        """A client asked for preview frames (GUI thread, via the command bus)"""
+        if not self._enabled or self.timer.isActive():
+            return
+        if not self._snapshot_wanted() and not hls_preview.wanted():
+            return
+        set_snapshot_capturing(True)
+        self.timer.start(self._wanted_interval())
+        self.capture()
+
+    def _snapshot_wanted(self):
+        return snapshot_demand_age() <= self.demand_seconds
+
+    def _snapshot_interval(self):
+        if snapshot_stream_age() <= self.demand_seconds:
+            return min(self.stream_interval_ms, self.interval_ms)
+        return self.interval_ms
+
+    def _wanted_interval(self):
+        intervals = []
+        if self._snapshot_wanted():
+            intervals.append(self._snapshot_interval())
+        if hls_preview.wanted():
+            intervals.append(hls_preview.interval_ms)
+        return min(intervals) if intervals else self.interval_ms
+
+    def _sleep(self):
+        self.timer.stop()
+        set_snapshot_capturing(False)
+
+    def grab(self):
+        """Current output as a QImage (GUI thread), or None when nothing is shown"""
+        output_window, player = self.source()
+        if output_window is not None:
+            image = output_window.grab_frame()
+            return None if image.isNull() else image
+        # No output window: only the local text preview can be shown
+        preview = getattr(player, "preview_text", None)
+        if preview is not None and getattr(player, "text_mode", False) and preview.isVisible():
+            return preview.grab().toImage()
+        return None
+
+    def capture(self):
+        snapshot_wanted = self._snapshot_wanted()
+        hls_wanted = hls_preview.wanted()
+        if not snapshot_wanted and not hls_wanted:
+            self._sleep()
+            return
+        interval = self._wanted_interval()
+        if self.timer.interval() != interval:
+            self.timer.setInterval(interval)
+        # The HLS encoder ticks faster than snapshots are needed; encode JPEGs at their own rate
+        now = time.monotonic()
+        snapshot_due = (
+            snapshot_wanted and now >= self._snapshot_due
+            and (self._pending is None or self._pending.done())
+        )
+        if not snapshot_due and not hls_wanted:
+            return
+        try:
+            started = time.perf_counter()
+            image = self.grab()
+            self.last_grab_ms = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            logger.error("snapshot grab failed: %s", e)
+            image = None
+        if hls_wanted:
+            hls_preview.push(image)
+        if not snapshot_due:
+            return
+        self._snapshot_due = now + self._snapshot_interval() / 1000 - 0.005
+        if image is None:
+            self._signature = None
+            set_snapshot(None)
+            return
+        self._pending = self._executor.submit(self._encode, image)
+
+    def _encode(self, image):
+        started = time.perf_counter()
+        try:
+            signature = frame_signature(image)
+            if not frames_differ(signature, self._signature, self.change_threshold):
+                self.frames_skipped += 1
+                return
+            data = encode_jpeg(image, self.max_width, self.quality)
+        except Exception as e:
+            logger.error("snapshot encode failed: %s", e)
+            return
+        self.last_encode_ms = (time.perf_counter() - started) * 1000
+        self._signature = signature
+        set_snapshot(data)
@@ -1,15 +1,17 @@
 import sys
+import time
 import vlc
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QFrame, QLabel
 from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QUrl
 from pathlib import Path
-from PyQt6.QtGui import QFont, QColor
+from PyQt6.QtGui import QFont, QColor, QImageReader
 from utils.config import config
 
 class MediaPlayer(QWidget):
     # Signals
     media_finished = pyqtSignal()
     time_updated = pyqtSignal(int, int)  # elapsed, total
+    transition_timed = pyqtSignal(dict)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -33,6 +35,14 @@ class MediaPlayer(QWidget):
         self.current_duration = 0
         self.elapsed_seconds = 0
         self.text_mode = False
+        # Video length from the ingest probe; when known, QML is not polled for it
+        self.known_duration = None
+        # Pre-roll result of the prefetched item: (url, type, ok, load ms) or None while loading
+        self.next_prepared = None
+        # Monotonic time the current item started on the output; None until it has
+        self._started_at = time.monotonic()
+        # (url, monotonic start) of the last item the output reported as started
+        self._output_started = None
         self._disposed = False
         
         self.init_ui()
@@ -73,6 +83,9 @@ class MediaPlayer(QWidget):
         if self.output_window:
             try:
                 self.output_window.media_finished.disconnect(self._on_output_media_finished)
+                self.output_window.media_started.disconnect(self._on_output_media_started)
+                self.output_window.next_prepared.disconnect(self._on_output_next_prepared)
+                self.output_window.transition_timed.disconnect(self._on_output_transition_timed)
             except:
                 pass
                 
@@ -81,6 +94,9 @@ class MediaPlayer(QWidget):
         
         if self.output_window:
             self.output_window.media_finished.connect(self._on_output_media_finished)
+            self.output_window.media_started.connect(self._on_output_media_started)
+            self.output_window.next_prepared.connect(self._on_output_next_prepared)
+            self.output_window.transition_timed.connect(self._on_output_transition_timed)
             
             # Connect resize for aspect ratio?
             if hasattr(self.output_window, "resized"):
@@ -113,6 +129,43 @@ class MediaPlayer(QWidget):
         self.current_output_url = url
         self.media_finished.emit()
 
+    def _on_output_media_started(self, url, type, started_ms):
+        # QML reports wall-clock milliseconds; convert to our monotonic clock
+        started = time.monotonic() - max(0.0, time.time() - started_ms / 1000.0)
+        self._output_started = (url, started)
+        if self._started_at is None:
+            self._started_at = started
+
+    def _on_output_next_prepared(self, url, type, ok, load_ms):
+        # The inactive buffer holds the first frame (video) or the decoded image
+        self.next_prepared = (url, type, ok, load_ms)
+        if ok:
+            print(f"[MediaPlayer] Next {type} ready in {load_ms} ms")
+        else:
+            print(f"[MediaPlayer] Next {type} failed to load: {url}")
+
+    def _on_output_transition_timed(self, url, type, started_ms, finished_ms, late_ms, gap_ms, startup_ms):
+        # Times are epoch milliseconds taken in QML; late is measured against the planned
+        # fade point, gap is how long the outgoing last frame stood still
+        info = {
+            "type": type,
+            "started_at": started_ms / 1000.0,
+            "finished_at": finished_ms / 1000.0,
+            "fade_ms": int(finished_ms - started_ms),
+            "late_ms": late_ms,
+            "gap_ms": gap_ms,
+            "startup_ms": startup_ms if startup_ms >= 0 else None,
+        }
+        print(f"[MediaPlayer] Transition to {type}: late {late_ms} ms, gap {gap_ms} ms, fade {info['fade_ms']} ms")
+        self.transition_timed.emit(info)
+
+    @staticmethod
+    def _output_duration_ms(media_type, duration, media_duration):
+        # Videos run to their real end; QML plans the fade from the probed length
+        if media_type == "video":
+            return int((media_duration or 0) * 1000)
+        return (duration or 10) * 1000
+
     def play_media(self, payload):
         file_path = payload.get("path")
         duration = payload.get("duration")
@@ -178,17 +231,28 @@ class MediaPlayer(QWidget):
                     if str(Path(curr_path).resolve()) == str(path_obj.resolve()):
                         should_force = False
             
-            dur_ms = (duration or 10) * 1000
+            dur_ms = self._output_duration_ms(media_type, duration, payload.get("media_duration"))
             
             if should_force:
                 print(f"[MediaPlayer] Force playing {media_type}")
+                # The clock starts when the output reports the item running, not at load
+                self._started_at = None
+                self._output_started = None
                 self.output_window.force_play(req_url, media_type, dur_ms, text_color, bg_color, text_size, scroll_mode)
                 self.current_output_url = req_url
             else:
                 print(f"[MediaPlayer] Skipping force_play (Already playing)")
+                # Started at the beginning of the crossfade, before this call
+                if self._output_started and self._output_started[0] == self.current_output_url:
+                    self._started_at = self._output_started[1]
+                else:
+                    self._started_at = time.monotonic()
+        else:
+            self._started_at = time.monotonic()
 
         # Reset timers
-        self.current_duration = duration if duration else 10
+        self.known_duration = payload.get("media_duration")
+        self.current_duration = self.known_duration or (duration if duration else 10)
         self.elapsed_seconds = 0
         self.time_updated.emit(0, self.current_duration)
 
@@ -213,10 +277,48 @@ class MediaPlayer(QWidget):
                 except:
                     pass
             
-            dur_ms = (duration or 10) * 1000
+            dur_ms = self._output_duration_ms(media_type, duration, payload.get("media_duration"))
             print(f"[MediaPlayer] Prefetching {media_type}")
+            self.next_prepared = None
             self.output_window.prepare_next(content_or_path, media_type, dur_ms, text_color, bg_color, text_size, scroll_mode)
 
+    def prefetch_window(self, payloads):
+        """Keep the upcoming images and texts preloaded in the output.
+
+        Entries are taken nearest first until player.prefetch_memory_mb of
+        decoded pixels is reached; the rest waits for a later window. Videos
+        are not pooled, only the next one is pre-rolled by prefetch_next.
+        """
+        if not self.output_window:
+            return
+        budget = float(config.get("player.prefetch_memory_mb", 192) or 192) * 1024 * 1024
+        used = 0
+        entries = []
+        for payload in payloads or []:
+            path = payload.get("path")
+            media_type = payload.get("type")
+            if not path or media_type not in ("image", "text"):
+                continue
+            if media_type == "image":
+                size = QImageReader(str(path)).size()
+                if not size.isValid():
+                    continue
+                # RGBA texture plus its mipmap chain
+                cost = size.width() * size.height() * 4 * 4 // 3
+                content = str(Path(path).resolve())
+            else:
+                try:
+                    content = Path(path).read_text(encoding="utf-8")
+                except Exception:
+                    continue
+                # Rough allowance for the laid-out glyph runs
+                cost = len(content.encode("utf-8")) * 64
+            if used + cost > budget:
+                break
+            used += cost
+            entries.append({"url": content, "type": media_type, "text_size": payload.get("text_size") or 0})
+        self.output_window.set_preload(entries)
+
     def _handle_text_play(self, payload):
         pass # Deprecated, logic moved to play_media
 
@@ -234,7 +336,15 @@ class MediaPlayer(QWidget):
             return
 
         # Video/Image mode
-        if self.output_window:
+        if self.output_window and self.known_duration:
+            # Length is known from the probe; elapsed time comes from our own clock
+            if self._started_at is None:
+                self.elapsed_seconds = 0
+            else:
+                self.elapsed_seconds = min(time.monotonic() - self._started_at, self.known_duration)
+            self.time_updated.emit(int(self.elapsed_seconds), int(self.current_duration))
+            self.output_window.update_time(int(self.elapsed_seconds), int(self.current_duration))
+        elif self.output_window:
             pos, dur = self.output_window.get_time_info()
             if dur > 0:
                 self.elapsed_seconds = pos / 1000.0
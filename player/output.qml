@@ -15,7 +15,27 @@ Item {
     property bool activeIsA: true
     property bool isFading: false
     property bool nextReady: false
+    // Pre-roll of the inactive buffer finished (first frame decoded, or failed)
+    property bool nextLoaded: false
+    property bool fadePending: false
+    property double prepareStartedMs: 0
     property int fadeMs: 800
+    // Known video lengths from the ingest probe (0 = unknown, use the player's own duration)
+    property int currentVideoMs: 0
+    property int nextVideoMs: 0
+    // Wall-clock start of the current item (images/text) and the fade point was reached
+    property double currentStartedMs: 0
+    property bool fadeDue: false
+    // Timing of the transition in progress, reported through transitionTimed()
+    property double transitionStartedMs: 0
+    property int transitionLateMs: 0
+    property int transitionGapMs: 0
+    property int transitionStartupMs: -1
+    // Videos report mediaStarted once their position first advances (playbackState turns
+    // Playing before anything is decoded); startPending is the active, nextStartPending
+    // the incoming player during a fade
+    property bool startPending: false
+    property bool nextStartPending: false
     property int imageDurationMs: 10000
     property int nextDurationMs: 10000
     property string currentScrollMode: "static"
@@ -26,6 +46,9 @@ Item {
     signal mediaInfo(string msg)
     signal transitionStarted()
     signal transitionFinished()
+    signal nextPrepared(string url, string type, bool ok, int loadMs)
+    signal mediaStarted(string url, string type, double startedMs)
+    signal transitionTimed(string url, string type, double startedMs, double finishedMs, int lateMs, int gapMs, int startupMs)
 
     property int videoPosition: activeIsA ? playerA.position : playerB.position
     property int videoDuration: activeIsA ? playerA.duration : playerB.duration
@@ -40,13 +63,129 @@ Item {
         return mm + ":" + sss
     }
 
+    // Video position at which the fade has to start so it ends with the last frame;
+    // short clips keep at least their first half on screen. -1 if the length is unknown.
+    function fadeTargetMs(player, knownMs) {
+        var total = player.duration > 0 ? player.duration : knownMs
+        if (total <= 0) return -1
+        return Math.max(Math.round(total / 2), total - root.fadeMs)
+    }
+
+    // (Re)arm fadeTimer for the active video from its position; called whenever playback
+    // starts, stops or the duration becomes known
+    function armFadeTimer() {
+        fadeTimer.stop()
+        if (root.currentType !== "video" || root.isFading || root.fadeDue) return
+        var player = root.activeIsA ? playerA : playerB
+        if (player.playbackState !== MediaPlayer.PlayingState) return
+        var target = fadeTargetMs(player, root.currentVideoMs)
+        if (target < 0) return
+        var remaining = target - player.position
+        // Wake a little early on long waits and correct against the position again
+        fadeTimer.interval = Math.max(1, remaining > 250 ? remaining - 100 : remaining)
+        fadeTimer.start()
+    }
+
+    function onFadeTimer() {
+        if (root.currentType !== "video" || root.isFading) return
+        var player = root.activeIsA ? playerA : playerB
+        var target = fadeTargetMs(player, root.currentVideoMs)
+        if (target >= 0 && target - player.position > 15 && player.playbackState === MediaPlayer.PlayingState) {
+            armFadeTimer()
+            return
+        }
+        root.fadeDue = true
+        if (root.nextReady) {
+            startFade()
+        } else {
+            root.mediaInfo("Fade point of " + root.currentUrl + " reached but next not ready. Waiting...")
+        }
+    }
+
+    function onActivePlaybackState(player) {
+        var active = root.activeIsA ? playerA : playerB
+        if (player === active) {
+            armFadeTimer()
+        }
+    }
+
+    function onPlayerPosition(player) {
+        if (player.position <= 0) return
+        var active = root.activeIsA ? playerA : playerB
+        var startedMs = Date.now() - player.position
+        if (player === active && root.startPending) {
+            root.startPending = false
+            root.mediaStarted(root.currentUrl, root.currentType, startedMs)
+        } else if (player !== active && root.isFading && root.nextStartPending) {
+            root.nextStartPending = false
+            root.transitionStartupMs = Math.max(0, startedMs - root.transitionStartedMs)
+            root.mediaStarted(root.nextUrl, root.nextType, startedMs)
+        }
+    }
+
+    // Replace the preload pool with entries [{url, type, text_size}]; entries already
+    // pooled keep their delegate (and loaded texture), the rest are dropped
+    function setPreload(entries) {
+        var wanted = {}
+        for (var i = 0; i < entries.length; i++) {
+            wanted[entries[i].type + "|" + entries[i].url] = entries[i]
+        }
+        for (var j = preloadModel.count - 1; j >= 0; j--) {
+            var row = preloadModel.get(j)
+            var key = row.kind + "|" + row.url
+            if (wanted[key] === undefined) {
+                preloadModel.remove(j)
+            } else {
+                delete wanted[key]
+            }
+        }
+        for (var k in wanted) {
+            preloadModel.append({ "url": wanted[k].url, "kind": wanted[k].type, "textSize": wanted[k].text_size || 80 })
+        }
+    }
+
+    // Report the end of pre-roll for the inactive buffer once per prepareNext
+    function markPrepared(ok) {
+        if (!root.nextReady || root.nextLoaded) return
+        root.nextLoaded = true
+        root.nextPrepared(root.nextUrl, root.nextType, ok, Date.now() - root.prepareStartedMs)
+        if (root.fadePending) {
+            root.fadePending = false
+            prerollWait.stop()
+            startFade()
+        }
+    }
+
+    function onPrerollStatus(player) {
+        var inactive = root.activeIsA ? playerB : playerA
+        if (player !== inactive || root.nextType !== "video" || root.isFading) return
+        if (player.mediaStatus === MediaPlayer.BufferedMedia || player.mediaStatus === MediaPlayer.LoadedMedia) {
+            markPrepared(true)
+        } else if (player.mediaStatus === MediaPlayer.InvalidMedia) {
+            markPrepared(false)
+        }
+    }
+
+    function onPrerollImageStatus(image) {
+        var inactive = root.activeIsA ? imageB : imageA
+        if (image !== inactive || root.nextType !== "image" || root.isFading) return
+        if (image.status === Image.Ready) {
+            markPrepared(true)
+        } else if (image.status === Image.Error) {
+            markPrepared(false)
+        }
+    }
+
     // Prepare the next media in the inactive buffer
     function prepareNext(url, type, duration, textColor, bgColor, textSize, scrollMode) {
         root.mediaInfo("Preparing next: " + url + " (" + type + ")")
         root.nextUrl = url
         root.nextType = type
         root.nextReady = true
+        root.nextLoaded = false
+        root.prepareStartedMs = Date.now()
         root.nextScrollMode = scrollMode || "static"
+        root.nextVideoMs = type === "video" ? Math.max(0, duration) : 0
         
         var targetItem = root.activeIsA ? bItem : aItem
         var targetPlayer = root.activeIsA ? playerB : playerA
@@ -95,12 +234,14 @@ Item {
             targetImage.visible = true
             targetVideo.visible = false
             targetText.visible = false
+            onPrerollImageStatus(targetImage)
         } else if (type === "text") {
             targetPlayer.stop()
             targetText.text = url
             targetText.visible = true
             targetImage.visible = false
             targetVideo.visible = false
+            markPrepared(true)
         } else {
             targetImage.visible = false
             targetVideo.visible = true
@@ -108,10 +249,11 @@ Item {
             targetPlayer.stop()
             targetPlayer.source = url
             targetPlayer.audioOutput.volume = 0.0
-            targetPlayer.play() // Preload/buffer
-            // Pause immediately after buffering? 
-            // QtMultimedia doesn't have explicit "load", play() starts it.
-            // We'll let it play silently or pause when buffered.
+            // Pre-roll: pausing a stopped player loads the source and decodes only the
+            // first frame, which is held until startFade() plays it from position 0
+            targetPlayer.pause()
+            // Re-using the source that is already loaded raises no status change
+            onPrerollStatus(targetPlayer)
         }
 
         // --- SAFETY CHECK: If current video is already finished, start fade immediately ---
@@ -119,7 +261,7 @@ Item {
         // or if the video was very short.
         if (root.currentType === "video" && !root.isFading) {
             var currentPlayer = root.activeIsA ? playerA : playerB
-            if (currentPlayer.mediaStatus === MediaPlayer.EndOfMedia) {
+            if (root.fadeDue || currentPlayer.mediaStatus === MediaPlayer.EndOfMedia) {
                 root.mediaInfo("Current video finished during prepareNext, forcing fade.")
                 startFade()
             }
@@ -133,8 +275,16 @@ Item {
         root.currentType = type
         root.activeIsA = true
         root.nextReady = false
+        root.nextLoaded = false
+        root.fadePending = false
+        prerollWait.stop()
+        fadeTimer.stop()
+        root.fadeDue = false
+        root.nextStartPending = false
         root.isFading = false
         root.currentScrollMode = scrollMode || "static"
+        root.currentVideoMs = type === "video" ? Math.max(0, duration) : 0
+        root.currentStartedMs = Date.now()
         
         // Set duration
         if (duration > 0) {
@@ -170,6 +320,8 @@ Item {
         aItem.z = 10
         bItem.opacity = 0.0
         bItem.z = 0
+        // Drop whatever B had pre-rolled
+        playerB.stop()
         
         if (type === "image") {
             playerA.stop()
@@ -178,6 +330,8 @@ Item {
             videoA.visible = false
             textA.visible = false
             imgTimer.restart()
+            root.startPending = false
+            root.mediaStarted(url, type, Date.now())
         } else if (type === "text") {
             playerA.stop()
             textA.text = url
@@ -185,6 +339,8 @@ Item {
             imageA.visible = false
             videoA.visible = false
             imgTimer.restart()
+            root.startPending = false
+            root.mediaStarted(url, type, Date.now())
         } else {
             imageA.visible = false
             videoA.visible = true
@@ -192,6 +348,7 @@ Item {
             playerA.stop()
             playerA.source = url
             playerA.audioOutput.volume = 1.0
+            root.startPending = true
             playerA.play()
             imgTimer.stop()
         }
@@ -200,17 +357,52 @@ Item {
     function startFade() {
         if (root.isFading) return
         if (!root.nextReady) return
+        if (root.nextType === "video" && !root.nextLoaded) {
+            // Still pre-rolling: hold the current picture briefly instead of fading into black
+            if (!root.fadePending) {
+                root.fadePending = true
+                prerollWait.restart()
+            }
+            return
+        }
+        root.fadePending = false
+        prerollWait.stop()
+        fadeTimer.stop()
         
         // console.log("Starting fade")
         root.isFading = true
+        root.fadeDue = false
+        root.transitionStartedMs = Date.now()
+        root.transitionStartupMs = root.nextType === "video" ? -1 : 0
+        root.startPending = false
+        root.nextStartPending = root.nextType === "video"
+        if (root.nextType !== "video") {
+            root.mediaStarted(root.nextUrl, root.nextType, root.transitionStartedMs)
+        }
+        if (root.currentType === "video") {
+            // Late: how far past the fade point the outgoing video is. Gap: how long its
+            // last frame will stand still before the fade completes.
+            var outgoing = root.activeIsA ? playerA : playerB
+            var target = fadeTargetMs(outgoing, root.currentVideoMs)
+            var total = outgoing.duration > 0 ? outgoing.duration : root.currentVideoMs
+            var position = outgoing.mediaStatus === MediaPlayer.EndOfMedia ? total : outgoing.position
+            root.transitionLateMs = target >= 0 ? position - target : 0
+            root.transitionGapMs = total > 0 ? Math.max(0, root.fadeMs - (total - position)) : 0
+        } else {
+            root.transitionLateMs = root.transitionStartedMs - (root.currentStartedMs + root.imageDurationMs)
+            root.transitionGapMs = 0
+        }
         root.transitionStarted()
         
         if (root.activeIsA) {
             // Transition A -> B
-            // Ensure B is prepared
+            // B holds its pre-rolled first frame; start it from the beginning
             if (root.nextType === "video") {
+                if (playerB.position !== 0) {
+                    playerB.setPosition(0)
+                }
                 playerB.audioOutput.volume = 1.0
-                // playerB.play() // Should be already playing or paused
+                playerB.play()
             }
             
             bItem.z = 10
@@ -223,10 +415,11 @@ Item {
         } else {
             // Transition B -> A
             if (root.nextType === "video") {
-                playerA.audioOutput.volume = 1.0
-                if (playerA.playbackState !== MediaPlayer.PlayingState) {
-                    playerA.play()
+                if (playerA.position !== 0) {
+                    playerA.setPosition(0)
                 }
+                playerA.audioOutput.volume = 1.0
+                playerA.play()
             }
             
             aItem.z = 10
@@ -254,6 +447,12 @@ Item {
         root.currentScrollMode = root.nextScrollMode
         root.mediaInfo("Playing: " + root.currentUrl)
         root.nextReady = false
+        root.nextLoaded = false
+        // Still not moving after the fade: report it from the active side
+        root.startPending = root.nextStartPending
+        root.nextStartPending = false
+        root.currentVideoMs = root.nextVideoMs
+        root.currentStartedMs = Date.now()
         
         // Reset scale of new active item
         if (root.activeIsA) {
@@ -280,9 +479,34 @@ Item {
         
         root.isFading = false
         root.transitionFinished()
+        root.transitionTimed(root.currentUrl, root.currentType, root.transitionStartedMs, Date.now(),
+                             root.transitionLateMs, root.transitionGapMs, root.transitionStartupMs)
+        armFadeTimer()
         root.mediaFinished(root.currentUrl, root.currentType) // Notify Python to schedule next
     }
     
+    // Upper bound on holding a transition for a pre-roll that does not report back
+    Timer {
+        id: prerollWait
+        interval: 2000
+        repeat: false
+        onTriggered: {
+            if (root.fadePending) {
+                root.mediaInfo("Pre-roll of " + root.nextUrl + " not ready, starting anyway")
+                root.nextLoaded = true
+                root.fadePending = false
+                startFade()
+            }
+        }
+    }
+
+    // Starts the fade fadeMs before the active video ends
+    Timer {
+        id: fadeTimer
+        repeat: false
+        onTriggered: onFadeTimer()
+    }
+
     Timer {
         id: imgTimer
         interval: root.imageDurationMs
@@ -294,6 +518,38 @@ Item {
         }
     }
     
+    // Preload pool: hidden copies of upcoming images and texts. An Image with the same
+    // source and fillMode as imageA/imageB shares its decoded texture through the pixmap
+    // cache, so the slot shows it without loading when its turn comes.
+    ListModel { id: preloadModel }
+    Item {
+        id: preloadPool
+        anchors.fill: parent
+        opacity: 0
+        z: -1
+        Repeater {
+            model: preloadModel
+            delegate: Item {
+                anchors.fill: parent
+                Image {
+                    anchors.fill: parent
+                    fillMode: Image.PreserveAspectFit
+                    asynchronous: true
+                    source: model.kind === "image" ? model.url : ""
+                    onStatusChanged: if (status === Image.Error) root.mediaInfo("Preload failed: " + model.url)
+                }
+                Text {
+                    anchors.fill: parent
+                    visible: model.kind === "text"
+                    text: model.kind === "text" ? model.url : ""
+                    font.pixelSize: model.textSize
+                    wrapMode: Text.Wrap
+                    style: Text.Outline
+                }
+            }
+        }
+    }
+
     // Content Items
     Item {
         id: aItem
@@ -315,7 +571,9 @@ Item {
             visible: false
             smooth: true
             mipmap: true
+            asynchronous: true
             z: 1
+            onStatusChanged: onPrerollImageStatus(imageA)
         }
         Text {
             id: textA
@@ -358,9 +616,13 @@ Item {
             id: playerA
             audioOutput: AudioOutput {}
             videoOutput: videoA
+            onPlaybackStateChanged: onActivePlaybackState(playerA)
+            onPositionChanged: onPlayerPosition(playerA)
+            onDurationChanged: if (root.activeIsA) armFadeTimer()
             onMediaStatusChanged: {
+                 onPrerollStatus(playerA)
                  if (root.activeIsA && root.currentType === "video" && !root.isFading) {
-                     if (status === MediaPlayer.EndOfMedia) {
+                     if (playerA.mediaStatus === MediaPlayer.EndOfMedia) {
                          if (root.nextReady) {
                              startFade()
                          } else {
@@ -371,6 +633,7 @@ Item {
             }
             onErrorOccurred: {
                 root.mediaInfo("Player A Error: " + errorString)
+                if (!root.activeIsA && root.nextType === "video") markPrepared(false)
                 // Auto-skip on error if current
                 if (root.activeIsA && root.currentType === "video" && !root.isFading) {
                     root.mediaInfo("Player A error during playback. Forcing next.")
@@ -413,7 +676,9 @@ Item {
             visible: false
             smooth: true
             mipmap: true
+            asynchronous: true
             z: 1
+            onStatusChanged: onPrerollImageStatus(imageB)
         }
         Text {
             id: textB
@@ -457,9 +722,10 @@ Item {
             audioOutput: AudioOutput {}
             videoOutput: videoB
             onMediaStatusChanged: {
-                 root.mediaInfo("Player B Status: " + status)
+                 root.mediaInfo("Player B Status: " + playerB.mediaStatus)
+                 onPrerollStatus(playerB)
                  if (!root.activeIsA && root.currentType === "video" && !root.isFading) {
-                     if (status === MediaPlayer.EndOfMedia) {
+                     if (playerB.mediaStatus === MediaPlayer.EndOfMedia) {
                          if (root.nextReady) {
                              startFade()
                          } else {
@@ -470,9 +736,13 @@ Item {
             }
             onPlaybackStateChanged: {
                 root.mediaInfo("Player B State: " + playbackState)
+                onActivePlaybackState(playerB)
             }
+            onDurationChanged: if (!root.activeIsA) armFadeTimer()
+            onPositionChanged: onPlayerPosition(playerB)
             onErrorOccurred: {
                 root.mediaInfo("Player B Error: " + errorString + " (" + error + ")")
+                if (root.activeIsA && root.nextType === "video") markPrepared(false)
                 // Auto-skip on error if current
                 if (!root.activeIsA && root.currentType === "video" && !root.isFading) {
                     root.mediaInfo("Player B error during playback. Forcing next.")
@@ -1,12 +1,15 @@
 from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout
 from PyQt6.QtCore import Qt, QRect, pyqtSignal, QTimer, QUrl
-from PyQt6.QtGui import QColor, QPalette
+from PyQt6.QtGui import QColor, QPalette, QPainter
 from PyQt6.QtQuickWidgets import QQuickWidget
 from pathlib import Path
 
 class OutputWindow(QWidget):
     resized = pyqtSignal()
     media_finished = pyqtSignal(str, str) # url, type
+    next_prepared = pyqtSignal(str, str, bool, int) # url, type, ok, load ms
+    media_started = pyqtSignal(str, str, float) # url, type, epoch ms when it started moving on screen
+    transition_timed = pyqtSignal(str, str, float, float, int, int, int) # url, type, started, finished, late, gap, startup
 
     def __init__(self):
         super().__init__()
@@ -33,6 +36,9 @@ class OutputWindow(QWidget):
         if self.qml_widget.rootObject():
             self.qml_widget.rootObject().mediaFinished.connect(self._on_media_finished)
             self.qml_widget.rootObject().mediaInfo.connect(self._on_media_info)
+            self.qml_widget.rootObject().nextPrepared.connect(self._on_next_prepared)
+            self.qml_widget.rootObject().mediaStarted.connect(self._on_media_started)
+            self.qml_widget.rootObject().transitionTimed.connect(self._on_transition_timed)
         else:
             error_msg = "Error: QML root object not found. Possible reasons:\n1. 'output.qml' missing in bundled app.\n2. QML syntax error."
             print(error_msg)
@@ -75,6 +81,15 @@ class OutputWindow(QWidget):
     def _on_media_info(self, msg):
         print(f"[QML] {msg}")
 
+    def _on_media_started(self, url, type, started_ms):
+        self.media_started.emit(url, type, started_ms)
+
+    def _on_next_prepared(self, url, type, ok, load_ms):
+        self.next_prepared.emit(url, type, ok, load_ms)
+
+    def _on_transition_timed(self, url, type, started_ms, finished_ms, late_ms, gap_ms, startup_ms):
+        self.transition_timed.emit(url, type, started_ms, finished_ms, late_ms, gap_ms, startup_ms)
+
     def get_time_info(self):
         if self.qml_widget.rootObject():
             pos = self.qml_widget.rootObject().property("videoPosition")
@@ -82,6 +97,20 @@ class OutputWindow(QWidget):
             return pos, dur
         return 0, 0
 
+    def grab_frame(self):
+        """What is on the output right now as a QImage: the QML framebuffer
+        (transitions, scrolling text) plus any visible widget overlays"""
+        image = self.qml_widget.grabFramebuffer()
+        if image.isNull():
+            return image
+        overlays = [w for w in (self.fill_label, self.text_label, self.overlay) if w.isVisible()]
+        if overlays:
+            painter = QPainter(image)
+            for widget in overlays:
+                painter.drawPixmap(widget.geometry().topLeft(), widget.grab())
+            painter.end()
+        return image
+
     def show_on_screen(self, screen):
         if not screen:
             return
@@ -115,6 +144,17 @@ class OutputWindow(QWidget):
                 qurl = QUrl.fromLocalFile(str(url)).toString()
             self.qml_widget.rootObject().prepareNext(qurl, type, duration, text_color, bg_color, text_size, scroll_mode)
             
+    def set_preload(self, entries):
+        """entries: [{"url", "type", "text_size"}] to hold in the output's preload pool"""
+        if self.qml_widget.rootObject():
+            items = []
+            for entry in entries:
+                item = dict(entry)
+                if item["type"] != "text":
+                    item["url"] = QUrl.fromLocalFile(str(item["url"])).toString()
+                items.append(item)
+            self.qml_widget.rootObject().setPreload(items)
+
     def force_play(self, url, type, duration=0, text_color=None, bg_color=None, text_size=None, scroll_mode=None):
         if self.qml_widget.rootObject():
             if type == "text":
@@ -0,0 +1,234 @@
+import bisect
+import math
+from datetime import datetime, timezone
+
+
+def parse_schedule_time(value):
+    """Convert a stored schedule timestamp to epoch seconds.
+
+    The web UI stores UTC ISO strings ("...Z"); older rows may be naive local
+    time. Returns None for values that cannot be parsed.
+    """
+    if not value:
+        return None
+    text = str(value).strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        # Python 3.10 only accepts 3 or 6 fractional digits
+        try:
+            head, _, tail = text.partition(".")
+            offset = ""
+            for sep in ("+", "-"):
+                if sep in tail:
+                    offset = tail[tail.index(sep):]
+                    break
+            dt = datetime.fromisoformat(head + offset)
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        return dt.timestamp()
+    return dt.astimezone(timezone.utc).timestamp()
+
+
+class _Entry:
+    __slots__ = ("id", "start", "end", "priority", "sort_key", "row")
+
+    def __init__(self, row, start, end):
+        self.id = row["id"]
+        self.start = start
+        self.end = end
+        self.priority = row.get("priority") or 0
+        self.sort_key = (-self.priority, row.get("order_index") or 0, start, self.id)
+        self.row = row
+
+
+class _Node:
+    __slots__ = ("center", "left", "right", "by_start", "by_end")
+
+    def __init__(self, center):
+        self.center = center
+        self.left = None
+        self.right = None
+        self.by_start = []  # (start, id, entry) ascending
+        self.by_end = []  # (end, id, entry) ascending
+
+
+# A schedule is active while start <= t <= end, so it drops out just after its end
+END_EPSILON = 0.001
+
+
+def _build(entries):
+    if not entries:
+        return None
+    points = sorted(p for e in entries for p in (e.start, e.end))
+    node = _Node(points[len(points) // 2])
+    left, right, here = [], [], []
+    for e in entries:
+        if e.end < node.center:
+            left.append(e)
+        elif e.start > node.center:
+            right.append(e)
+        else:
+            here.append(e)
+    node.by_start = sorted((e.start, e.id, e) for e in here)
+    node.by_end = sorted((e.end, e.id, e) for e in here)
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+
+class ScheduleIndex:
+    """In-memory centered interval tree over enabled schedules.
+
+    Answers "which schedules are active at t" in O(log n + k) and supports
+    incremental upsert/remove; the tree is rebuilt once the number of
+    mutations since the last build exceeds its size, which keeps it balanced.
+    """
+
+    def __init__(self, rows=()):
+        self._entries = {}
+        self._root = None
+        self._starts = []
+        self._ends = []
+        self._mutations = 0
+        self.rebuild(rows)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, schedule_id):
+        return schedule_id in self._entries
+
+    def rebuild(self, rows):
+        self._entries = {}
+        for row in rows:
+            entry = self._make_entry(row)
+            if entry:
+                self._entries[entry.id] = entry
+        self._root = _build(list(self._entries.values()))
+        self._starts = sorted((e.start, e.id) for e in self._entries.values())
+        self._ends = sorted((e.end, e.id) for e in self._entries.values())
+        self._mutations = 0
+
+    def _make_entry(self, row):
+        start = parse_schedule_time(row.get("start_time"))
+        end = parse_schedule_time(row.get("end_time"))
+        if start is None or end is None or end < start:
+            return None
+        return _Entry(row, start, end)
+
+    def _maybe_rebuild(self):
+        self._mutations += 1
+        if self._mutations > max(64, len(self._entries)):
+            self._root = _build(list(self._entries.values()))
+            self._mutations = 0
+
+    def upsert(self, row):
+        """Insert or replace a schedule row; rows with invalid times are dropped"""
+        self.remove(row["id"])
+        entry = self._make_entry(row)
+        if not entry:
+            return
+        self._entries[entry.id] = entry
+        bisect.insort(self._starts, (entry.start, entry.id))
+        bisect.insort(self._ends, (entry.end, entry.id))
+        if self._root is None:
+            self._root = _Node(entry.start)
+        node = self._root
+        while True:
+            if entry.end < node.center:
+                if node.left is None:
+                    node.left = _Node(entry.start)
+                node = node.left
+            elif entry.start > node.center:
+                if node.right is None:
+                    node.right = _Node(entry.start)
+                node = node.right
+            else:
+                bisect.insort(node.by_start, (entry.start, entry.id, entry))
+                bisect.insort(node.by_end, (entry.end, entry.id, entry))
+                break
+        self._maybe_rebuild()
+
+    def remove(self, schedule_id):
+        entry = self._entries.pop(schedule_id, None)
+        if not entry:
+            return
+        del self._starts[bisect.bisect_left(self._starts, (entry.start, entry.id))]
+        del self._ends[bisect.bisect_left(self._ends, (entry.end, entry.id))]
+        node = self._root
+        while node:
+            if entry.end < node.center:
+                node = node.left
+            elif entry.start > node.center:
+                node = node.right
+            else:
+                i = bisect.bisect_left(node.by_start, (entry.start, entry.id))
+                del node.by_start[i]
+                i = bisect.bisect_left(node.by_end, (entry.end, entry.id))
+                del node.by_end[i]
+                break
+        self._maybe_rebuild()
+
+    def next_boundary(self, t):
+        """Earliest instant after t at which the active set changes, or None"""
+        best = None
+        i = bisect.bisect_right(self._starts, (t, math.inf))
+        if i < len(self._starts):
+            best = self._starts[i][0]
+        j = bisect.bisect_left(self._ends, (t, -math.inf))
+        if j < len(self._ends):
+            end = self._ends[j][0] + END_EPSILON
+            best = end if best is None else min(best, end)
+        return best
+
+    def ids_for_media(self, media_ids):
+        return [sid for sid, e in self._entries.items() if e.row.get("media_id") in media_ids]
+
+    def _stab(self, t):
+        out = []
+        node = self._root
+        while node:
+            if t < node.center:
+                for start, _, e in node.by_start:
+                    if start > t:
+                        break
+                    out.append(e)
+                node = node.left
+            else:
+                for end, _, e in reversed(node.by_end):
+                    if end < t:
+                        break
+                    out.append(e)
+                node = node.right
+        return out
+
+    def active_at(self, t):
+        """Rows active at epoch time t, ordered by priority desc, order_index, start"""
+        entries = self._stab(t)
+        entries.sort(key=lambda e: e.sort_key)
+        return [e.row for e in entries]
+
+    def active_by_priority(self, t):
+        """Active rows at t grouped as [(priority, rows), ...], highest priority first"""
+        groups = []
+        for row in self.active_at(t):
+            priority = row.get("priority") or 0
+            if groups and groups[-1][0] == priority:
+                groups[-1][1].append(row)
+            else:
+                groups.append((priority, [row]))
+        return groups
+
+    def top_priority_at(self, t):
+        """Only the highest-priority group active at t (what the scheduler loops over)"""
+        entries = self._stab(t)
+        if not entries:
+            return []
+        top = max(e.priority for e in entries)
+        entries = [e for e in entries if e.priority == top]
+        entries.sort(key=lambda e: e.sort_key)
+        return [e.row for e in entries]
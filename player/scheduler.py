@@ -1,19 +1,39 @@
-from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
 from database.db_manager import db
-from datetime import datetime
-from utils.command_bus import command_bus
+from database.play_log_writer import play_log_writer
+from datetime import datetime, timedelta
+import threading
+import time
+from utils.config import config
 from utils.runtime_state import set_scheduler_state
+from player.schedule_index import ScheduleIndex
+
+# Safety net for writers we are not notified about; normal wakeups are event driven
+FALLBACK_POLL_SECONDS = 60
+
+SCHEDULE_SELECT = """
+    SELECT s.*, m.path, m.duration as default_duration, m.type as media_type,
+           m.duration_ms as media_duration_ms
+    FROM schedules s
+    JOIN media m ON s.media_id = m.id
+"""
 
 class Scheduler(QObject):
     play_media = pyqtSignal(dict)
     prefetch_media = pyqtSignal(dict)
+    # Rolling window of the next player.prefetch_depth payloads, nearest first
+    prefetch_window = pyqtSignal(list)
     stop_requested = pyqtSignal()
+    db_changed = pyqtSignal()
 
     def __init__(self):
         super().__init__()
+        # Single-shot timer armed for the next instant something can change:
+        # a schedule boundary, a play-window edge or the fallback poll.
         self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.timer.timeout.connect(self.check_loop)
-        self.timer.start(1000) # Check every 1 second for commands and status
         
         self.current_schedule_id = None
         self.last_played_id = None
@@ -24,22 +44,87 @@ class Scheduler(QObject):
         self.paused = False
         self._window_blocked = False
         self.next_payload = None
+        self.upcoming_payloads = []
+        self.prefetch_depth = max(1, int(config.get("player.prefetch_depth", 3) or 3))
         self._prefetched_for = None
+        self.index = None
+        self._change_seq = 0
+        self._window_cfg = None
+        self._data_version = None
+        self._thread_ident = threading.get_ident()
+        self._notified_seq = db.change_log_seq()
         set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
 
+        # Writes from the web thread wake us immediately (queued across threads)
+        self.db_changed.connect(self._on_db_changed)
+        db.add_change_listener(self._on_db_write)
+        self.timer.start(0)
+
+    def _on_db_write(self):
+        # Runs on the writing thread after every commit. Only commits that touched schedules,
+        # media or screen_config (recorded in change_log by triggers) can affect scheduling;
+        # play logs, jobs, thumbnails or screen-health rows do not wake us.
+        if threading.get_ident() == self._thread_ident:
+            return
+        try:
+            seq = db.change_log_seq()
+        except Exception:
+            seq = None
+        if seq is None or seq != self._notified_seq:
+            self._notified_seq = seq
+            self.db_changed.emit()
+
+    def _on_db_changed(self):
+        self.timer.start(0)
+
+    def _arm_timer(self):
+        try:
+            now = time.time()
+            wake = now + FALLBACK_POLL_SECONDS
+            if self.index is not None:
+                boundary = self.index.next_boundary(now)
+                if boundary is not None:
+                    wake = min(wake, boundary)
+            edge = self._next_window_edge(datetime.now())
+            if edge is not None:
+                wake = min(wake, edge.timestamp())
+            self.timer.start(max(0, int((wake - now) * 1000) + 1))
+        except Exception as e:
+            # Never leave the single-shot timer unarmed (e.g. a malformed play-window time)
+            print(f"[Scheduler] Error arming timer: {e}")
+            self.timer.start(FALLBACK_POLL_SECONDS * 1000)
+
     def _get_play_window_config(self):
+        if self._window_cfg is not None:
+            return self._window_cfg
         row = db.fetch_one("""
             SELECT schedule_window_enabled, schedule_window_start, schedule_window_end
             FROM screen_config
             WHERE id = 1
         """)
         if not row:
-            return {"enabled": False, "start": None, "end": None}
-        return {
-            "enabled": bool(row.get("schedule_window_enabled") or 0),
-            "start": row.get("schedule_window_start"),
-            "end": row.get("schedule_window_end"),
-        }
+            self._window_cfg = {"enabled": False, "start": None, "end": None}
+        else:
+            self._window_cfg = {
+                "enabled": bool(row.get("schedule_window_enabled") or 0),
+                "start": row.get("schedule_window_start"),
+                "end": row.get("schedule_window_end"),
+            }
+        return self._window_cfg
+
+    def _next_window_edge(self, now_local: datetime):
+        cfg = self._get_play_window_config()
+        if not cfg["enabled"] or not cfg["start"] or not cfg["end"]:
+            return None
+        edge = None
+        for hhmm in (cfg["start"], cfg["end"]):
+            h, m = hhmm.split(":")
+            candidate = now_local.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
+            if candidate <= now_local:
+                candidate += timedelta(days=1)
+            if edge is None or candidate < edge:
+                edge = candidate
+        return edge
 
     def _is_within_play_window(self, now_local: datetime) -> bool:
         cfg = self._get_play_window_config()
@@ -62,27 +147,37 @@ class Scheduler(QObject):
             return start_minutes <= now_minutes < end_minutes
         return now_minutes >= start_minutes or now_minutes < end_minutes
 
+    def handle_command(self, name, data=None):
+        """Apply a scheduler command (FORCE_PLAY / STOP_ALL / START_ALL) and return the resulting state"""
+        if name == 'FORCE_PLAY':
+            if not self.handle_force_play(data):
+                raise LookupError(f"Schedule {data} not found or its media is not ready")
+        elif name == 'STOP_ALL':
+            self.paused = True
+            if self.is_playing:
+                self.stop_requested.emit()
+            set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
+        elif name == 'START_ALL':
+            self.paused = False
+            self.check_loop()
+            set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
+        return {
+            "schedule_id": self.current_schedule_id,
+            "playing": self.is_playing,
+            "paused": self.paused,
+            "window_blocked": self._window_blocked,
+        }
+
     def check_loop(self):
         try:
-            cmd = command_bus.get()
-            if cmd:
-                c = cmd.get('command')
-                if c == 'FORCE_PLAY':
-                    self.handle_force_play(cmd.get('data'))
-                    return
-                if c == 'STOP_ALL':
-                    self.paused = True
-                    if self.is_playing:
-                        self.stop_requested.emit()
-                    set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
-                    return
-                if c == 'START_ALL':
-                    self.paused = False
-                    self.check_schedule()
-                    set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
-                    return
-                if c in ("OUTPUT_SET", "OUTPUT_TEST_COLOR"):
-                    command_bus.send(c, cmd.get('data'))
+            # Catch writes made by other processes (tools/*.py) that bypass the change listener
+            if self.index is not None:
+                version = db.data_version()
+                if version != self._data_version:
+                    self._data_version = version
+                    self.sync_index()
+            else:
+                self.sync_index()
 
             within_window = self._is_within_play_window(datetime.now())
             if not within_window:
@@ -117,123 +212,100 @@ class Scheduler(QObject):
             print(f"[Scheduler] Error in check_loop: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            self._arm_timer()
 
     def handle_force_play(self, schedule_id):
         print(f"Force playing schedule: {schedule_id}")
-        sql = """
-            SELECT s.*, m.path, m.duration as default_duration, m.type as media_type
-            FROM schedules s
-            JOIN media m ON s.media_id = m.id
-            WHERE s.id = ?
-        """
-        schedule = db.fetch_one(sql, (schedule_id,))
+        # Same gate as the playlist: media still transcoding (or failed) cannot be played
+        schedule = db.fetch_one(
+            SCHEDULE_SELECT + " WHERE s.id = ? AND COALESCE(m.status, 'ready') = 'ready'", (schedule_id,)
+        )
         
         if schedule:
             self.force_play_mode = True
             self.play_item(schedule)
-        else:
-            print(f"Schedule {schedule_id} not found")
+            return True
+        print(f"Schedule {schedule_id} not found or its media is not ready")
+        return False
+
+    def _load_schedules(self, where="", params=()):
+        sql = SCHEDULE_SELECT + " WHERE COALESCE(s.is_enabled, 1) = 1 AND COALESCE(m.status, 'ready') = 'ready'"
+        if where:
+            sql += " AND " + where
+        return db.fetch_all(sql, params)
+
+    def sync_index(self):
+        """Bring the in-memory schedule index up to date with the change log"""
+        if self.index is None:
+            row = db.fetch_one("SELECT COALESCE(MAX(id), 0) AS seq FROM change_log")
+            self._change_seq = row["seq"] if row else 0
+            self.index = ScheduleIndex(self._load_schedules())
+            return
+        changes = db.fetch_all(
+            "SELECT id, table_name, row_id FROM change_log WHERE id > ? ORDER BY id",
+            (self._change_seq,),
+        )
+        if not changes:
+            return
+        if any(c["table_name"] == "screen_config" for c in changes):
+            self._window_cfg = None
+        schedule_ids = {c["row_id"] for c in changes if c["table_name"] == "schedules"}
+        media_ids = {c["row_id"] for c in changes if c["table_name"] == "media"}
+        if media_ids:
+            marks = ",".join("?" * len(media_ids))
+            # Schedules whose media row was deleted no longer join, so take them from the index too
+            schedule_ids.update(self.index.ids_for_media(media_ids))
+            rows = db.fetch_all(f"SELECT id FROM schedules WHERE media_id IN ({marks})", tuple(media_ids))
+            schedule_ids.update(r["id"] for r in rows)
+        if schedule_ids:
+            marks = ",".join("?" * len(schedule_ids))
+            rows = self._load_schedules(f"s.id IN ({marks})", tuple(schedule_ids))
+            for row in rows:
+                self.index.upsert(row)
+            for sid in schedule_ids - {r["id"] for r in rows}:
+                self.index.remove(sid)
+        self._change_seq = changes[-1]["id"]
+        db.execute("DELETE FROM change_log WHERE id <= ?", (self._change_seq,))
 
     def check_schedule(self):
-        now_local = datetime.now().isoformat(timespec="seconds")
-        now_utc = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-        
-        # Fetch ALL valid schedules active now
-        sql = """
-            SELECT s.*, m.path, m.duration as default_duration, m.type as media_type
-            FROM schedules s
-            JOIN media m ON s.media_id = m.id
-            WHERE COALESCE(s.is_enabled, 1) = 1
-              AND (
-                (s.start_time <= ? AND s.end_time >= ?)
-                OR
-                (s.start_time <= ? AND s.end_time >= ?)
-              )
-            ORDER BY s.priority DESC, COALESCE(s.order_index, 0) ASC, s.start_time ASC
-        """
-        schedules = db.fetch_all(sql, (now_local, now_local, now_utc, now_utc))
-        
-        if not schedules:
+        self.sync_index()
+        # Highest-priority group of schedules active now
+        valid_schedules = self.index.top_priority_at(time.time())
+
+        if not valid_schedules:
             self.current_schedule_id = None
             self.is_playing = False
             set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
             return
 
-        # Group by highest priority
-        max_priority = schedules[0]['priority']
-        valid_schedules = [s for s in schedules if s['priority'] == max_priority]
-        
-        if not valid_schedules:
-            return
-
-        # Loop Logic
-        next_schedule = None
-        follow_schedule = None
-        
+        # Loop Logic: continue after the last played item (circular); if it is
+        # no longer valid, or nothing was played yet, start from the top
+        next_index = 0
         if self.last_played_id:
-            # Find current index
-            try:
-                # Find the index of the last played item in the CURRENT valid list
-                # This handles cases where items are added/removed
-                current_index = -1
-                for i, s in enumerate(valid_schedules):
-                    if s['id'] == self.last_played_id:
-                        current_index = i
-                        break
-                
-                if current_index == -1:
-                    # Last played item no longer valid, start from 0
-                    next_index = 0
-                else:
-                    # Pick next one (circular)
-                    next_index = (current_index + 1) % len(valid_schedules)
-                
-                next_schedule = valid_schedules[next_index]
-                follow_index = (next_index + 1) % len(valid_schedules)
-                follow_schedule = valid_schedules[follow_index]
-            except ValueError:
-                # Last played item no longer valid, start from 0
-                next_schedule = valid_schedules[0]
-                follow_index = 1 if len(valid_schedules) > 1 else 0
-                follow_schedule = valid_schedules[follow_index]
-        else:
-            # First run
-            next_schedule = valid_schedules[0]
-            follow_index = 1 if len(valid_schedules) > 1 else 0
-            follow_schedule = valid_schedules[follow_index]
+            for i, s in enumerate(valid_schedules):
+                if s['id'] == self.last_played_id:
+                    next_index = (i + 1) % len(valid_schedules)
+                    break
+        next_schedule = valid_schedules[next_index]
 
-        if next_schedule:
-            if follow_schedule:
-                pd = follow_schedule.get('play_duration')
-                media_type = follow_schedule.get('media_type')
-                default_dur = follow_schedule.get('default_duration')
-                if media_type == 'video':
-                    if pd is None:
-                        duration = default_dur if default_dur is not None else 0
-                    elif pd == 0:
-                        duration = 0
-                    else:
-                        duration = pd
-                else:
-                    if pd is None or pd == 0:
-                        duration = default_dur if (default_dur is not None and default_dur > 0) else 10
-                    else:
-                        duration = pd
-                self.next_payload = {
-                    "path": follow_schedule['path'],
-                    "duration": duration,
-                    "type": follow_schedule.get('media_type'),
-                    "text_size": follow_schedule.get('text_size'),
-                    "text_color": follow_schedule.get('text_color'),
-                    "bg_color": follow_schedule.get('bg_color'),
-                    "text_scroll_mode": follow_schedule.get('text_scroll_mode'),
-                    "schedule_id": follow_schedule['id'],
-                    "media_id": follow_schedule.get('media_id')
-                }
-            self.play_item(next_schedule)
+        # The items after it, as far as player.prefetch_depth reaches
+        depth = min(self.prefetch_depth, len(valid_schedules))
+        self.upcoming_payloads = [
+            self._payload(valid_schedules[(next_index + k) % len(valid_schedules)])
+            for k in range(1, depth + 1)
+        ]
+        self.next_payload = self.upcoming_payloads[0]
+        self.play_item(next_schedule)
 
-    def play_item(self, schedule):
-        self.current_schedule_id = schedule['id']
+    def _media_duration(self, schedule):
+        """Real length in seconds of a video, known from the ingest probe (None if not probed)"""
+        ms = schedule.get('media_duration_ms')
+        if schedule.get('media_type') == 'video' and ms:
+            return ms / 1000.0
+        return None
+
+    def _payload(self, schedule):
         pd = schedule.get('play_duration')
         media_type = schedule.get('media_type')
         default_dur = schedule.get('default_duration')
@@ -249,9 +321,7 @@ class Scheduler(QObject):
                 duration = default_dur if (default_dur is not None and default_dur > 0) else 10
             else:
                 duration = pd
-        self.play_start_time = datetime.now()
-        self.current_media_id = schedule.get('media_id')
-        payload = {
+        return {
             "path": schedule['path'],
             "duration": duration,
             "type": schedule.get('media_type'),
@@ -260,15 +330,22 @@ class Scheduler(QObject):
             "bg_color": schedule.get('bg_color'),
             "text_scroll_mode": schedule.get('text_scroll_mode'),
             "schedule_id": schedule['id'],
-            "media_id": self.current_media_id
+            "media_id": schedule.get('media_id'),
+            "media_duration": self._media_duration(schedule)
         }
-        self.play_media.emit(payload)
+
+    def play_item(self, schedule):
+        self.current_schedule_id = schedule['id']
+        self.play_start_time = datetime.now()
+        self.current_media_id = schedule.get('media_id')
+        self.play_media.emit(self._payload(schedule))
         self.is_playing = True
         set_scheduler_state(self.is_playing, self.paused, self._window_blocked)
 
         # Prefetch next item immediately for seamless transition
         if self.next_payload:
             try:
+                self.prefetch_window.emit(self.upcoming_payloads)
                 self.prefetch_media.emit(self.next_payload)
                 self._prefetched_for = self.current_schedule_id
             except Exception:
@@ -276,15 +353,12 @@ class Scheduler(QObject):
 
     def on_media_finished(self):
         """Called when media playback finishes"""
-        # Write play log
+        # Queue play log (written in batches off the GUI thread)
         try:
             if self.play_start_time and self.current_media_id:
                 end_time = datetime.now()
                 duration_sec = int((end_time - self.play_start_time).total_seconds())
-                db.execute("""
-                    INSERT INTO play_logs (media_id, schedule_id, start_time, end_time, duration_seconds)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (self.current_media_id, self.current_schedule_id, self.play_start_time.isoformat(), end_time.isoformat(), duration_sec))
+                play_log_writer.write(self.current_media_id, self.current_schedule_id, self.play_start_time.isoformat(), end_time.isoformat(), duration_sec)
         except Exception as e:
             print(f"Failed to write play log: {e}")
         finally:
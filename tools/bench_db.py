@@ -0,0 +1,116 @@
+"""Micro-benchmark: per-query sqlite3 connections vs. the pooled DBManager.
+
+Usage: python tools/bench_db.py [--queries 5000] [--threads 2]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+SCHEDULE_SQL = """
+    SELECT s.*, m.path, m.duration as default_duration, m.type as media_type
+    FROM schedules s
+    JOIN media m ON s.media_id = m.id
+    WHERE s.id = ?
+"""
+
+
+class LegacyDB:
+    """The old behaviour: a fresh connection for every statement"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    @contextmanager
+    def get_cursor(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def fetch_one(self, sql, params=()):
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def execute(self, sql, params=()):
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.lastrowid
+
+
+def seed(manager, rows=200):
+    for i in range(rows):
+        media_id = manager.execute(
+            "INSERT INTO media (name, type, path, duration) VALUES (?, 'image', ?, 10)",
+            (f"m{i}", f"/tmp/m{i}.png"),
+        )
+        manager.execute(
+            "INSERT INTO schedules (media_id, start_time, end_time) VALUES (?, '2000-01-01T00:00:00', '2999-01-01T00:00:00')",
+            (media_id,),
+        )
+
+
+def run(manager, queries, threads, write_every):
+    def worker(offset):
+        for i in range(queries):
+            if write_every and i % write_every == 0:
+                manager.execute(
+                    "INSERT INTO play_logs (media_id, schedule_id, start_time, end_time, duration_seconds) VALUES (1, 1, ?, ?, 5)",
+                    ("2024-01-01T00:00:00", "2024-01-01T00:00:05"),
+                )
+            else:
+                manager.fetch_one(SCHEDULE_SQL, ((i + offset) % 200 + 1,))
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return queries * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=5000, help="queries per thread")
+    parser.add_argument("--threads", type=int, default=2, help="concurrent threads (GUI + web)")
+    parser.add_argument("--write-every", type=int, default=50, help="insert a play log every N queries (0 = read only)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DBManager creates its global instance relative to the cwd
+        os.chdir(tmp)
+        from database.db_manager import DBManager
+
+        pooled = DBManager(Path(tmp) / "bench.db")
+        seed(pooled)
+        legacy = LegacyDB(Path(tmp) / "bench.db")
+
+        legacy_qps = run(legacy, args.queries, args.threads, args.write_every)
+        pooled_qps = run(pooled, args.queries, args.threads, args.write_every)
+        pooled.close_all()
+
+    print(f"threads={args.threads} queries/thread={args.queries} write_every={args.write_every}")
+    print(f"per-query connection: {legacy_qps:10.0f} q/s")
+    print(f"pooled + WAL:         {pooled_qps:10.0f} q/s  ({pooled_qps / legacy_qps:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
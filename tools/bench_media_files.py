@@ -0,0 +1,124 @@
+"""Throughput benchmark: the old 64 KB generator vs. MediaFileResponse for /media_files.
+
+Starts uvicorn on a local port with both handlers over the same temporary file
+and downloads it (full file, an open-ended range like a video seek, and a
+revalidation) several times in parallel.
+
+Usage: python tools/bench_media_files.py [--size-mb 256] [--requests 8] [--parallel 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+import requests
+import uvicorn
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import StreamingResponse
+
+from web.file_response import MediaFileResponse
+
+
+def build_app(path: Path):
+    app = FastAPI()
+
+    @app.get("/legacy")
+    async def legacy(range: str = Header(None)):
+        """The previous handler: manual single range, Python generator, 64 KB reads"""
+        file_size = path.stat().st_size
+        start, end = 0, file_size - 1
+        headers = {"Accept-Ranges": "bytes", "Cache-Control": "no-store"}
+        status_code = 200
+        if range:
+            first, _, last = range.replace("bytes=", "").partition("-")
+            start = int(first) if first else 0
+            end = min(int(last), file_size - 1) if last else file_size - 1
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        content_length = end - start + 1
+        headers["Content-Length"] = str(content_length)
+
+        def iterfile():
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = content_length
+                while remaining > 0:
+                    chunk = f.read(min(64 * 1024, remaining))
+                    if not chunk:
+                        break
+                    yield chunk
+                    remaining -= len(chunk)
+
+        return StreamingResponse(iterfile(), status_code=status_code, headers=headers, media_type="video/mp4")
+
+    @app.get("/current")
+    async def current(request: Request):
+        return MediaFileResponse(path, path.stat(), request.headers, media_type="video/mp4")
+
+    return app
+
+
+def download(url, headers=None):
+    total = 0
+    with requests.get(url, headers=headers or {}, stream=True, timeout=120) as res:
+        for chunk in res.iter_content(1024 * 1024):
+            total += len(chunk)
+    return total
+
+
+def measure(url, n, parallel, headers=None):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(parallel) as pool:
+        total = sum(pool.map(lambda _: download(url, headers), range(n)))
+    elapsed = time.perf_counter() - started
+    return total / elapsed / (1024 * 1024), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--port", type=int, default=18931)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.mp4"
+        with open(path, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        server = uvicorn.Server(uvicorn.Config(build_app(path), host="127.0.0.1", port=args.port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        base = f"http://127.0.0.1:{args.port}"
+        seek = {"Range": f"bytes={args.size_mb * 1024 * 1024 // 2}-"}
+        print(f"file={args.size_mb} MB requests={args.requests} parallel={args.parallel}")
+        for label, headers in (("full file", None), ("range (seek)", seek)):
+            legacy, _ = measure(f"{base}/legacy", args.requests, args.parallel, headers)
+            current, _ = measure(f"{base}/current", args.requests, args.parallel, headers)
+            print(f"{label:14s} generator: {legacy:8.1f} MB/s   MediaFileResponse: {current:8.1f} MB/s  ({current / legacy:.1f}x)")
+
+        etag = requests.get(f"{base}/current", headers={"Range": "bytes=0-0"}).headers["etag"]
+        started = time.perf_counter()
+        for _ in range(200):
+            assert requests.get(f"{base}/current", headers={"If-None-Match": etag}).status_code == 304
+        print(f"revalidation:  {(time.perf_counter() - started) / 200 * 1000:.2f} ms per 304 (generator re-sends the file)")
+
+        server.should_exit = True
+        thread.join(5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark: active-schedule lookup via SQL scan vs. the in-memory ScheduleIndex.
+
+Usage: python tools/bench_schedule_index.py [--schedules 100000] [--lookups 2000]
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from player.schedule_index import ScheduleIndex, parse_schedule_time
+
+LEGACY_SQL = """
+    SELECT s.*, m.path, m.duration as default_duration, m.type as media_type
+    FROM schedules s
+    JOIN media m ON s.media_id = m.id
+    WHERE COALESCE(s.is_enabled, 1) = 1
+      AND (
+        (s.start_time <= ? AND s.end_time >= ?)
+        OR
+        (s.start_time <= ? AND s.end_time >= ?)
+      )
+    ORDER BY s.priority DESC, COALESCE(s.order_index, 0) ASC, s.start_time ASC
+"""
+
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def make_db(count, seed=1):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript((PROJECT_ROOT / "database" / "sqlite.sql").read_text(encoding="utf-8"))
+    conn.execute("ALTER TABLE schedules ADD COLUMN is_enabled INTEGER DEFAULT 1")
+    conn.execute("ALTER TABLE schedules ADD COLUMN order_index INTEGER DEFAULT 0")
+    conn.executemany(
+        "INSERT INTO media (id, name, type, path) VALUES (?, ?, 'image', ?)",
+        [(i, f"m{i}", f"/tmp/m{i}.png") for i in range(1, 501)],
+    )
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(1, count + 1):
+        start = base + timedelta(hours=rnd.randint(0, 24 * 365 * 3))
+        end = start + timedelta(days=rnd.choice((1, 1, 2, 7, 30)))
+        rows.append((i, rnd.randint(1, 500), iso(start), iso(end), rnd.choice((0, 0, 0, 1, 5)), rnd.randint(0, 20), int(rnd.random() > 0.1)))
+    conn.executemany(
+        "INSERT INTO schedules (id, media_id, start_time, end_time, priority, order_index, is_enabled) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    return conn, base
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schedules", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    conn, base = make_db(args.schedules)
+    rnd = random.Random(2)
+    instants = [base + timedelta(seconds=rnd.randint(0, 3 * 365 * 86400)) for _ in range(args.lookups)]
+
+    t0 = time.perf_counter()
+    rows = [dict(r) for r in conn.execute(
+        "SELECT s.*, m.path, m.duration as default_duration, m.type as media_type "
+        "FROM schedules s JOIN media m ON s.media_id = m.id WHERE COALESCE(s.is_enabled, 1) = 1"
+    )]
+    index = ScheduleIndex(rows)
+    build_s = time.perf_counter() - t0
+
+    legacy_n = max(1, args.lookups // 20)
+    t0 = time.perf_counter()
+    for dt in instants[:legacy_n]:
+        utc = iso(dt)
+        conn.execute(LEGACY_SQL, (utc, utc, utc, utc)).fetchall()
+    legacy_s = (time.perf_counter() - t0) / legacy_n
+
+    t0 = time.perf_counter()
+    for dt in instants:
+        index.active_by_priority(dt.timestamp())
+    index_s = (time.perf_counter() - t0) / len(instants)
+
+    # Correctness against brute force on a sample
+    for dt in instants[:50]:
+        t = dt.timestamp()
+        expected = sorted(r["id"] for r in rows if parse_schedule_time(r["start_time"]) <= t <= parse_schedule_time(r["end_time"]))
+        got = sorted(r["id"] for r in index.active_at(t))
+        assert expected == got, f"mismatch at {dt}"
+
+    t0 = time.perf_counter()
+    for i in range(1, 1001):
+        row = dict(rows[i])
+        row["end_time"] = iso(base + timedelta(days=rnd.randint(400, 800)))
+        index.upsert(row)
+    upsert_s = (time.perf_counter() - t0) / 1000
+
+    print(f"schedules={args.schedules} indexed={len(index)}")
+    print(f"index build:      {build_s * 1000:10.1f} ms")
+    print(f"SQL scan lookup:  {legacy_s * 1000:10.3f} ms")
+    print(f"index lookup:     {index_s * 1000:10.3f} ms  ({legacy_s / index_s:.0f}x)")
+    print(f"index upsert:     {upsert_s * 1000:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import subprocess
+import threading
+import time
+import uuid
+
+from database.db_manager import db
+from utils.config import config
+from utils.logger import logger
+from utils.transcode import startupinfo
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+READ_BYTES = 64 * 1024
+# Reconnect delays grow from the first to the last value, then stay there
+BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+# No frame for this long means the stream is stuck (RTSP servers can stall silently)
+STALL_SECONDS = 15
+# A single frame larger than this is garbage, not a JPEG
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+def camera_url(row):
+    """Stream URL with the configured credentials folded into rtsp:// URLs"""
+    url = (row.get("stream_url") or "").strip()
+    username = row.get("username") or None
+    password = row.get("password") or None
+    if username and url.startswith("rtsp://") and "@" not in url:
+        auth = username
+        if password:
+            auth = f"{auth}:{password}"
+        url = "rtsp://" + auth + "@" + url[len("rtsp://"):]
+    return url
+
+
+def redact_url(url):
+    """url without the user:password part, for logs and status output"""
+    scheme, sep, rest = url.partition("://")
+    authority, slash, path = rest.partition("/")
+    if sep and "@" in authority:
+        # The password itself may contain '@'; the host follows the last one
+        return f"{scheme}://***@{authority.rsplit('@', 1)[1]}{slash}{path}"
+    return url
+
+
+def capture_args(url, fps, width):
+    """ffmpeg arguments decoding url into a continuous MJPEG stream on stdout"""
+    if url.startswith("rtsp://"):
+        source = ["-rtsp_transport", "tcp", "-i", url]
+    elif "://" in url:
+        source = ["-i", url]
+    else:
+        # Local file stand-in for a camera: play in real time, forever
+        source = ["-re", "-stream_loop", "-1", "-i", url]
+    return [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        *source,
+        "-an", "-sn", "-dn",
+        "-vf", f"fps={fps},scale='min({width},iw)':-2",
+        "-c:v", "mjpeg", "-q:v", "5",
+        "-f", "image2pipe", "pipe:1",
+    ]
+
+
+def split_jpegs(buffer):
+    """Split complete JPEG images off the front of buffer; returns (frames, rest)"""
+    frames = []
+    while True:
+        start = buffer.find(SOI)
+        if start < 0:
+            return frames, b""
+        end = buffer.find(EOI, start + 2)
+        if end < 0:
+            return frames, buffer[start:]
+        frames.append(buffer[start:end + 2])
+        buffer = buffer[end + 2:]
+
+
+class CameraWorker:
+    """Keeps one camera stream open and holds its newest frame as JPEG in memory.
+
+    A single ffmpeg process decodes the stream at camera.capture_fps. When it
+    exits, fails to start or stops delivering frames for STALL_SECONDS, it is
+    restarted after a growing backoff; the backoff resets once frames flow again.
+    """
+
+    def __init__(self, camera_id, url):
+        self.camera_id = camera_id
+        self.url = url
+        self.fps = float(config.get("camera.capture_fps", 2) or 2)
+        self.width = int(config.get("camera.capture_width", 1280) or 1280)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._proc = None
+        self._thread = None
+        self.frame = None
+        self.frame_time = None
+        self.frame_seq = 0
+        # Part of the frame ETag: sequence numbers restart with every new worker
+        self.boot = uuid.uuid4().hex[:8]
+        self.state = "idle"
+        self.last_error = None
+        self.reconnects = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"CameraCapture-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._kill()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(5)
+
+    def latest(self):
+        """(jpeg, captured_at epoch seconds, sequence) of the newest frame, or (None, None, seq)"""
+        with self._lock:
+            return self.frame, self.frame_time, self.frame_seq
+
+    def status(self):
+        with self._lock:
+            age = time.time() - self.frame_time if self.frame_time else None
+            return {
+                "camera_id": self.camera_id,
+                "state": self.state,
+                "last_error": self.last_error,
+                "reconnects": self.reconnects,
+                "frame_age_seconds": round(age, 3) if age is not None else None,
+                "frames": self.frame_seq,
+            }
+
+    def _kill(self):
+        proc = self._proc
+        if proc and proc.poll() is None:
+            proc.kill()
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            self.state = "connecting"
+            delivered = self._run_once()
+            if self._stop.is_set():
+                break
+            attempt = 0 if delivered else attempt + 1
+            delay = BACKOFF_SECONDS[min(attempt, len(BACKOFF_SECONDS) - 1)]
+            self.reconnects += 1
+            self.state = "backoff"
+            logger.warning("Camera %s stream ended (%s), reconnecting in %ss", self.camera_id, self.last_error, delay)
+            self._stop.wait(delay)
+        self.state = "stopped"
+
+    def _run_once(self):
+        """One ffmpeg session; True if it delivered at least one frame"""
+        try:
+            proc = subprocess.Popen(
+                capture_args(self.url, self.fps, self.width),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                startupinfo=startupinfo(),
+            )
+        except FileNotFoundError:
+            self.last_error = "ffmpeg not found"
+            return False
+        self._proc = proc
+        errors = []
+        drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+        drain.start()
+        watchdog = threading.Thread(target=self._watch_stall, args=(proc,), daemon=True)
+        watchdog.start()
+        delivered = False
+        pending = b""
+        try:
+            while True:
+                chunk = proc.stdout.read1(READ_BYTES)
+                if not chunk:
+                    break
+                frames, pending = split_jpegs(pending + chunk)
+                if len(pending) > MAX_FRAME_BYTES:
+                    pending = b""
+                if frames:
+                    with self._lock:
+                        self.frame = frames[-1]
+                        self.frame_time = time.time()
+                        self.frame_seq += len(frames)
+                        self.state = "streaming"
+                    delivered = True
+        finally:
+            self._kill()
+            proc.wait()
+            drain.join(1)
+            self._proc = None
+        err = (errors[0] if errors else b"").decode("utf-8", "replace").strip()
+        err = err.replace(self.url, redact_url(self.url))
+        self.last_error = err[-300:] or f"ffmpeg exited with {proc.returncode}"
+        return delivered
+
+    def _watch_stall(self, proc):
+        started = time.time()
+        while proc.poll() is None and not self._stop.is_set():
+            with self._lock:
+                last = self.frame_time if self.frame_time and self.frame_time > started else started
+            if time.time() - last > STALL_SECONDS:
+                logger.warning("Camera %s delivered no frame for %ss, restarting capture", self.camera_id, STALL_SECONDS)
+                proc.kill()
+                return
+            self._stop.wait(1)
+
+
+class CameraCapture:
+    """One CameraWorker per enabled camera_config row; sync() after config changes"""
+
+    def __init__(self, manager=db):
+        self.db = manager
+        self._lock = threading.Lock()
+        self.workers = {}
+
+    def sync(self):
+        rows = self.db.fetch_all("SELECT id, enabled, stream_url, username, password FROM camera_config")
+        wanted = {row["id"]: camera_url(row) for row in rows if row.get("enabled") and camera_url(row)}
+        stale = []
+        with self._lock:
+            for camera_id, worker in list(self.workers.items()):
+                if wanted.get(camera_id) != worker.url:
+                    stale.append(self.workers.pop(camera_id))
+            for camera_id, url in wanted.items():
+                if camera_id not in self.workers:
+                    worker = CameraWorker(camera_id, url)
+                    self.workers[camera_id] = worker
+                    worker.start()
+                    logger.info("Camera %s capture started", camera_id)
+        for worker in stale:
+            worker.stop()
+            logger.info("Camera %s capture stopped", worker.camera_id)
+
+    def worker(self, camera_id=1):
+        with self._lock:
+            return self.workers.get(camera_id)
+
+    def stop_all(self):
+        with self._lock:
+            workers = list(self.workers.values())
+            self.workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+# Global instance
+camera_capture = CameraCapture()
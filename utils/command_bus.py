@@ -1,20 +1,98 @@
 import queue
+import threading
+from concurrent.futures import Future
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class _QtDispatcher(QObject):
+    """Lives on the Qt main thread; signals emitted from other threads arrive as queued events"""
+    posted = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.posted.connect(self._run)
+
+    def _run(self, fn):
+        fn()
+
 
 class CommandBus:
+    """Routes commands to handlers registered per topic on the Qt main thread.
+
+    send() can be called from any thread (e.g. the uvicorn thread) and returns a
+    concurrent.futures.Future resolved with the handler's return value once the
+    main thread has run it. Commands sent before the dispatcher is attached, or
+    for topics without a handler yet, are held and delivered on attach/register.
+    """
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(CommandBus, cls).__new__(cls)
             cls._instance.queue = queue.Queue()
+            cls._instance.handlers = {}
+            cls._instance._dispatcher = None
+            cls._instance._lock = threading.Lock()
         return cls._instance
-        
+
+    def attach_qt(self):
+        """Start push delivery; must be called on the Qt main thread after QApplication exists"""
+        with self._lock:
+            self._dispatcher = _QtDispatcher()
+        self._drain()
+
+    def register(self, command, handler):
+        with self._lock:
+            self.handlers[command] = handler
+        self._drain()
+
+    def unregister(self, command):
+        with self._lock:
+            self.handlers.pop(command, None)
+
     def send(self, command, data=None):
-        self.queue.put({"command": command, "data": data})
-        
+        item = {"command": command, "data": data, "future": Future()}
+        with self._lock:
+            dispatcher = self._dispatcher
+            deliver = dispatcher is not None and command in self.handlers
+            if not deliver:
+                self.queue.put(item)
+        if deliver:
+            dispatcher.posted.emit(lambda: self._dispatch(item))
+        return item["future"]
+
+    def _drain(self):
+        with self._lock:
+            dispatcher = self._dispatcher
+            if dispatcher is None:
+                return
+            held = []
+            while not self.queue.empty():
+                held.append(self.queue.get())
+            ready = [item for item in held if item["command"] in self.handlers]
+            for item in held:
+                if item["command"] not in self.handlers:
+                    self.queue.put(item)
+        for item in ready:
+            dispatcher.posted.emit(lambda item=item: self._dispatch(item))
+
+    def _dispatch(self, item):
+        future = item["future"]
+        if not future.set_running_or_notify_cancel():
+            return
+        handler = self.handlers.get(item["command"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for command {item['command']}")
+            future.set_result(handler(item.get("data")))
+        except Exception as e:
+            future.set_exception(e)
+
     def get(self):
+        """Pop a held command (only used when no handler is registered for it)"""
         if not self.queue.empty():
             return self.queue.get()
         return None
-        
+
 command_bus = CommandBus()
@@ -0,0 +1,110 @@
+import hashlib
+from pathlib import Path
+
+from database.db_manager import db
+from utils.media_jobs import media_jobs
+from utils.media_store import add_media
+from utils.media_thumbs import thumbnails
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".pngg"}
+VIDEO_EXTS = {".mp4", ".mov", ".mkv", ".avi", ".webm", ".ogg"}
+TEXT_EXTS = {".txt"}
+
+# Bytes gathered from the request stream before one write+hash call on a worker thread
+WRITE_CHUNK_BYTES = 1024 * 1024
+
+
+def detect_type(filename, media_type):
+    """(type, suffix) for an upload; the extension wins over the type the client picked"""
+    ext = Path(filename or "").suffix.lower()
+    detected = media_type
+    if ext in IMAGE_EXTS:
+        detected = "image"
+    elif ext in TEXT_EXTS:
+        detected = "text"
+    elif ext in VIDEO_EXTS:
+        detected = "video"
+    return detected, (".png" if ext == ".pngg" else ext)
+
+
+class HashingWriter:
+    """Writes an upload to disk while computing SHA-256 and size in the same pass"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._f = open(path, "wb")
+
+    def write(self, data):
+        self._f.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def copy_from(self, src, chunk_size=WRITE_CHUNK_BYTES):
+        while True:
+            data = src.read(chunk_size)
+            if not data:
+                break
+            self.write(data)
+
+    def close(self):
+        self._f.close()
+        return self.sha256.hexdigest()
+
+    def abort(self):
+        try:
+            self._f.close()
+        finally:
+            self.path.unlink(missing_ok=True)
+
+
+def register_media(original_name, media_type, path: Path, size, content_hash, priority=0):
+    """Store an upload written to an incoming path, insert its media row and queue processing.
+
+    Identical bytes that are already stored are not kept twice: the new row links
+    to the existing blob and its rendition, and no job is queued.
+    """
+    suffix = Path(path.stem).suffix if path.suffix == ".part" else path.suffix
+    # 视频需后台转码完成后才可排期
+    status = "processing" if media_type == "video" else "ready"
+    try:
+        media_id, stored, status, deduplicated = add_media(
+            original_name, media_type, path, size, content_hash, suffix, status
+        )
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    job_id = None
+    if media_type == "video" and not deduplicated:
+        # Follow-up jobs are queued once the rendition exists (see _on_job_done)
+        job_id = media_jobs.enqueue("transcode", media_id=media_id, src_path=stored, priority=priority)
+    elif media_type == "image" and not deduplicated:
+        job_id = queue_followups(media_id, priority)
+    return {
+        "status": "success",
+        "id": media_id,
+        "path": str(stored),
+        "media_status": status,
+        "job_id": job_id,
+        "file_size": size,
+        "content_hash": content_hash,
+        "deduplicated": deduplicated,
+    }
+
+
+def queue_followups(media_id, priority=0):
+    """Jobs that run on a playable file: metadata probe, then the web preview proxy and thumbnails"""
+    job_id = media_jobs.enqueue("probe", media_id=media_id, priority=priority)
+    media_jobs.enqueue("proxy", media_id=media_id, priority=priority - 1)
+    thumbnails.request({"id": media_id})
+    return job_id
+
+
+def _on_job_done(job, ok):
+    if job["kind"] == "transcode" and ok and job.get("media_id"):
+        if db.fetch_one("SELECT id FROM media WHERE id = ?", (job["media_id"],)):
+            queue_followups(job["media_id"], job.get("priority") or 0)
+
+
+media_jobs.add_done_hook(_on_job_done)
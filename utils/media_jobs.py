@@ -0,0 +1,209 @@
+import heapq
+import threading
+import time
+import traceback
+
+from database.db_manager import db
+from utils.config import config
+from utils.logger import logger
+
+# Progress is kept in memory for the API and persisted at most this often
+PROGRESS_PERSIST_SECONDS = 2.0
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class MediaJobQueue:
+    """Persistent, prioritized queue of background media jobs.
+
+    Jobs live in the media_jobs table so they survive restarts; a bounded set of
+    worker threads (config "media_jobs.workers") picks the highest-priority
+    queued job and runs the handler registered for its kind. Handlers receive
+    the job row and a progress(fraction) callback, and usually supervise an
+    ffmpeg process, so the heavy work happens outside the Python interpreter.
+    """
+
+    def __init__(self, manager=db):
+        self.db = manager
+        self.handlers = {}
+        self.done_hooks = []
+        self._heap = []
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = {}
+        self._progress = {}
+        self._stopping = False
+
+    def register_handler(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def add_done_hook(self, hook):
+        """hook(job, ok) runs on the worker thread after a job finishes or fails"""
+        self.done_hooks.append(hook)
+
+    def start(self, workers=None):
+        with self._cond:
+            if self._workers:
+                return
+            self._stopping = False
+        workers = workers or int(config.get("media_jobs.workers", 2) or 1)
+        # Finished jobs are only history; keep the table from growing without bound
+        keep_days = int(config.get("media_jobs.keep_days", 30) or 30)
+        self.db.execute(
+            "DELETE FROM media_jobs WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)",
+            (f"-{keep_days} days",),
+        )
+        # Jobs interrupted by a shutdown or crash are picked up again
+        self.db.execute("UPDATE media_jobs SET status = 'queued' WHERE status = 'running'")
+        rows = self.db.fetch_all("SELECT id, priority FROM media_jobs WHERE status = 'queued'")
+        with self._cond:
+            for row in rows:
+                heapq.heappush(self._heap, (-(row["priority"] or 0), row["id"]))
+            for n in range(max(1, workers)):
+                t = threading.Thread(target=self._worker, name=f"MediaJob-{n}", daemon=True)
+                self._workers.append(t)
+                t.start()
+        if rows:
+            logger.info("Media jobs resumed: %s queued", len(rows))
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            running = list(self._running.values())
+            workers = self._workers
+            self._workers = []
+        for cancel in running:
+            try:
+                cancel()
+            except Exception:
+                pass
+        for t in workers:
+            t.join(timeout)
+
+    def enqueue(self, kind, media_id=None, src_path=None, priority=0):
+        job_id = self.db.execute("""
+            INSERT INTO media_jobs (media_id, kind, status, priority, progress, src_path, created_at)
+            VALUES (?, ?, 'queued', ?, 0, ?, datetime('now'))
+        """, (media_id, kind, int(priority or 0), str(src_path) if src_path else None))
+        with self._cond:
+            heapq.heappush(self._heap, (-int(priority or 0), job_id))
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self.db.fetch_one("SELECT * FROM media_jobs WHERE id = ?", (job_id,))
+        if row and job_id in self._progress:
+            row["progress"] = self._progress[job_id]
+        return row
+
+    def list(self, status=None, limit=100):
+        if status:
+            rows = self.db.fetch_all(
+                "SELECT * FROM media_jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+            )
+        else:
+            rows = self.db.fetch_all("SELECT * FROM media_jobs ORDER BY id DESC LIMIT ?", (limit,))
+        for row in rows:
+            if row["id"] in self._progress:
+                row["progress"] = self._progress[row["id"]]
+        return rows
+
+    @property
+    def stopping(self):
+        return self._stopping
+
+    def stats(self):
+        with self._cond:
+            return {"queued": len(self._heap), "running": len(self._running), "workers": len(self._workers)}
+
+    def set_cancel(self, job_id, cancel):
+        """Handlers register a callable that aborts their external process on shutdown"""
+        with self._cond:
+            if cancel is None:
+                self._running.pop(job_id, None)
+            else:
+                self._running[job_id] = cancel
+            stopping = self._stopping
+        if stopping and cancel is not None:
+            raise JobCancelled()
+
+    def _next_job(self):
+        with self._cond:
+            while not self._heap and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            _, job_id = heapq.heappop(self._heap)
+        return job_id
+
+    def _worker(self):
+        while True:
+            job_id = self._next_job()
+            if job_id is None:
+                return
+            job = self._claim(job_id)
+            if job:
+                self._run(job)
+
+    def _claim(self, job_id):
+        """Atomically move a queued job to running; None if someone else has it"""
+        with self.db.get_cursor() as cursor:
+            cursor.execute("""
+                UPDATE media_jobs SET status = 'running', started_at = datetime('now'), error = NULL
+                WHERE id = ? AND status = 'queued'
+            """, (job_id,))
+            if cursor.rowcount != 1:
+                return None
+            cursor.execute("SELECT * FROM media_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def _run(self, job):
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+        self._progress[job_id] = 0.0
+        last_persist = [0.0]
+
+        def progress(fraction):
+            fraction = max(0.0, min(1.0, float(fraction)))
+            self._progress[job_id] = fraction
+            now = time.monotonic()
+            if now - last_persist[0] >= PROGRESS_PERSIST_SECONDS:
+                last_persist[0] = now
+                self.db.execute("UPDATE media_jobs SET progress = ? WHERE id = ?", (fraction, job_id))
+
+        ok = False
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {job['kind']}")
+            handler(job, progress)
+            ok = True
+            self.db.execute("""
+                UPDATE media_jobs SET status = 'done', progress = 1, finished_at = datetime('now') WHERE id = ?
+            """, (job_id,))
+        except JobCancelled:
+            # Left as 'running'; start() requeues it next time
+            logger.info("Media job %s (%s) interrupted by shutdown", job_id, job["kind"])
+            return
+        except Exception as e:
+            logger.error("Media job %s (%s) failed: %s", job_id, job["kind"], e)
+            traceback.print_exc()
+            self.db.execute("""
+                UPDATE media_jobs SET status = 'failed', error = ?, finished_at = datetime('now') WHERE id = ?
+            """, (str(e), job_id))
+        finally:
+            self._progress.pop(job_id, None)
+            with self._cond:
+                self._running.pop(job_id, None)
+        for hook in list(self.done_hooks):
+            try:
+                hook(job, ok)
+            except Exception as e:
+                logger.error("Media job hook failed for %s: %s", job_id, e)
+
+
+# Global instance
+media_jobs = MediaJobQueue()
@@ -0,0 +1,109 @@
+import subprocess
+import time
+from pathlib import Path
+
+from database.db_manager import db
+from utils.logger import logger
+from utils.media_jobs import media_jobs
+from utils.media_store import update_shared
+from utils.transcode import parse_rate, primary_video_stream, probe_media, startupinfo
+
+# Keyframe spacing is estimated from the packets of the first minute
+KEYFRAME_SCAN_SECONDS = 60
+
+
+def keyframe_interval(path):
+    """Average seconds between video keyframes, read from packet flags (no decoding)"""
+    res = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-read_intervals", f"%+{KEYFRAME_SCAN_SECONDS}",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(path),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=120,
+        startupinfo=startupinfo(),
+    )
+    times = []
+    for line in res.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                pass
+    times.sort()
+    if len(times) < 2:
+        return None
+    return round((times[-1] - times[0]) / (len(times) - 1), 3)
+
+
+def describe_media(path: Path, media_type):
+    """Probe columns for a media file, as stored on the media row"""
+    info = probe_media(path)
+    if info is None:
+        raise RuntimeError(f"ffprobe could not read {path.name}")
+    fmt = info.get("format") or {}
+    streams = info.get("streams") or []
+    video = primary_video_stream(info)
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), None)
+    meta = {
+        "duration_ms": None,
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "fps": None,
+        "video_codec": video.get("codec_name") if video else None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "bit_rate": int(fmt["bit_rate"]) if str(fmt.get("bit_rate") or "").isdigit() else None,
+        "keyframe_interval": None,
+    }
+    if media_type == "video":
+        duration = parse_rate(fmt.get("duration")) or parse_rate((video or {}).get("duration"))
+        meta["duration_ms"] = int(duration * 1000) if duration else None
+        fps = parse_rate((video or {}).get("avg_frame_rate")) or parse_rate((video or {}).get("r_frame_rate"))
+        meta["fps"] = round(fps, 3) if fps else None
+        if video:
+            meta["keyframe_interval"] = keyframe_interval(path)
+    return meta
+
+
+def probe_job(job, progress):
+    media = db.fetch_one("SELECT id, path, type FROM media WHERE id = ?", (job["media_id"],))
+    if not media:
+        raise RuntimeError("Media not found")
+    path = Path(media["path"])
+    if not path.exists():
+        raise RuntimeError(f"Media file missing: {path}")
+    try:
+        meta = describe_media(path, media["type"])
+    except FileNotFoundError:
+        logger.warning("ffprobe not found, media %s left unprobed", media["id"])
+        return
+    meta["probed_at"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    update_shared(media["id"], meta)
+    logger.info(
+        "Probed media %s: %sx%s %s %sms",
+        media["id"], meta["width"], meta["height"], meta["video_codec"], meta["duration_ms"],
+    )
+
+
+def backfill_probes():
+    """Queue a probe for playable media that predates probing (low priority)"""
+    rows = db.fetch_all("""
+        SELECT id FROM media m
+        WHERE m.type IN ('video', 'image') AND m.probed_at IS NULL
+          AND COALESCE(m.status, 'ready') = 'ready'
+          AND NOT EXISTS (
+              SELECT 1 FROM media_jobs j
+              WHERE j.media_id = m.id AND j.kind = 'probe'
+          )
+    """)
+    for row in rows:
+        media_jobs.enqueue("probe", media_id=row["id"], priority=-1)
+    if rows:
+        logger.info("Queued %s media probes", len(rows))
+
+
+media_jobs.register_handler("probe", probe_job)
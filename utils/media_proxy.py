@@ -0,0 +1,100 @@
+from pathlib import Path
+
+from database.db_manager import db
+from utils.logger import logger
+from utils.media_jobs import media_jobs
+from utils.media_store import derived_dir, derived_key, update_shared
+from utils.transcode import run_ffmpeg
+
+# Preview renditions for the web UI; playout always uses the full rendition
+PROXY_VIDEO_HEIGHT = 360
+PROXY_VIDEO_MAXRATE = "700k"
+PROXY_IMAGE_MAX_WIDTH = 1280
+# Failed proxy jobs per media after which backfill_proxies() stops retrying
+PROXY_MAX_ATTEMPTS = 3
+
+
+def proxy_args(media_type, src, out):
+    if media_type == "video":
+        return [
+            "-i", src,
+            "-map", "0:v:0", "-map", "0:a:0?", "-sn", "-dn",
+            "-vf", f"scale=-2:'min({PROXY_VIDEO_HEIGHT},ih)'",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-crf", "28",
+            "-maxrate", PROXY_VIDEO_MAXRATE,
+            "-bufsize", "1400k",
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac",
+            "-b:a", "64k",
+            "-ac", "2",
+            "-movflags", "+faststart",
+            out,
+        ]
+    return [
+        "-i", src,
+        "-frames:v", "1",
+        "-vf", f"scale='min({PROXY_IMAGE_MAX_WIDTH},iw)':-2",
+        "-q:v", "4",
+        out,
+    ]
+
+
+def proxy_job(job, progress):
+    media = db.fetch_one(
+        "SELECT id, path, type, content_hash, duration_ms FROM media WHERE id = ?", (job["media_id"],)
+    )
+    if not media:
+        raise RuntimeError("Media not found")
+    src = Path(media["path"])
+    if not src.exists():
+        raise RuntimeError(f"Media file missing: {src}")
+    out_dir = derived_dir(derived_key(media))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    name = "proxy.mp4" if media["type"] == "video" else "proxy.jpg"
+    out = out_dir / name
+    tmp = out_dir / f"tmp-{job['id']}-{name}"
+    duration = (media["duration_ms"] or 0) / 1000.0 or None
+    try:
+        run_ffmpeg(job["id"], proxy_args(media["type"], src, tmp), duration, progress)
+    except FileNotFoundError:
+        # Fail the job so backfill_proxies() can retry it on a later start
+        raise RuntimeError("ffmpeg not found, no preview proxy")
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(out)
+    update_shared(media["id"], {"proxy_path": str(out)})
+    logger.info("Preview proxy for media %s: %s (%s bytes)", media["id"], out.name, out.stat().st_size)
+
+
+def backfill_proxies():
+    """Queue proxies for media without a usable one (lowest priority).
+
+    Covers media that predates proxies, earlier proxy jobs that failed (e.g.
+    no ffmpeg at the time) and proxy files that have gone missing. Media whose
+    proxy already failed PROXY_MAX_ATTEMPTS times is left alone until those
+    jobs age out of media_jobs (see MediaJobQueue.start).
+    """
+    rows = db.fetch_all("""
+        SELECT id, proxy_path FROM media m
+        WHERE m.type IN ('video', 'image')
+          AND COALESCE(m.status, 'ready') = 'ready'
+          AND NOT EXISTS (
+              SELECT 1 FROM media_jobs j
+              WHERE j.media_id = m.id AND j.kind = 'proxy' AND j.status IN ('queued', 'running')
+          )
+          AND (
+              SELECT COUNT(*) FROM media_jobs j
+              WHERE j.media_id = m.id AND j.kind = 'proxy' AND j.status = 'failed'
+          ) < ?
+    """, (PROXY_MAX_ATTEMPTS,))
+    rows = [row for row in rows if not (row["proxy_path"] and Path(row["proxy_path"]).exists())]
+    for row in rows:
+        media_jobs.enqueue("proxy", media_id=row["id"], priority=-2)
+    if rows:
+        logger.info("Queued %s preview proxies", len(rows))
+
+
+media_jobs.register_handler("proxy", proxy_job)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+from database.db_manager import db
+from utils.config import MEDIA_DIR
+from utils.logger import logger
+
+BLOB_DIR = MEDIA_DIR / "blobs"
+INCOMING_DIR = MEDIA_DIR / "incoming"
+# Preview renditions and other files derived from a blob, one directory per content
+DERIVED_DIR = MEDIA_DIR / "derived"
+# Size-bounded thumbnail cache, managed by utils.media_thumbs
+THUMB_DIR = MEDIA_DIR / "thumbs"
+
+# Columns filled in by background jobs (probe, proxy); copied to deduplicated rows
+DERIVED_COLUMNS = (
+    "duration_ms", "width", "height", "fps", "video_codec", "audio_codec",
+    "bit_rate", "keyframe_interval", "probed_at", "proxy_path",
+)
+
+# Serializes "is this blob still referenced?" decisions against new references to it
+_store_lock = threading.Lock()
+
+
+def incoming_path(suffix):
+    """Scratch path for bytes whose hash is not known yet; same filesystem as the blobs"""
+    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+    return INCOMING_DIR / f"{uuid.uuid4().hex}{suffix}.part"
+
+
+def blob_path(content_hash, suffix):
+    """MEDIA_DIR/blobs/ab/cd/abcd...<suffix>"""
+    return BLOB_DIR / content_hash[:2] / content_hash[2:4] / f"{content_hash}{suffix}"
+
+
+def blob_files(content_hash):
+    """Blob(s) stored for content_hash, whatever their suffix"""
+    folder = blob_path(content_hash, "").parent
+    return list(folder.glob(f"{content_hash}.*")) if folder.exists() else []
+
+
+def derived_key(media):
+    """Name under DERIVED_DIR for a media row: its content hash, or its id for legacy rows"""
+    return media.get("content_hash") or f"media-{media['id']}"
+
+
+def derived_dir(key):
+    return DERIVED_DIR / key[:2] / key
+
+
+def add_media(original_name, media_type, src: Path, size, content_hash, suffix, status):
+    """Move src into the blob store (or drop it if identical bytes are stored) and insert a media row.
+
+    Returns (media_id, row_path, row_status, deduplicated). The reference count of
+    a blob is the number of media rows pointing at it.
+    """
+    with _store_lock:
+        existing = None
+        if content_hash:
+            existing = db.fetch_one(f"""
+                SELECT path, status, file_size, {", ".join(DERIVED_COLUMNS)} FROM media
+                WHERE content_hash = ? AND COALESCE(status, 'ready') != 'failed'
+                ORDER BY id LIMIT 1
+            """, (content_hash,))
+        probed = {}
+        if existing and Path(existing["path"]).exists():
+            src.unlink(missing_ok=True)
+            path, status, size = Path(existing["path"]), existing["status"] or "ready", existing["file_size"]
+            probed = {name: existing[name] for name in DERIVED_COLUMNS}
+            deduplicated = True
+        else:
+            path = blob_path(content_hash, suffix) if content_hash else src
+            if path != src:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src, path)
+            deduplicated = False
+        columns = "".join(f", {name}" for name in probed)
+        marks = ", ?" * len(probed)
+        media_id = db.execute(f"""
+            INSERT INTO media (name, type, path, upload_time, file_size, content_hash, status{columns})
+            VALUES (?, ?, ?, datetime('now'), ?, ?, ?{marks})
+        """, (original_name, media_type, str(path), size, content_hash, status, *probed.values()))
+    return media_id, path, status, deduplicated
+
+
+def remove_media(media_id):
+    """Delete a media row and unlink its file once no other row references it"""
+    with _store_lock:
+        media = db.fetch_one("SELECT id, path, content_hash FROM media WHERE id = ?", (media_id,))
+        if not media:
+            return False
+        with db.get_cursor() as cursor:
+            cursor.execute("DELETE FROM media WHERE id = ?", (media_id,))
+            cursor.execute("SELECT COUNT(*) FROM media WHERE path = ?", (media["path"],))
+            refs = cursor.fetchone()[0]
+            if media["content_hash"]:
+                # A transcoded row points at its rendition; the blob itself is shared by hash
+                cursor.execute("SELECT COUNT(*) FROM media WHERE content_hash = ?", (media["content_hash"],))
+                refs += cursor.fetchone()[0]
+        if refs == 0:
+            files = [Path(media["path"])]
+            if media["content_hash"]:
+                files += blob_files(media["content_hash"])
+            for file in files:
+                try:
+                    file.unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning("Could not remove media file %s: %s", file, e)
+            key = derived_key(media)
+            shutil.rmtree(derived_dir(key), ignore_errors=True)
+            shutil.rmtree(THUMB_DIR / key[:2] / key, ignore_errors=True)
+            db.execute("DELETE FROM thumb_cache WHERE key = ?", (key,))
+    return True
+
+
+def update_shared(media_id, fields):
+    """Set columns on media_id and on every other media row sharing its content"""
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    db.execute(f"""
+        UPDATE media SET {assignments}
+        WHERE id = ? OR (content_hash IS NOT NULL AND content_hash = (SELECT content_hash FROM media WHERE id = ?))
+    """, (*fields.values(), media_id, media_id))
+
+
+def update_rendition(media_id, path: Path, size, status):
+    """Point every media row sharing media_id's content at a (new) rendition"""
+    update_shared(media_id, {"path": str(path), "file_size": size, "status": status})
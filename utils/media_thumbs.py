@@ -0,0 +1,183 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from database.db_manager import db
+from utils.config import config
+from utils.logger import logger
+from utils.media_jobs import media_jobs
+from utils.media_store import THUMB_DIR, derived_key
+from utils.transcode import probe_duration, run_ffmpeg
+
+THUMB_NAMES = ("poster.jpg", "sprite.jpg", "thumb.jpg")
+POSTER_WIDTH = 320
+SPRITE_FRAME_WIDTH = 160
+SPRITE_COLUMNS = 5
+SPRITE_FRAMES = 10
+# last_access is written back at most this often per entry
+TOUCH_INTERVAL_SECONDS = 60
+
+
+class ThumbnailCache:
+    """Poster frames, scrub sprites and image thumbnails, keyed by content hash.
+
+    Files are produced by the "thumbs" job (ffmpeg processes supervised by the
+    media job pool), never while serving a request. The cache directory is
+    bounded by thumbnails.cache_mb; least recently served entries are evicted
+    and queued again the next time the library lists them.
+    """
+
+    def __init__(self, manager=db):
+        self.db = manager
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._pending = set()
+        self._failed = set()
+
+    def entry_dir(self, key):
+        return THUMB_DIR / key[:2] / key
+
+    def entries(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        marks = ",".join("?" * len(keys))
+        rows = self.db.fetch_all(f"SELECT * FROM thumb_cache WHERE key IN ({marks})", keys)
+        return {row["key"]: row for row in rows}
+
+    def urls(self, entry):
+        """URLs (and sprite geometry) for an entry, as returned by /api/media"""
+        if not entry:
+            return None
+        base = f"/api/thumbs/{entry['key']}"
+        if entry["kind"] == "image":
+            return {"thumb_url": f"{base}/thumb.jpg"}
+        out = {"poster_url": f"{base}/poster.jpg"}
+        if entry.get("sprite_frames"):
+            out["sprite_url"] = f"{base}/sprite.jpg"
+            out["sprite"] = {
+                "frames": entry["sprite_frames"],
+                "columns": entry["sprite_columns"],
+                "interval": entry["sprite_interval"],
+            }
+        return out
+
+    def request(self, media):
+        """Queue generation for a media row without thumbnails (cheap; safe on the request path)"""
+        with self._lock:
+            if media["id"] in self._pending or media["id"] in self._failed:
+                return
+            self._pending.add(media["id"])
+        media_jobs.enqueue("thumbs", media_id=media["id"], priority=-2)
+
+    def touch(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(key, 0) < TOUCH_INTERVAL_SECONDS:
+                return
+            self._touched[key] = now
+        self.db.execute("UPDATE thumb_cache SET last_access = datetime('now') WHERE key = ?", (key,))
+
+    def file(self, key, name):
+        if name not in THUMB_NAMES or "/" in key or "\\" in key or key.startswith("."):
+            return None
+        path = self.entry_dir(key) / name
+        return path if path.is_file() else None
+
+    def generate(self, job, progress):
+        media = self.db.fetch_one(
+            "SELECT id, path, type, content_hash, duration_ms FROM media WHERE id = ?", (job["media_id"],)
+        )
+        if not media:
+            raise RuntimeError("Media not found")
+        src = Path(media["path"])
+        if not src.exists():
+            raise RuntimeError(f"Media file missing: {src}")
+        key = derived_key(media)
+        if self.entries([key]):
+            return
+        out_dir = self.entry_dir(key)
+        tmp_dir = out_dir.with_name(f"{key}.tmp-{job['id']}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        sprite = (None, None, None)
+        try:
+            if media["type"] == "video":
+                duration = (media["duration_ms"] or 0) / 1000.0 or probe_duration(src) or 0
+                seek = min(duration * 0.1, 5.0) if duration else 0
+                run_ffmpeg(job["id"], [
+                    "-ss", f"{seek:.3f}", "-i", src,
+                    "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2", "-q:v", "4",
+                    tmp_dir / "poster.jpg",
+                ], None, lambda _: None)
+                progress(0.3)
+                if duration:
+                    interval = duration / SPRITE_FRAMES
+                    rows = -(-SPRITE_FRAMES // SPRITE_COLUMNS)
+                    run_ffmpeg(job["id"], [
+                        "-i", src, "-an", "-sn",
+                        "-vf", f"fps=1/{interval:.4f},scale={SPRITE_FRAME_WIDTH}:-2,tile={SPRITE_COLUMNS}x{rows}",
+                        "-frames:v", "1", "-q:v", "5",
+                        tmp_dir / "sprite.jpg",
+                    ], duration, lambda f: progress(0.3 + 0.7 * f))
+                    sprite = (SPRITE_FRAMES, SPRITE_COLUMNS, round(interval, 3))
+            else:
+                run_ffmpeg(job["id"], [
+                    "-i", src,
+                    "-frames:v", "1", "-vf", f"scale='min({POSTER_WIDTH},iw)':-2", "-q:v", "4",
+                    tmp_dir / "thumb.jpg",
+                ], None, lambda _: None)
+        except FileNotFoundError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.warning("ffmpeg not found, no thumbnails for media %s", media["id"])
+            with self._lock:
+                self._failed.add(media["id"])
+            return
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        shutil.rmtree(out_dir, ignore_errors=True)
+        tmp_dir.replace(out_dir)
+        size = sum(p.stat().st_size for p in out_dir.iterdir())
+        self.db.execute("""
+            INSERT OR REPLACE INTO thumb_cache
+                (key, kind, bytes, sprite_frames, sprite_columns, sprite_interval, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        """, (key, "video" if media["type"] == "video" else "image", size, *sprite))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Drop least recently served entries until the cache fits thumbnails.cache_mb"""
+        limit = int(config.get("thumbnails.cache_mb", 512) or 512) * 1024 * 1024
+        total = (self.db.fetch_one("SELECT COALESCE(SUM(bytes), 0) AS total FROM thumb_cache") or {}).get("total", 0)
+        if total <= limit:
+            return
+        for row in self.db.fetch_all("SELECT key, bytes FROM thumb_cache ORDER BY last_access, created_at"):
+            if total <= limit:
+                break
+            if row["key"] == keep:
+                continue
+            self.remove(row["key"])
+            total -= row["bytes"] or 0
+        logger.info("Thumbnail cache evicted down to %.1f MB", total / 1024 / 1024)
+
+    def remove(self, key):
+        self.db.execute("DELETE FROM thumb_cache WHERE key = ?", (key,))
+        shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+        with self._lock:
+            self._touched.pop(key, None)
+
+    def _on_job_done(self, job, ok):
+        if job["kind"] == "thumbs":
+            with self._lock:
+                self._pending.discard(job.get("media_id"))
+                # Not retried from the library listing until the next start
+                if not ok:
+                    self._failed.add(job.get("media_id"))
+
+
+# Global instance
+thumbnails = ThumbnailCache()
+media_jobs.register_handler("thumbs", thumbnails.generate)
+media_jobs.add_done_hook(thumbnails._on_job_done)
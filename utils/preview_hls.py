@@ -0,0 +1,269 @@
+import math
+import subprocess
+import threading
+import time
+from collections import deque
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor, QImage, QPainter
+
+from utils.config import config
+from utils.logger import logger
+from utils.transcode import startupinfo
+
+TS_PACKET = 188
+# Viewers poll the playlist about once per segment; the encoder stops when they are gone
+IDLE_STOP_SECONDS = 15
+# Segments listed in the playlist; the ring keeps a few more for clients that lag behind
+PLAYLIST_SEGMENTS = 4
+RING_SEGMENTS = 8
+MAX_RING_BYTES = 16 * 1024 * 1024
+
+
+def _ts_is_keyframe_start(pkt):
+    """PES start carrying the random access indicator (ffmpeg sets it on every keyframe)"""
+    if not pkt[1] & 0x40:
+        return False
+    adaptation = (pkt[3] >> 4) & 0x3
+    return adaptation in (2, 3) and pkt[4] > 0 and bool(pkt[5] & 0x40)
+
+
+def _ts_pmt_pid(pat):
+    """First program's PMT PID from a single-packet PAT"""
+    section = 5 + pat[4]
+    return ((pat[section + 10] & 0x1F) << 8) | pat[section + 11]
+
+
+class HlsPreview:
+    """Low-bitrate HLS channel of the rendered output, held entirely in memory.
+
+    OutputFrameCapture hands grabbed frames to push() while someone watches.
+    A writer thread feeds the newest frame to a single ffmpeg process at a
+    constant rate (repeating it when the picture is still), and a reader
+    thread cuts ffmpeg's MPEG-TS output at keyframes into a bounded ring of
+    segments. Keyframes are forced every preview.hls_segment_seconds, so each
+    segment is exactly one GOP. The encoder is started by the first playlist
+    request and stopped once nobody has asked for IDLE_STOP_SECONDS.
+    """
+
+    def __init__(self):
+        self.fps = max(1, int(config.get("preview.hls_fps", 10) or 10))
+        self.width = int(config.get("preview.hls_width", 640) or 640) // 2 * 2
+        self.height = int(config.get("preview.hls_height", 360) or 360) // 2 * 2
+        self.segment_seconds = max(1, int(config.get("preview.hls_segment_seconds", 2) or 2))
+        self.bitrate = str(config.get("preview.hls_bitrate", "400k") or "400k")
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._segments = deque()
+        self._next_seq = 0
+        self._latest = None
+        self._proc = None
+        self._last_request = 0.0
+        self.available = True
+
+    # -- demand ---------------------------------------------------------------
+
+    def note_request(self):
+        """Record a viewer request; True if frames are not flowing yet and capture must be woken"""
+        self._last_request = time.monotonic()
+        return self._proc is None
+
+    def stop(self):
+        """Let the writer finish; ffmpeg exits on end of input"""
+        self._last_request = 0.0
+
+    def wanted(self):
+        return self.available and time.monotonic() - self._last_request <= IDLE_STOP_SECONDS
+
+    @property
+    def interval_ms(self):
+        return max(1, int(1000 / self.fps))
+
+    # -- input ------------------------------------------------------------------
+
+    def push(self, image):
+        """Offer the current output frame (GUI thread); None means nothing is shown"""
+        with self._lock:
+            self._latest = image
+            if self._proc is None and self.available:
+                self._start()
+
+    def _start(self):
+        gop = self.fps * self.segment_seconds
+        cmd = [
+            "ffmpeg", "-nostdin", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{self.width}x{self.height}",
+            "-framerate", str(self.fps), "-i", "pipe:0",
+            "-an", "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency",
+            "-b:v", self.bitrate, "-maxrate", self.bitrate, "-bufsize", self.bitrate,
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-pix_fmt", "yuv420p",
+            "-f", "mpegts", "pipe:1",
+        ]
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                startupinfo=startupinfo(),
+            )
+        except FileNotFoundError:
+            logger.warning("ffmpeg not found, HLS preview disabled")
+            self.available = False
+            # Playlist requests waiting for a first segment can answer right away
+            self._ready.notify_all()
+            return
+        # Sequence numbers keep counting across runs
+        self._segments.clear()
+        self._proc = proc
+        threading.Thread(target=self._write_frames, args=(proc,), name="HlsPreviewWriter", daemon=True).start()
+        threading.Thread(target=self._read_segments, args=(proc,), name="HlsPreviewReader", daemon=True).start()
+        logger.info("HLS preview encoder started (%sx%s @ %s fps)", self.width, self.height, self.fps)
+
+    def _frame_bytes(self, image):
+        canvas = QImage(self.width, self.height, QImage.Format.Format_RGB888)
+        canvas.fill(QColor(0, 0, 0))
+        if image is not None and not image.isNull():
+            scaled = image.scaled(
+                self.width, self.height,
+                Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation,
+            )
+            painter = QPainter(canvas)
+            painter.drawImage((self.width - scaled.width()) // 2, (self.height - scaled.height()) // 2, scaled)
+            painter.end()
+        # RGB888 rows are 32-bit aligned; strip the padding when width * 3 is not
+        stride = self.width * 3
+        raw = canvas.constBits().asstring(canvas.sizeInBytes())
+        if canvas.bytesPerLine() == stride:
+            return raw
+        bpl = canvas.bytesPerLine()
+        return b"".join(raw[y * bpl:y * bpl + stride] for y in range(self.height))
+
+    def _write_frames(self, proc):
+        period = 1.0 / self.fps
+        source = None
+        frame = None
+        next_at = time.monotonic()
+        try:
+            while time.monotonic() - self._last_request <= IDLE_STOP_SECONDS:
+                with self._lock:
+                    latest = self._latest
+                if frame is None or latest is not source:
+                    source = latest
+                    frame = self._frame_bytes(latest)
+                proc.stdin.write(frame)
+                next_at += period
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    next_at = time.monotonic()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            logger.warning("HLS preview encoder input closed: %s", e)
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            with self._lock:
+                if self._proc is proc:
+                    self._proc = None
+                    self._latest = None
+                    # Segments of this run have timestamps unrelated to the next one; never
+                    # serve them after a restart
+                    self._segments.clear()
+            logger.info("HLS preview encoder stopped (exit %s)", proc.returncode)
+
+    def _read_segments(self, proc):
+        pat = pmt = None
+        pmt_pid = video_pid = None
+        current = None
+        frames = 0
+        pending = b""
+        while True:
+            chunk = proc.stdout.read(TS_PACKET * 64)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % TS_PACKET
+            data, pending = pending[:usable], pending[usable:]
+            for offset in range(0, usable, TS_PACKET):
+                pkt = data[offset:offset + TS_PACKET]
+                if pkt[0] != 0x47:
+                    continue
+                pid = ((pkt[1] & 0x1F) << 8) | pkt[2]
+                if pid == 0:
+                    pat = pkt
+                    pmt_pid = _ts_pmt_pid(pkt)
+                elif pid == pmt_pid:
+                    pmt = pkt
+                elif _ts_is_keyframe_start(pkt) and pat and pmt:
+                    if current is not None and frames:
+                        self._publish(proc, bytes(current), frames / self.fps)
+                    current = bytearray(pat + pmt)
+                    frames = 0
+                    video_pid = pid
+                if current is None:
+                    continue
+                current += pkt
+                # One PES per frame on the video PID
+                if pid == video_pid and pkt[1] & 0x40:
+                    frames += 1
+                if len(current) > MAX_RING_BYTES // 2:
+                    # No keyframe for far too long; drop rather than grow
+                    current, frames = None, 0
+        proc.stdout.close()
+
+    def _publish(self, proc, data, duration):
+        with self._ready:
+            if self._proc is not proc:
+                # Output still draining from a run that has already stopped
+                return
+            self._segments.append((self._next_seq, duration, data))
+            self._next_seq += 1
+            total = sum(len(seg[2]) for seg in self._segments)
+            while len(self._segments) > RING_SEGMENTS or (len(self._segments) > 1 and total > MAX_RING_BYTES):
+                total -= len(self._segments.popleft()[2])
+            self._ready.notify_all()
+
+    # -- output -----------------------------------------------------------------
+
+    def playlist(self):
+        """Sliding-window media playlist, or None while no segment exists yet"""
+        with self._lock:
+            segments = list(self._segments)[-PLAYLIST_SEGMENTS:]
+        if not segments:
+            return None
+        target = max(math.ceil(duration) for _, duration, _ in segments)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{target}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0][0]}",
+        ]
+        for seq, duration, _ in segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(f"{seq}.ts")
+        return "\n".join(lines) + "\n"
+
+    def segment(self, seq):
+        with self._lock:
+            for number, _, data in self._segments:
+                if number == seq:
+                    return data
+        return None
+
+    def wait_ready(self, timeout):
+        """Block until at least one segment exists (worker thread only)"""
+        with self._ready:
+            return self._ready.wait_for(lambda: bool(self._segments) or not self.available, timeout)
+
+
+# Global instance
+hls_preview = HlsPreview()
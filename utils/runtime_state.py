@@ -13,9 +13,24 @@ current = {
     "scheduler_playing": False,
     "scheduler_paused": False,
     "scheduler_window_blocked": False,
+    # Timing of the last output transition (see MediaPlayer.transition_timed)
+    "last_transition": None,
 }
 
+import threading
+import time
+import uuid
+
 snapshot = None
+# Bumped whenever the snapshot changes; the ETag is "<boot>-<version>" so a
+# restart never matches a validator a browser kept from the previous run
+snapshot_version = 0
+snapshot_boot = uuid.uuid4().hex[:8]
+snapshot_last_request = 0.0
+snapshot_last_stream_request = 0.0
+snapshot_capturing = False
+snapshot_listeners = []
+_snapshot_lock = threading.Lock()
 
 def set_play_start(schedule_id, media_id, media_name, media_type, path, total, text_size=None, text_color=None, bg_color=None, text_scroll_mode=None):
     current["schedule_id"] = schedule_id
@@ -35,18 +50,57 @@ def set_time(elapsed, total=None):
     if total is not None:
         current["total"] = int(total or 0)
 
+def set_transition(info):
+    current["last_transition"] = info
+
 def set_scheduler_state(is_playing, paused, window_blocked):
     current["scheduler_playing"] = bool(is_playing)
     current["scheduler_paused"] = bool(paused)
     current["scheduler_window_blocked"] = bool(window_blocked)
 
 def set_snapshot(data):
-    global snapshot
-    snapshot = data
+    global snapshot, snapshot_version
+    with _snapshot_lock:
+        if data is None and snapshot is None:
+            return
+        snapshot = data
+        snapshot_version += 1
+    for listener in list(snapshot_listeners):
+        listener()
+
+def add_snapshot_listener(listener):
+    """listener() is called on the publishing thread after every snapshot change"""
+    snapshot_listeners.append(listener)
 
 def get_snapshot():
     return snapshot
 
+def get_snapshot_versioned():
+    """(jpeg bytes or None, ETag) read consistently"""
+    with _snapshot_lock:
+        return snapshot, f'"{snapshot_boot}-{snapshot_version}"'
+
+def note_snapshot_request(stream=False):
+    """Record that a client wants snapshots (stream=True: a live viewer wants the stream rate).
+
+    Returns True if capture is idle and must be woken.
+    """
+    global snapshot_last_request, snapshot_last_stream_request
+    snapshot_last_request = time.monotonic()
+    if stream:
+        snapshot_last_stream_request = snapshot_last_request
+    return not snapshot_capturing
+
+def snapshot_demand_age():
+    return time.monotonic() - snapshot_last_request
+
+def snapshot_stream_age():
+    return time.monotonic() - snapshot_last_stream_request
+
+def set_snapshot_capturing(active):
+    global snapshot_capturing
+    snapshot_capturing = bool(active)
+
 def clear():
     current["schedule_id"] = None
     current["media_id"] = None
@@ -0,0 +1,355 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+from PyQt6.QtCore import QRect, Qt
+from PyQt6.QtGui import QImage
+
+from database.db_manager import db
+from utils.camera_capture import camera_capture
+from utils.command_bus import command_bus
+from utils.config import config
+from utils.logger import logger
+from utils.runtime_state import add_snapshot_listener, current as runtime_current, get_snapshot, note_snapshot_request
+
+# Both frames are reduced to this before any comparison
+ANALYSIS_WIDTH = 64
+ANALYSIS_HEIGHT = 36
+# Levels are fractions of full scale after exposure normalisation
+DARK_LEVEL = 0.08
+LIT_LEVEL = 0.2
+# A lit output cell whose camera cell reaches less than this share of it is dead
+DEAD_RATIO = 0.3
+# Below this spread the output is treated as a flat colour (correlation is meaningless)
+FLAT_STD = 0.02
+# Camera frames older than this are not compared (capture is reconnecting)
+MAX_CAMERA_AGE_SECONDS = 5
+PRUNE_INTERVAL_SECONDS = 3600
+# Output snapshots kept for aligning them with the delayed camera picture
+OUTPUT_HISTORY_SECONDS = 10
+# Checks are written in batches, one small transaction per minute instead of one per check
+FLUSH_INTERVAL_SECONDS = 60
+
+INSERT_CHECK_SQL = """
+    INSERT INTO screen_health_checks
+        (checked_at, camera_id, media_id, schedule_id, status, similarity,
+         camera_level, output_level, dead_cells, dead_map)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def to_gray(jpeg, roi=None):
+    """Decode a JPEG into an ANALYSIS_HEIGHT x ANALYSIS_WIDTH float32 array in 0..1.
+
+    roi = (x, y, w, h) as fractions of the frame crops the camera image to the
+    part that shows the screen.
+    """
+    image = QImage.fromData(jpeg)
+    if image.isNull():
+        return None
+    if roi:
+        x, y, w, h = roi
+        image = image.copy(QRect(
+            int(x * image.width()), int(y * image.height()),
+            max(1, int(w * image.width())), max(1, int(h * image.height())),
+        ))
+    small = image.scaled(
+        ANALYSIS_WIDTH, ANALYSIS_HEIGHT,
+        Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation,
+    ).convertToFormat(QImage.Format.Format_Grayscale8)
+    raw = np.frombuffer(small.constBits().asstring(small.sizeInBytes()), dtype=np.uint8)
+    return raw.reshape(ANALYSIS_HEIGHT, small.bytesPerLine())[:, :ANALYSIS_WIDTH].astype(np.float32) / 255.0
+
+
+def cell_means(frame, rows, cols):
+    h = frame.shape[0] // rows * rows
+    w = frame.shape[1] // cols * cols
+    return frame[:h, :w].reshape(rows, h // rows, cols, w // cols).mean(axis=(1, 3))
+
+
+def compare_frames(camera, output, grid=(8, 4)):
+    """Similarity (0..1) of what the camera sees to what was rendered, plus a dead-cell map.
+
+    Both frames are scaled so their 95th percentile is full scale, which takes
+    out camera exposure and screen brightness. Similarity is the correlation of
+    the normalised frames; for a flat-colour output it is the share of lit grid
+    cells the camera also sees lit. None means the output is black, so there is
+    nothing to verify.
+    """
+    cols, rows = grid
+    camera_level = float(np.percentile(camera, 95))
+    output_level = float(np.percentile(output, 95))
+    result = {
+        "similarity": None,
+        "camera_level": round(camera_level, 3),
+        "output_level": round(output_level, 3),
+        "dead": np.zeros((rows, cols), dtype=bool),
+    }
+    if output_level < DARK_LEVEL:
+        return result
+    cam = camera / max(camera_level, 1e-3)
+    out = output / output_level
+    out_cells = cell_means(out, rows, cols)
+    cam_cells = cell_means(cam, rows, cols)
+    lit = out_cells > LIT_LEVEL
+    if camera_level < DARK_LEVEL:
+        # The camera sees no light at all: every lit cell is dead
+        result["dead"] = lit
+        result["similarity"] = 0.0
+        return result
+    dead = lit & (cam_cells < DEAD_RATIO * out_cells)
+    result["dead"] = dead
+    if out.std() < FLAT_STD:
+        result["similarity"] = round(1.0 - dead.sum() / max(int(lit.sum()), 1), 3)
+        return result
+    a = cam - cam.mean()
+    b = out - out.mean()
+    denom = float(np.sqrt((a * a).sum() * (b * b).sum()))
+    corr = float((a * b).sum()) / denom if denom > 0 else 0.0
+    result["similarity"] = round(max(0.0, corr), 3)
+    return result
+
+
+def dead_map_text(dead):
+    """Grid rows top to bottom, '1' for a dead cell, joined with '/'"""
+    return "/".join("".join("1" if cell else "0" for cell in row) for row in dead)
+
+
+def _parse_grid(value):
+    try:
+        cols, rows = (int(v) for v in str(value).lower().split("x"))
+        if cols > 0 and rows > 0:
+            return cols, rows
+    except ValueError:
+        pass
+    return 8, 4
+
+
+class ScreenHealthMonitor:
+    """Periodically checks that the LED wall, as seen by the camera, shows the output.
+
+    Every screen_health.interval_seconds the newest camera frame is compared
+    with the current output snapshot (both already in memory, so a check costs
+    two small decodes and a few NumPy reductions). Checks are stored in batches
+    in screen_health_checks next to the playing media/schedule; when similarity
+    stays below screen_health.threshold for screen_health.alert_seconds an alert
+    is opened in screen_health_alerts and closed when the picture recovers.
+
+    The camera shows the wall screen_health.camera_latency_ms late (RTSP
+    buffering, encode/decode), so a camera frame is compared with the output
+    snapshots that were on screen around its capture time minus that latency,
+    within +/- screen_health.align_tolerance_ms, and the best match counts.
+    Moving video therefore does not read as a mismatch.
+
+    While the monitor runs it keeps requesting output snapshots, so output
+    capture never goes idle (see OutputFrameCapture); enabling
+    screen_health.enabled costs one grab and encode per
+    preview.snapshot_interval_ms for as long as a camera is configured.
+    """
+
+    def __init__(self, manager=db):
+        self.db = manager
+        self.interval = float(config.get("screen_health.interval_seconds", 2) or 2)
+        self.threshold = float(config.get("screen_health.threshold", 0.5) or 0.5)
+        self.alert_seconds = float(config.get("screen_health.alert_seconds", 10) or 10)
+        self.camera_id = int(config.get("screen_health.camera_id", 1) or 1)
+        self.grid = _parse_grid(config.get("screen_health.grid", "8x4"))
+        self.roi = config.get("screen_health.camera_roi", None)
+        self.retention_days = int(config.get("screen_health.retention_days", 7) or 7)
+        self.camera_latency = float(config.get("screen_health.camera_latency_ms", 1000) or 0) / 1000
+        self.align_tolerance = float(config.get("screen_health.align_tolerance_ms", 1000) or 0) / 1000
+        # (shown_at epoch seconds, jpeg); a snapshot is on screen until the next one
+        self._outputs = deque()
+        self._outputs_lock = threading.Lock()
+        self._gray_cache = {}
+        self._listening = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._bad_since = None
+        self._alert_id = None
+        self._last_prune = 0.0
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self.last_result = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        # Alerts left open by a previous run cannot be followed up any more
+        self.db.execute(
+            "UPDATE screen_health_alerts SET ended_at = ? WHERE ended_at IS NULL",
+            (datetime.now().isoformat(timespec="seconds"),),
+        )
+        self._stop.clear()
+        if not self._listening:
+            self._listening = True
+            add_snapshot_listener(self._on_snapshot)
+        self._thread = threading.Thread(target=self._run, name="ScreenHealth", daemon=True)
+        self._thread.start()
+        logger.info("Screen health monitor started; output snapshots stay active while it runs")
+
+    def _on_snapshot(self):
+        # Publishing thread; snapshots only change when the picture does
+        data = get_snapshot()
+        now = time.time()
+        with self._outputs_lock:
+            if data is not None:
+                self._outputs.append((now, data))
+            while len(self._outputs) > 1 and now - self._outputs[1][0] > OUTPUT_HISTORY_SECONDS:
+                self._outputs.popleft()
+
+    def outputs_around(self, moment):
+        """Snapshots that were on screen within align_tolerance of moment, nearest first"""
+        with self._outputs_lock:
+            history = list(self._outputs)
+        if not history:
+            current = get_snapshot()
+            return [current] if current is not None else []
+        lo, hi = moment - self.align_tolerance, moment + self.align_tolerance
+        picked = []
+        for i, (shown_at, data) in enumerate(history):
+            until = history[i + 1][0] if i + 1 < len(history) else float("inf")
+            if shown_at <= hi and until >= lo:
+                distance = 0.0 if shown_at <= moment <= until else min(abs(shown_at - moment), abs(until - moment))
+                picked.append((distance, data))
+        if not picked:
+            # Older than the history: the oldest snapshot is the best guess
+            picked = [(0.0, history[0][1])]
+        picked.sort(key=lambda item: item[0])
+        return [data for _, data in picked]
+
+    def _output_gray(self, jpeg):
+        gray = self._gray_cache.get(id(jpeg))
+        if gray is None or gray[0] is not jpeg:
+            gray = (jpeg, to_gray(jpeg))
+        return gray[1], gray
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_once()
+                if time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS:
+                    self.flush()
+            except Exception as e:
+                logger.error("Screen health check failed: %s", e)
+
+    def flush(self):
+        rows, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        if rows:
+            self.db.execute_many(INSERT_CHECK_SQL, rows)
+
+    def check_once(self):
+        worker = camera_capture.worker(self.camera_id)
+        if worker is None:
+            return None
+        # Keep output snapshots coming while the wall is being verified
+        if note_snapshot_request():
+            command_bus.send("PREVIEW_DEMAND")
+        camera_jpeg, captured_at, _ = worker.latest()
+        if camera_jpeg is None or time.time() - captured_at > MAX_CAMERA_AGE_SECONDS:
+            return None
+        outputs = self.outputs_around(captured_at - self.camera_latency)
+        if not outputs:
+            return None
+        camera = to_gray(camera_jpeg, self.roi)
+        if camera is None:
+            return None
+        result = None
+        cache = {}
+        for output_jpeg in outputs:
+            output, entry = self._output_gray(output_jpeg)
+            cache[id(output_jpeg)] = entry
+            if output is None:
+                continue
+            candidate = compare_frames(camera, output, self.grid)
+            if result is None or (candidate["similarity"] or 0) > (result["similarity"] or 0):
+                result = candidate
+        # Decoded outputs are reused by the next check while they are still in range
+        self._gray_cache = cache
+        if result is None:
+            return None
+        self._record(result)
+        return result
+
+    def _record(self, result):
+        now = datetime.now()
+        similarity = result["similarity"]
+        dead_cells = int(result["dead"].sum())
+        if similarity is None:
+            status = "idle"
+        elif similarity < self.threshold:
+            status = "mismatch"
+        elif dead_cells:
+            status = "degraded"
+        else:
+            status = "ok"
+        self.last_result = {
+            "checked_at": now.isoformat(timespec="seconds"),
+            "status": status,
+            "similarity": similarity,
+            "camera_level": result["camera_level"],
+            "output_level": result["output_level"],
+            "dead_cells": dead_cells,
+            "dead_map": dead_map_text(result["dead"]),
+        }
+        self._pending.append((
+            self.last_result["checked_at"], self.camera_id,
+            runtime_current.get("media_id"), runtime_current.get("schedule_id"),
+            status, similarity, result["camera_level"], result["output_level"],
+            dead_cells, self.last_result["dead_map"],
+        ))
+        self._update_alert(status, similarity, now)
+        if time.monotonic() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.monotonic()
+            cutoff = (now - timedelta(days=self.retention_days)).isoformat(timespec="seconds")
+            self.db.execute("DELETE FROM screen_health_checks WHERE checked_at < ?", (cutoff,))
+
+    def _update_alert(self, status, similarity, now):
+        if status != "mismatch":
+            self._bad_since = None
+            if self._alert_id is not None:
+                self.db.execute(
+                    "UPDATE screen_health_alerts SET ended_at = ? WHERE id = ?",
+                    (now.isoformat(timespec="seconds"), self._alert_id),
+                )
+                logger.info("Screen health recovered (alert %s closed)", self._alert_id)
+                self._alert_id = None
+            return
+        if self._bad_since is None:
+            self._bad_since = now
+        if self._alert_id is not None:
+            self.db.execute(
+                "UPDATE screen_health_alerts SET min_similarity = MIN(min_similarity, ?) WHERE id = ?",
+                (similarity, self._alert_id),
+            )
+            return
+        if (now - self._bad_since).total_seconds() < self.alert_seconds:
+            return
+        self.flush()
+        message = (
+            f"Camera {self.camera_id} has not matched the output for "
+            f"{int((now - self._bad_since).total_seconds())}s (similarity {similarity:.2f})"
+        )
+        with self.db.get_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO screen_health_alerts
+                    (started_at, camera_id, media_id, schedule_id, min_similarity, message)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                self._bad_since.isoformat(timespec="seconds"), self.camera_id,
+                runtime_current.get("media_id"), runtime_current.get("schedule_id"),
+                similarity, message,
+            ))
+            self._alert_id = cursor.lastrowid
+        logger.error("Screen health alert: %s", message)
+
+
+# Global instance
+screen_health = ScreenHealthMonitor()
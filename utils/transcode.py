@@ -0,0 +1,287 @@
+import json
+import os
+import struct
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+
+from database.db_manager import db
+from utils.logger import logger
+from utils.media_jobs import media_jobs, JobCancelled
+from utils.media_store import derived_dir, derived_key, update_rendition
+
+# Lines of ffmpeg stderr kept for the error message of a failed job
+STDERR_TAIL_LINES = 20
+
+
+def startupinfo():
+    """Hide the console window of ffmpeg/ffprobe on Windows"""
+    if hasattr(subprocess, "STARTUPINFO"):
+        info = subprocess.STARTUPINFO()
+        info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        return info
+    return None
+
+
+def probe_duration(path):
+    try:
+        res = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", str(path)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=30,
+            startupinfo=startupinfo(),
+        )
+        return float(res.stdout.strip())
+    except Exception:
+        return None
+
+
+# What the QML output (QtMultimedia) and the browsers previewing uploads decode reliably
+COMPATIBLE_VIDEO_CODECS = {"h264"}
+COMPATIBLE_PROFILES = {"baseline", "constrained baseline", "main", "high"}
+COMPATIBLE_PIX_FMTS = {"yuv420p", "yuvj420p"}
+COMPATIBLE_AUDIO_CODECS = {"aac"}
+MP4_SUFFIXES = {".mp4", ".m4v"}
+MAX_WIDTH = 3840
+MAX_HEIGHT = 2160
+MAX_FPS = 60.0
+
+
+def probe_media(path):
+    """Full ffprobe of container and streams, or None if ffprobe fails"""
+    res = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=60,
+        startupinfo=startupinfo(),
+    )
+    if res.returncode != 0:
+        return None
+    try:
+        return json.loads(res.stdout or "{}")
+    except ValueError:
+        return None
+
+
+def parse_rate(value):
+    """ffprobe rates look like '30000/1001'"""
+    try:
+        num, _, den = str(value).partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def moov_before_mdat(path):
+    """True if the MP4 index (moov) precedes the media data, i.e. it can start streaming at once"""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, kind = struct.unpack(">I4s", header)
+                if kind == b"moov":
+                    return True
+                if kind == b"mdat":
+                    return False
+                if size == 1:
+                    size = struct.unpack(">Q", f.read(8))[0]
+                    f.seek(size - 16, os.SEEK_CUR)
+                elif size == 0:
+                    return False
+                else:
+                    f.seek(size - 8, os.SEEK_CUR)
+    except Exception:
+        return False
+
+
+def primary_video_stream(info):
+    """First real video stream; cover art (attached_pic) is reported as video too"""
+    return next((
+        st for st in (info or {}).get("streams") or []
+        if st.get("codec_type") == "video" and not (st.get("disposition") or {}).get("attached_pic")
+    ), None)
+
+
+def plan_ingest(path: Path, info):
+    """Pick the cheapest ffmpeg path that makes the file playable.
+
+    Returns (action, reason) where action is one of:
+    keep       - already compatible, moov at the front
+    faststart  - compatible MP4, only the moov atom moves to the front
+    remux      - compatible streams in another container, stream copy into MP4
+    audio      - video is fine, only the audio track is re-encoded to AAC
+    transcode  - full H.264 re-encode
+    """
+    streams = (info or {}).get("streams") or []
+    video = primary_video_stream(info)
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), None)
+    if not video:
+        return "transcode", "no video stream found"
+
+    problems = []
+    if video.get("codec_name") not in COMPATIBLE_VIDEO_CODECS:
+        problems.append(f"codec {video.get('codec_name')}")
+    if (video.get("profile") or "").lower() not in COMPATIBLE_PROFILES:
+        problems.append(f"profile {video.get('profile')}")
+    if video.get("pix_fmt") not in COMPATIBLE_PIX_FMTS:
+        problems.append(f"pix_fmt {video.get('pix_fmt')}")
+    if (video.get("width") or 0) > MAX_WIDTH or (video.get("height") or 0) > MAX_HEIGHT:
+        problems.append(f"resolution {video.get('width')}x{video.get('height')}")
+    fps = parse_rate(video.get("avg_frame_rate")) or parse_rate(video.get("r_frame_rate"))
+    if fps > MAX_FPS + 0.5:
+        problems.append(f"fps {fps:.2f}")
+    if problems:
+        return "transcode", ", ".join(problems)
+
+    if audio and audio.get("codec_name") not in COMPATIBLE_AUDIO_CODECS:
+        return "audio", f"audio codec {audio.get('codec_name')}"
+    if path.suffix.lower() not in MP4_SUFFIXES:
+        return "remux", f"container {path.suffix.lower() or '?'}"
+    if not moov_before_mdat(path):
+        return "faststart", "moov atom after mdat"
+    return "keep", "compatible"
+
+
+def ingest_args(action, src, out, video=None):
+    """ffmpeg arguments (after the global options) for a plan_ingest action"""
+    maps = ["-map", "0:v:0", "-map", "0:a:0?", "-sn", "-dn"]
+    if action in ("faststart", "remux"):
+        codec = ["-c", "copy"]
+    elif action == "audio":
+        codec = ["-c:v", "copy", "-c:a", "aac", "-b:a", "192k"]
+    else:
+        codec = [
+            "-c:v", "libx264",
+            "-preset", "medium",
+            "-crf", "18",
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac",
+            "-b:a", "192k",
+        ]
+        filters = []
+        if video and ((video.get("width") or 0) > MAX_WIDTH or (video.get("height") or 0) > MAX_HEIGHT):
+            filters.append(f"scale='min({MAX_WIDTH},iw)':'min({MAX_HEIGHT},ih)':force_original_aspect_ratio=decrease:force_divisible_by=2")
+        if video and (parse_rate(video.get("avg_frame_rate")) or 0) > MAX_FPS + 0.5:
+            filters.append(f"fps={int(MAX_FPS)}")
+        if filters:
+            codec += ["-vf", ",".join(filters)]
+    return ["-i", src] + maps + codec + ["-movflags", "+faststart", out]
+
+
+def run_ffmpeg(job_id, args, duration, progress):
+    """Run ffmpeg with -progress output, reporting completion as a 0..1 fraction"""
+    cmd = ["ffmpeg", "-y", "-nostdin", "-loglevel", "error", "-progress", "pipe:1", "-nostats"] + [str(a) for a in args]
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        startupinfo=startupinfo(),
+    )
+    # Drain stderr while reading progress: a damaged input can log more than
+    # the pipe buffer holds, which would block ffmpeg and hang the job
+    err_tail = deque(maxlen=STDERR_TAIL_LINES)
+    err_reader = threading.Thread(target=err_tail.extend, args=(proc.stderr,), daemon=True)
+    err_reader.start()
+    try:
+        media_jobs.set_cancel(job_id, proc.kill)
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            # out_time_ms is reported in microseconds as well
+            if key in ("out_time_us", "out_time_ms") and duration:
+                try:
+                    progress(int(value) / 1_000_000 / duration)
+                except ValueError:
+                    pass
+        code = proc.wait()
+    except JobCancelled:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        media_jobs.set_cancel(job_id, None)
+        err_reader.join(5)
+    err = "".join(err_tail)
+    if code != 0:
+        if media_jobs.stopping:
+            raise JobCancelled()
+        raise RuntimeError(f"ffmpeg exited with {code}: {err.strip()[-500:]}")
+
+
+def _finish_media(media_id, path: Path, status="ready"):
+    size = None
+    try:
+        size = path.stat().st_size
+    except Exception:
+        pass
+    # Deduplicated uploads share the blob, so they all move to the rendition together
+    update_rendition(media_id, path, size, status)
+
+
+def _job_media(job):
+    """The job's media row, or another row sharing its blob if that one was deleted meanwhile"""
+    media = db.fetch_one("SELECT id, path, content_hash FROM media WHERE id = ?", (job["media_id"],))
+    if not media and job.get("src_path"):
+        media = db.fetch_one("SELECT id, path, content_hash FROM media WHERE path = ? ORDER BY id LIMIT 1", (job["src_path"],))
+    return media
+
+
+def transcode_job(job, progress):
+    media = _job_media(job)
+    if not media:
+        raise RuntimeError("Media not found")
+    src = Path(job["src_path"] or media["path"])
+    if not src.exists():
+        raise RuntimeError(f"Source file missing: {src}")
+    try:
+        info = probe_media(src)
+    except FileNotFoundError:
+        # No ffmpeg on this machine: keep the upload as-is, like before the job queue existed
+        logger.warning("ffprobe not found, keeping %s without transcoding", src)
+        _finish_media(media["id"], src)
+        return
+    action, reason = plan_ingest(src, info)
+    logger.info("Ingest plan for media %s (%s): %s (%s)", media["id"], src.name, action, reason)
+    if action == "keep":
+        _finish_media(media["id"], src)
+        return
+
+    video = primary_video_stream(info)
+    duration = parse_rate((info or {}).get("format", {}).get("duration")) or probe_duration(src)
+    # The rendition lives next to the blob's other derived files; the blob keeps its
+    # original bytes so its name stays the hash of its content
+    rendition_dir = derived_dir(derived_key(media))
+    rendition_dir.mkdir(parents=True, exist_ok=True)
+    out = rendition_dir / "rendition.transcoding.mp4"
+    try:
+        run_ffmpeg(job["id"], ingest_args(action, src, out, video), duration, progress)
+    except BaseException:
+        out.unlink(missing_ok=True)
+        raise
+    final = rendition_dir / "rendition.mp4"
+    out.replace(final)
+    if not media.get("content_hash"):
+        # Legacy upload outside the blob store: the rendition replaces it
+        src.unlink(missing_ok=True)
+    _finish_media(media["id"], final)
+
+
+def _on_job_done(job, ok):
+    if job["kind"] == "transcode" and not ok and job.get("media_id"):
+        media = _job_media(job)
+        if media:
+            db.execute("""
+                UPDATE media SET status = 'failed'
+                WHERE id = ? OR (content_hash IS NOT NULL AND content_hash = (SELECT content_hash FROM media WHERE id = ?))
+            """, (media["id"], media["id"]))
+
+
+media_jobs.register_handler("transcode", transcode_job)
+media_jobs.add_done_hook(_on_job_done)
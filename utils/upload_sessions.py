@@ -0,0 +1,228 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+from database.db_manager import db
+from utils.config import config
+from utils.logger import logger
+from utils.media_ingest import WRITE_CHUNK_BYTES, detect_type, register_media
+from utils.media_store import incoming_path
+
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """Client-side problem with a session or chunk; status is the HTTP status to report"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def merge_ranges(ranges):
+    """Merge [start, end) pairs into sorted, non-overlapping ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(received, total):
+    missing, pos = [], 0
+    for start, end in received:
+        if start > pos:
+            missing.append([pos, start])
+        pos = max(pos, end)
+    if pos < total:
+        missing.append([pos, total])
+    return missing
+
+
+class UploadSessions:
+    """Resumable chunked uploads.
+
+    A session reserves an incoming file under MEDIA_DIR (pre-sized to the
+    announced length); chunks are written in place at their offset, each
+    verified against its own SHA-256, and recorded in upload_chunks. Sessions
+    are independent, so any number of uploads (and chunks of one upload) can
+    be in flight at once. finalize() checks coverage, hashes the whole file
+    and hands off to register_media like a one-shot upload.
+    """
+
+    def __init__(self, manager=db):
+        self.db = manager
+
+    def create(self, filename, media_type, size, priority=0):
+        if media_type not in ("video", "image", "text"):
+            raise UploadError(400, "Invalid media type")
+        if size is None or int(size) <= 0:
+            raise UploadError(400, "Size must be positive")
+        self.expire()
+        detected_type, suffix = detect_type(filename, media_type)
+        path = incoming_path(suffix)
+        with open(path, "wb") as f:
+            f.truncate(int(size))
+        session_id = uuid.uuid4().hex
+        self.db.execute("""
+            INSERT INTO upload_sessions (id, filename, media_type, priority, total_size, path, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 'open', datetime('now'), datetime('now'))
+        """, (session_id, filename, detected_type, int(priority or 0), int(size), str(path)))
+        return self.describe(session_id)
+
+    def _session(self, session_id, open_only=True):
+        row = self.db.fetch_one("SELECT * FROM upload_sessions WHERE id = ?", (session_id,))
+        if not row:
+            raise UploadError(404, "Upload session not found")
+        if open_only and row["status"] != "open":
+            raise UploadError(409, f"Upload session is {row['status']}")
+        return row
+
+    def received(self, session_id):
+        rows = self.db.fetch_all(
+            "SELECT start_offset, length FROM upload_chunks WHERE session_id = ?", (session_id,)
+        )
+        return merge_ranges([(r["start_offset"], r["start_offset"] + r["length"]) for r in rows])
+
+    def describe(self, session_id):
+        row = self._session(session_id, open_only=False)
+        received = self.received(session_id)
+        return {
+            "id": row["id"],
+            "filename": row["filename"],
+            "media_type": row["media_type"],
+            "status": row["status"],
+            "total_size": row["total_size"],
+            "received": received,
+            "missing": missing_ranges(received, row["total_size"]),
+            "received_bytes": sum(end - start for start, end in received),
+            "media_id": row.get("media_id"),
+            "max_chunk_bytes": MAX_CHUNK_BYTES,
+        }
+
+    def open_chunk(self, session_id, index, offset, length):
+        """Validate a chunk and return a ChunkWriter positioned at its offset"""
+        row = self._session(session_id)
+        if index < 0 or offset < 0:
+            raise UploadError(400, "Invalid chunk index or offset")
+        if length is not None and (length <= 0 or length > MAX_CHUNK_BYTES):
+            raise UploadError(413, f"Chunk length must be 1..{MAX_CHUNK_BYTES} bytes")
+        if length is not None and offset + length > row["total_size"]:
+            raise UploadError(416, "Chunk extends past the announced size")
+        return ChunkWriter(self, row, index, offset)
+
+    def record_chunk(self, session_id, index, offset, length, sha256):
+        self.db.execute("""
+            INSERT OR REPLACE INTO upload_chunks (session_id, idx, start_offset, length, sha256)
+            VALUES (?, ?, ?, ?, ?)
+        """, (session_id, index, offset, length, sha256))
+        self.db.execute("UPDATE upload_sessions SET updated_at = datetime('now') WHERE id = ?", (session_id,))
+
+    def finalize(self, session_id, sha256=None):
+        row = self._session(session_id)
+        received = self.received(session_id)
+        missing = missing_ranges(received, row["total_size"])
+        if missing:
+            raise UploadError(409, f"Upload incomplete, missing {missing[:5]}")
+        # Mark first so concurrent finalize calls cannot both register the file
+        with self.db.get_cursor() as cursor:
+            cursor.execute(
+                "UPDATE upload_sessions SET status = 'finalizing' WHERE id = ? AND status = 'open'", (session_id,)
+            )
+            if cursor.rowcount != 1:
+                raise UploadError(409, "Upload session is already being finalized")
+        path = Path(row["path"])
+        try:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(WRITE_CHUNK_BYTES), b""):
+                    digest.update(block)
+            content_hash = digest.hexdigest()
+            if sha256 and sha256.lower() != content_hash:
+                raise UploadError(422, "File checksum mismatch")
+        except BaseException:
+            self.db.execute("UPDATE upload_sessions SET status = 'open' WHERE id = ?", (session_id,))
+            raise
+        try:
+            result = register_media(
+                row["filename"], row["media_type"], path, row["total_size"], content_hash, row["priority"]
+            )
+        except Exception:
+            # register_media already removed the file; the session cannot be resumed
+            self._discard(row)
+            raise
+        self.db.execute("""
+            UPDATE upload_sessions SET status = 'done', media_id = ?, updated_at = datetime('now') WHERE id = ?
+        """, (result["id"], session_id))
+        self.db.execute("DELETE FROM upload_chunks WHERE session_id = ?", (session_id,))
+        return result
+
+    def abort(self, session_id):
+        row = self._session(session_id)
+        self._discard(row)
+
+    def _discard(self, row):
+        try:
+            Path(row["path"]).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("Could not remove partial upload %s: %s", row["path"], e)
+        self.db.execute("DELETE FROM upload_chunks WHERE session_id = ?", (row["id"],))
+        self.db.execute("DELETE FROM upload_sessions WHERE id = ?", (row["id"],))
+
+    def expire(self):
+        """Drop open sessions idle for longer than upload.session_ttl_hours (default 24)"""
+        hours = float(config.get("upload.session_ttl_hours", 24) or 24)
+        rows = self.db.fetch_all("""
+            SELECT * FROM upload_sessions
+            WHERE status = 'open' AND updated_at < datetime('now', ?)
+        """, (f"-{hours} hours",))
+        for row in rows:
+            logger.info("Expiring idle upload session %s (%s)", row["id"], row["filename"])
+            self._discard(row)
+        self.db.execute("DELETE FROM upload_sessions WHERE status = 'done' AND updated_at < datetime('now', ?)", (f"-{hours} hours",))
+
+
+class ChunkWriter:
+    """Writes one chunk in place while hashing it; the chunk only counts once commit() verifies it"""
+
+    def __init__(self, sessions, row, index, offset):
+        self.sessions = sessions
+        self.session_id = row["id"]
+        self.limit = row["total_size"]
+        self.index = index
+        self.offset = offset
+        self.length = 0
+        self.sha256 = hashlib.sha256()
+        self._f = open(row["path"], "r+b")
+        self._f.seek(offset)
+
+    def write(self, data):
+        if self.offset + self.length + len(data) > self.limit or self.length + len(data) > MAX_CHUNK_BYTES:
+            raise UploadError(416, "Chunk extends past the announced size")
+        self._f.write(data)
+        self.sha256.update(data)
+        self.length += len(data)
+
+    def commit(self, expected_sha256=None):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        digest = self.sha256.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            # Bytes stay in the file but the range is not recorded, so the client resends it
+            raise UploadError(422, "Chunk checksum mismatch")
+        if self.length == 0:
+            raise UploadError(400, "Empty chunk")
+        self.sessions.record_chunk(self.session_id, self.index, self.offset, self.length, digest)
+        return {"index": self.index, "offset": self.offset, "length": self.length, "sha256": digest}
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+# Global instance
+upload_sessions = UploadSessions()
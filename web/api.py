@@ -1,22 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Depends, Response
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Depends, Response, WebSocket
 from fastapi.responses import JSONResponse, StreamingResponse
 from pathlib import Path
-import shutil
 import time
-import subprocess
 from database.db_manager import db
+from database.play_log_writer import play_log_writer
+from database.play_stats import rollup_play_stats
 from pydantic import BaseModel
 from typing import Optional
 from utils.command_bus import command_bus
 from datetime import datetime
-from utils.runtime_state import current as runtime_current, get_snapshot
+from utils.runtime_state import current as runtime_current, get_snapshot_versioned, note_snapshot_request
 import hashlib
 import json
+import csv
+import io
+from starlette.concurrency import run_in_threadpool
 
 import uuid
 import re
+import asyncio
 import requests
-from utils.config import MEDIA_DIR as MEDIA_ROOT
+from utils.media_jobs import media_jobs
+import utils.transcode  # registers the "transcode" job handler
+import utils.media_probe  # registers the "probe" job handler
+import utils.media_proxy  # registers the "proxy" job handler
+from utils.media_thumbs import thumbnails
+from web.file_response import MediaFileResponse
+from web.preview_stream import MJPEG_BOUNDARY, mjpeg_part, preview_stream
+from utils.preview_hls import hls_preview
+from utils.camera_capture import camera_capture
+from utils.screen_health import screen_health
+from utils.media_ingest import HashingWriter, WRITE_CHUNK_BYTES, detect_type, register_media
+from utils.media_store import derived_key, incoming_path, remove_media
+from utils.upload_sessions import UploadError, upload_sessions
 
 router = APIRouter()
 
@@ -60,6 +76,28 @@ class CameraConfigUpdate(BaseModel):
     password: Optional[str] = None
     notes: Optional[str] = None
 
+COMMAND_TIMEOUT_SECONDS = 5.0
+
+
+async def _send_command(command: str, data=None) -> dict:
+    """Push a command to the player (Qt main thread) and wait for its acknowledgement"""
+    started = time.perf_counter()
+    pending = command_bus.send(command, data)
+    future = asyncio.wrap_future(pending)
+    try:
+        result = await asyncio.wait_for(asyncio.shield(future), COMMAND_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # The caller is told it did not happen, so it must not run later either. A command
+        # the main thread has already started cannot be withdrawn and still completes.
+        cancelled = pending.cancel()
+        return {"acknowledged": False, "result": None, "latency_ms": None, "cancelled": cancelled}
+    return {
+        "acknowledged": True,
+        "result": result,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
 def _validate_hhmm(value: Optional[str]) -> Optional[str]:
     if value is None or value == "":
         return None
@@ -132,143 +170,144 @@ async def auth_check(request: Request):
 async def upload_media(
     file: UploadFile = File(...),
     media_type: str = Form(...),
+    priority: int = Form(0),
     user_id: int = Depends(get_current_user)
 ):
-    """上传媒体文件"""
+    """上传媒体文件（multipart，兼容旧客户端；大文件请用 /upload/stream）"""
     if media_type not in ['video', 'image', 'text']:
         raise HTTPException(status_code=400, detail="Invalid media type")
 
     original_name = file.filename or ""
-    ext = Path(original_name).suffix.lower()
-    image_exts = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".pngg"}
-    video_exts = {".mp4", ".mov", ".mkv", ".avi", ".webm", ".ogg"}
-    text_exts = {".txt"}
-
-    detected_type = media_type
-    if ext in image_exts:
-        detected_type = "image"
-    elif ext in text_exts:
-        detected_type = "text"
-    elif ext in video_exts:
-        detected_type = "video"
-
-    normalized_suffix = ".png" if ext == ".pngg" else ext
-
-    # 保存文件
-    media_dir = MEDIA_ROOT / detected_type
-    media_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Generate unique, safe filename
-    # Use timestamp + short uuid + extension to ensure ASCII-only path
-    timestamp = int(time.time())
-    safe_filename = f"{timestamp}_{str(uuid.uuid4())[:8]}{normalized_suffix}"
-    
-    file_path = media_dir / safe_filename
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # 如果是视频，确保格式为 MP4 (H.264/AAC)
-    if detected_type == 'video':
+    detected_type, suffix = detect_type(original_name, media_type)
+    file_path = incoming_path(suffix)
+
+    def save():
+        writer = HashingWriter(file_path)
         try:
-            should_convert = False
-            if file_path.suffix.lower() != ".mp4":
-                should_convert = True
-            else:
-                # Check codec for existing MP4
-                try:
-                    check_cmd = [
-                        "ffprobe", "-v", "error", 
-                        "-select_streams", "v:0", 
-                        "-show_entries", "stream=codec_name", 
-                        "-of", "default=noprint_wrappers=1:nokey=1", 
-                        str(file_path)
-                    ]
-                    # Use creationflags for Windows to hide console window
-                    startupinfo = None
-                    if hasattr(subprocess, 'STARTUPINFO'):
-                        startupinfo = subprocess.STARTUPINFO()
-                        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                        
-                    res = subprocess.run(
-                        check_cmd, 
-                        stdout=subprocess.PIPE, 
-                        stderr=subprocess.PIPE, 
-                        text=True,
-                        startupinfo=startupinfo
-                    )
-                    codec = res.stdout.strip()
-                    if codec != "h264":
-                        should_convert = True
-                except Exception:
-                    # If check fails, assume safe to leave alone or maybe convert?
-                    # Let's assume if we can't probe, we might as well try to convert if we want to be safe,
-                    # but maybe better to just leave it to avoid breaking valid files.
-                    pass
-
-            if should_convert:
-                output_path = file_path.with_suffix(".mp4")
-                # If path is same (e.g. replacing h265 mp4), use temp file
-                if output_path == file_path:
-                    output_path = file_path.with_name(f"temp_{file_path.name}")
-                
-                cmd = [
-                    "ffmpeg", "-y",
-                    "-i", str(file_path),
-                    "-c:v", "libx264",
-                    "-preset", "medium",
-                    "-crf", "18",
-                    "-pix_fmt", "yuv420p",
-                    "-c:a", "aac",
-                    "-b:a", "192k",
-                    str(output_path)
-                ]
-                
-                startupinfo = None
-                if hasattr(subprocess, 'STARTUPINFO'):
-                    startupinfo = subprocess.STARTUPINFO()
-                    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo)
-                
-                if result.returncode == 0 and output_path.exists():
-                    try:
-                        if output_path != file_path:
-                            file_path.unlink(missing_ok=True)
-                            output_path.rename(file_path)
-                        # If we used a temp name that wasn't rename, we should handle that, 
-                        # but here rename(file_path) overwrites original.
-                    except Exception:
-                        pass
-                    # file_path is now the converted file (or original name with new content)
-        except Exception:
-            # ffmpeg 不存在或转码失败时，保留原文件
-            pass
-    
-    # 计算文件大小（以最终保存文件为准）
-    file_size = getattr(file, "size", None)
-    try:
-        file_size = file_path.stat().st_size
-    except Exception:
-        pass
-    
-    # 保存到数据库
-    try:
-        media_id = db.execute("""
-            INSERT INTO media (name, type, path, upload_time, file_size)
-            VALUES (?, ?, ?, datetime('now'), ?)
-        """, (original_name, detected_type, str(file_path), file_size))
-        
-        return {"status": "success", "id": media_id, "path": str(file_path)}
+            writer.copy_from(file.file)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close(), writer.size
+
+    # 在线程池中写盘并计算哈希，不阻塞事件循环
+    content_hash, file_size = await run_in_threadpool(save)
+    try:
+        return await run_in_threadpool(
+            register_media, original_name, detected_type, file_path, file_size, content_hash, priority
+        )
     except Exception as e:
-        # If DB fails, remove file
-        if file_path.exists():
-            file_path.unlink()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/upload/stream")
+async def upload_media_stream(
+    request: Request,
+    filename: str,
+    media_type: str = "video",
+    priority: int = 0,
+    user_id: int = Depends(get_current_user)
+):
+    """流式上传：请求体即文件内容，边接收边写入最终位置并计算 SHA-256"""
+    if media_type not in ['video', 'image', 'text']:
+        raise HTTPException(status_code=400, detail="Invalid media type")
+
+    detected_type, suffix = detect_type(filename, media_type)
+    file_path = incoming_path(suffix)
+    writer = await run_in_threadpool(HashingWriter, file_path)
+    pending = bytearray()
+    try:
+        async for chunk in request.stream():
+            pending += chunk
+            if len(pending) >= WRITE_CHUNK_BYTES:
+                data, pending = bytes(pending), bytearray()
+                await run_in_threadpool(writer.write, data)
+        if pending:
+            await run_in_threadpool(writer.write, bytes(pending))
+        content_hash = await run_in_threadpool(writer.close)
+    except BaseException:
+        # Client disconnects surface here as ClientDisconnect / cancellation
+        await run_in_threadpool(writer.abort)
+        raise
+    if writer.size == 0:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Empty upload")
+    try:
+        return await run_in_threadpool(
+            register_media, filename, detected_type, file_path, writer.size, content_hash, priority
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    media_type: str = "video"
+    priority: int = 0
+
+async def _upload_call(fn, *args):
+    try:
+        return await run_in_threadpool(fn, *args)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+@router.post("/upload/sessions")
+async def create_upload_session(data: UploadSessionCreate, user_id: int = Depends(get_current_user)):
+    """创建断点续传上传会话"""
+    return await _upload_call(upload_sessions.create, data.filename, data.media_type, data.size, data.priority)
+
+@router.get("/upload/sessions/{session_id}")
+async def get_upload_session(session_id: str, user_id: int = Depends(get_current_user)):
+    """查询已接收的字节区间与缺失区间"""
+    return await _upload_call(upload_sessions.describe, session_id)
+
+@router.put("/upload/sessions/{session_id}/chunks/{index}")
+async def put_upload_chunk(
+    session_id: str,
+    index: int,
+    offset: int,
+    request: Request,
+    user_id: int = Depends(get_current_user)
+):
+    """上传一个分块：请求体写入目标文件的 offset 处，X-Chunk-SHA256 头用于校验"""
+    length = request.headers.get("content-length")
+    writer = await _upload_call(upload_sessions.open_chunk, session_id, index, offset, int(length) if length else None)
+    pending = bytearray()
+    try:
+        async for chunk in request.stream():
+            pending += chunk
+            if len(pending) >= WRITE_CHUNK_BYTES:
+                data, pending = bytes(pending), bytearray()
+                await _upload_call(writer.write, data)
+        if pending:
+            await _upload_call(writer.write, bytes(pending))
+        return await _upload_call(writer.commit, request.headers.get("x-chunk-sha256"))
+    finally:
+        writer.close()
+
+@router.post("/upload/sessions/{session_id}/finalize")
+async def finalize_upload_session(session_id: str, sha256: Optional[str] = None, user_id: int = Depends(get_current_user)):
+    """所有分块到齐后完成上传，登记媒体并进入处理队列"""
+    try:
+        return await _upload_call(upload_sessions.finalize, session_id, sha256)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/upload/sessions/{session_id}")
+async def abort_upload_session(session_id: str, user_id: int = Depends(get_current_user)):
+    """放弃上传会话并删除已写入的数据"""
+    await _upload_call(upload_sessions.abort, session_id)
+    return {"status": "success"}
+
 @router.post("/schedule")
 async def create_schedule(data: ScheduleCreate, user_id: int = Depends(get_current_user)):
     """创建播放计划"""
+    media = db.fetch_one("SELECT status FROM media WHERE id = ?", (data.media_id,))
+    if not media:
+        raise HTTPException(status_code=404, detail="Media not found")
+    if (media.get("status") or "ready") != "ready":
+        raise HTTPException(status_code=409, detail="Media is still processing")
     try:
         schedule_id = db.execute("""
             INSERT INTO schedules 
@@ -290,6 +329,22 @@ async def create_schedule(data: ScheduleCreate, user_id: int = Depends(get_curre
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs")
+async def list_media_jobs(status: Optional[str] = None, limit: int = 100):
+    """后台媒体任务列表"""
+    try:
+        return {"data": media_jobs.list(status, max(1, min(limit, 1000))), "stats": media_jobs.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+async def get_media_job(job_id: int):
+    """后台媒体任务状态与进度"""
+    job = media_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"data": job}
+
 @router.get("/system/screens")
 async def get_screens():
     try:
@@ -316,7 +371,7 @@ async def set_output(data: OutputSet, user_id: int = Depends(get_current_user)):
             raise HTTPException(status_code=400, detail="Invalid mode")
         targets = data.targets or []
         scale_mode = (data.scale_mode or "").lower() if data.scale_mode else None
-        command_bus.send("OUTPUT_SET", {"mode": mode, "targets": targets, "scale_mode": scale_mode})
+        ack = await _send_command("OUTPUT_SET", {"mode": mode, "targets": targets, "scale_mode": scale_mode})
         try:
             tjson = json.dumps(targets, ensure_ascii=False)
         except Exception:
@@ -327,7 +382,7 @@ async def set_output(data: OutputSet, user_id: int = Depends(get_current_user)):
             SET output_mode = ?, output_targets = ?, extended_scale_mode = ?
             WHERE id = 1
         """, (mode, tjson, scale_mode))
-        return {"status": "success"}
+        return {"status": "success", "ack": ack}
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -389,6 +444,7 @@ async def update_camera_config(data: CameraConfigUpdate, user_id: int = Depends(
         params.append(1)
         sql = f"UPDATE camera_config SET {', '.join(updates)} WHERE id = ?"
         db.execute(sql, tuple(params))
+        await run_in_threadpool(camera_capture.sync)
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -404,8 +460,8 @@ async def test_color(data: TestColor, user_id: int = Depends(get_current_user)):
         if not isinstance(color, str) or not color:
             raise HTTPException(status_code=400, detail="Invalid color")
         targets = data.targets or []
-        command_bus.send("OUTPUT_TEST_COLOR", {"targets": targets, "color": color})
-        return {"status": "success"}
+        ack = await _send_command("OUTPUT_TEST_COLOR", {"targets": targets, "color": color})
+        return {"status": "success", "ack": ack}
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -420,14 +476,52 @@ async def get_media_list():
         used_media_rows = db.fetch_all("SELECT DISTINCT media_id FROM schedules")
         used_media_ids = {row['media_id'] for row in used_media_rows}
         
-        # Add is_used flag
+        # Add is_used flag, the preview proxy URL (versioned, so it can be cached for good)
+        # and thumbnail URLs; missing thumbnails are queued, never generated here
+        thumb_entries = thumbnails.entries({derived_key(media) for media in media_list})
         for media in media_list:
             media['is_used'] = media['id'] in used_media_ids
+            media['proxy_url'] = _proxy_url(media)
+            media['thumbnails'] = thumbnails.urls(thumb_entries.get(derived_key(media)))
+            if (not media['thumbnails'] and media['type'] in ('video', 'image')
+                    and (media.get('status') or 'ready') == 'ready'):
+                thumbnails.request(media)
             
         return {"data": media_list}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+PROXY_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _proxy_url(media):
+    if not media.get('proxy_path'):
+        return None
+    version = (media.get('content_hash') or str(media.get('probed_at') or ''))[:12]
+    return f"/api/media/{media['id']}/proxy?v={version}"
+
+@router.api_route("/media/{media_id}/proxy", methods=["GET", "HEAD"])
+async def get_media_proxy(media_id: int, request: Request):
+    """低码率预览版本（360p 视频 / 缩小的 JPEG 图片），供网页预览使用"""
+    media = db.fetch_one("SELECT proxy_path FROM media WHERE id = ?", (media_id,))
+    if not media or not media.get('proxy_path'):
+        raise HTTPException(status_code=404, detail="Preview proxy not available")
+    path = Path(media['proxy_path'])
+    try:
+        st = await run_in_threadpool(path.stat)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Preview proxy not available")
+    return MediaFileResponse(path, st, request.headers, method=request.method, cache_control=PROXY_CACHE_CONTROL)
+
+@router.get("/thumbs/{key}/{name}")
+async def get_thumbnail(key: str, name: str, request: Request):
+    """缩略图/封面帧/拖动预览雪碧图（按内容哈希缓存，内容不变故可长期缓存）"""
+    path = thumbnails.file(key, name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    await run_in_threadpool(thumbnails.touch, key)
+    st = await run_in_threadpool(path.stat)
+    return MediaFileResponse(path, st, request.headers, method=request.method, cache_control=PROXY_CACHE_CONTROL)
+
 @router.delete("/media/{media_id}")
 async def delete_media(media_id: int, user_id: int = Depends(get_current_user)):
     """删除媒体文件"""
@@ -437,19 +531,10 @@ async def delete_media(media_id: int, user_id: int = Depends(get_current_user)):
         if schedule_count and schedule_count['count'] > 0:
             raise HTTPException(status_code=400, detail="Cannot delete media that is currently scheduled")
             
-        # Get file path
-        media = db.fetch_one("SELECT path FROM media WHERE id = ?", (media_id,))
-        if not media:
+        # Delete the row; the file goes only when no other media row shares it
+        if not await run_in_threadpool(remove_media, media_id):
             raise HTTPException(status_code=404, detail="Media not found")
-            
-        # Delete from DB
-        db.execute("DELETE FROM media WHERE id = ?", (media_id,))
-        
-        # Delete from filesystem
-        file_path = Path(media['path'])
-        if file_path.exists():
-            file_path.unlink()
-            
+
         return {"status": "success"}
     except HTTPException as he:
         raise he
@@ -563,107 +648,241 @@ async def reorder_schedules(order: list[int], user_id: int = Depends(get_current
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+LOG_EXPORT_BATCH = 1000
+LOG_EXPORT_COLUMNS = ["id", "media_id", "media_name", "schedule_id", "start_time", "end_time", "duration_seconds"]
+
+
+def _validate_date(value: Optional[str]) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    try:
+        if not re.match(r"^\d{4}-\d{2}-\d{2}$", value):
+            raise ValueError
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+    return value
+
+
+def _play_log_filters(start_date: Optional[str], end_date: Optional[str]):
+    start_date = _validate_date(start_date)
+    end_date = _validate_date(end_date)
+    where = []
+    params = []
+    if start_date:
+        where.append("l.start_time >= ?")
+        params.append(f"{start_date}T00:00:00")
+    if end_date:
+        where.append("l.end_time <= ?")
+        params.append(f"{end_date}T23:59:59")
+    return where, params
+
+
+def _parse_log_cursor(after: str):
+    """Parse a keyset cursor of the form '<start_time>,<id>'"""
+    try:
+        start_time, log_id = after.rsplit(",", 1)
+        return start_time, int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected <start_time>,<id>")
+
+
+def _fetch_play_log_page(where, params, after, limit):
+    where = list(where)
+    params = list(params)
+    if after:
+        where.append("(l.start_time, l.id) < (?, ?)")
+        params.extend(after)
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    sql = f"""
+        SELECT l.*, m.name as media_name
+        FROM play_logs l
+        JOIN media m ON l.media_id = m.id
+        {where_sql}
+        ORDER BY l.start_time DESC, l.id DESC
+        LIMIT ?
+    """
+    params.append(limit)
+    return db.fetch_all(sql, tuple(params))
+
+
 @router.get("/logs")
-async def get_play_logs(limit: int = 100, page: int = 1, start_date: Optional[str] = None, end_date: Optional[str] = None):
-    """播放日志明细"""
+async def get_play_logs(limit: int = 100, page: int = 1, start_date: Optional[str] = None, end_date: Optional[str] = None, after: Optional[str] = None):
+    """播放日志明细（?after=<start_time,id> 使用游标分页）"""
+    try:
+        limit = max(1, min(limit, 1000))
+        where, params = _play_log_filters(start_date, end_date)
+        if after:
+            logs = _fetch_play_log_page(where, params, _parse_log_cursor(after), limit)
+        else:
+            where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+            offset = max(0, (page - 1) * limit)
+            sql = f"""
+                SELECT l.*, m.name as media_name
+                FROM play_logs l
+                JOIN media m ON l.media_id = m.id
+                {where_sql}
+                ORDER BY l.start_time DESC, l.id DESC
+                LIMIT ? OFFSET ?
+            """
+            params.extend([limit, offset])
+            logs = db.fetch_all(sql, tuple(params))
+        next_after = None
+        if len(logs) == limit:
+            next_after = f"{logs[-1]['start_time']},{logs[-1]['id']}"
+        return {"data": logs, "next_after": next_after}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/logs/export")
+async def export_play_logs(format: str = "csv", start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """导出播放日志（CSV / NDJSON 流式输出）"""
+    fmt = (format or "").lower()
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Invalid format, expected csv or ndjson")
+    where, params = _play_log_filters(start_date, end_date)
+
+    async def generate():
+        # Walk the log in keyset batches so memory stays bounded for any date range
+        if fmt == "csv":
+            yield "\ufeff" + ",".join(LOG_EXPORT_COLUMNS) + "\r\n"
+        after = None
+        while True:
+            rows = await run_in_threadpool(_fetch_play_log_page, where, params, after, LOG_EXPORT_BATCH)
+            if not rows:
+                break
+            out = io.StringIO()
+            if fmt == "csv":
+                writer = csv.writer(out)
+                for row in rows:
+                    writer.writerow([row.get(c) for c in LOG_EXPORT_COLUMNS])
+            else:
+                for row in rows:
+                    out.write(json.dumps({c: row.get(c) for c in LOG_EXPORT_COLUMNS}, ensure_ascii=False))
+                    out.write("\n")
+            yield out.getvalue()
+            if len(rows) < LOG_EXPORT_BATCH:
+                break
+            after = (rows[-1]["start_time"], rows[-1]["id"])
+
+    filename = f"play_logs_{start_date or 'all'}_{end_date or 'all'}.{fmt}"
+    media_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(generate(), media_type=media_type, headers=headers)
+
+@router.get("/logs/stats")
+async def get_play_stats(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """播放统计（每媒体），读取预聚合表"""
+    try:
+        await run_in_threadpool(rollup_play_stats)
+        if not start_date and not end_date:
+            stats = db.fetch_all("""
+                SELECT m.id as media_id, m.name as media_name,
+                       COALESCE(t.play_count, 0) as play_count, COALESCE(t.total_seconds, 0) as total_seconds
+                FROM media m
+                LEFT JOIN play_stats_total t ON t.media_id = m.id
+                ORDER BY total_seconds DESC
+            """)
+            return {"data": stats}
+        where = []
+        params = []
+        if start_date:
+            where.append("d.day >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("d.day <= ?")
+            params.append(end_date)
+        stats = db.fetch_all(f"""
+            SELECT m.id as media_id, m.name as media_name,
+                   COALESCE(SUM(d.play_count), 0) as play_count, COALESCE(SUM(d.total_seconds), 0) as total_seconds
+            FROM media m
+            LEFT JOIN play_stats_daily d ON d.media_id = m.id AND {" AND ".join(where)}
+            GROUP BY m.id, m.name
+            ORDER BY total_seconds DESC
+        """, tuple(params))
+        return {"data": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/logs/stats/daily")
+async def get_play_stats_daily(start_date: Optional[str] = None, end_date: Optional[str] = None, media_id: Optional[int] = None):
+    """按天播放统计"""
     try:
+        await run_in_threadpool(rollup_play_stats)
         where = []
         params = []
         if start_date:
-            where.append("l.start_time >= ?")
-            params.append(f"{start_date}T00:00:00")
+            where.append("day >= ?")
+            params.append(start_date)
         if end_date:
-            where.append("l.end_time <= ?")
-            params.append(f"{end_date}T23:59:59")
+            where.append("day <= ?")
+            params.append(end_date)
+        if media_id is not None:
+            where.append("media_id = ?")
+            params.append(media_id)
         where_sql = ("WHERE " + " AND ".join(where)) if where else ""
-        offset = max(0, (page - 1) * limit)
-        sql = f"""
-            SELECT l.*, m.name as media_name
-            FROM play_logs l
-            JOIN media m ON l.media_id = m.id
+        rows = db.fetch_all(f"""
+            SELECT day, SUM(play_count) as play_count, SUM(total_seconds) as total_seconds
+            FROM play_stats_daily
             {where_sql}
-            ORDER BY l.start_time DESC
-            LIMIT ? OFFSET ?
-        """
-        params.extend([limit, offset])
-        logs = db.fetch_all(sql, tuple(params))
-        return {"data": logs}
+            GROUP BY day
+            ORDER BY day ASC
+        """, tuple(params))
+        return {"data": rows}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/logs/stats")
-async def get_play_stats():
-    """播放统计（每媒体）"""
+@router.get("/logs/writer")
+async def get_play_log_writer_stats():
+    """播放日志写入队列状态"""
     try:
-        stats = db.fetch_all("""
-            SELECT m.id as media_id, m.name as media_name, 
-                   COUNT(l.id) as play_count, COALESCE(SUM(l.duration_seconds), 0) as total_seconds
-            FROM media m
-            LEFT JOIN play_logs l ON l.media_id = m.id
-            GROUP BY m.id, m.name
-            ORDER BY total_seconds DESC
-        """)
-        return {"data": stats}
+        return {"data": play_log_writer.stats()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-        
+
 @router.get("/camera/snapshot")
-async def get_camera_snapshot():
+async def get_camera_snapshot(request: Request, camera_id: int = 1):
+    """摄像头最新画面（由常驻采集进程缓存在内存中，立即返回；X-Frame-Time 为采集时间）"""
     try:
-        row = db.fetch_one("SELECT enabled, stream_url, username, password FROM camera_config WHERE id = 1")
-        if not row or not (row.get("enabled") or 0):
+        worker = camera_capture.worker(camera_id)
+        if worker is None:
             return Response(status_code=204)
-        url = (row.get("stream_url") or "").strip()
-        if not url:
-            return Response(status_code=204)
-        username = row.get("username") or None
-        password = row.get("password") or None
-        final_url = url
-        if username and final_url.startswith("rtsp://") and "@" not in final_url:
-            auth = username
-            if password:
-                auth = f"{auth}:{password}"
-            final_url = "rtsp://" + auth + "@" + final_url[len("rtsp://"):]
-        cmd = [
-            "ffmpeg",
-            "-rtsp_transport",
-            "tcp",
-            "-i",
-            final_url,
-            "-frames:v",
-            "1",
-            "-f",
-            "image2pipe",
-            "-vcodec",
-            "mjpeg",
-            "pipe:1",
-        ]
-        startupinfo = None
-        if hasattr(subprocess, "STARTUPINFO"):
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        try:
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=10,
-                startupinfo=startupinfo,
-            )
-        except Exception:
-            raise HTTPException(status_code=500, detail="capture_failed")
-        if result.returncode != 0 or not result.stdout:
-            raise HTTPException(status_code=500, detail="capture_failed")
+        data, captured_at, seq = worker.latest()
+        if data is None:
+            # Still connecting (or reconnecting): nothing captured yet
+            return Response(status_code=204, headers={"Retry-After": "1"})
+        etag = f'"cam{camera_id}-{worker.boot}-{seq}"'
         headers = {
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
+            "Cache-Control": "no-cache",
+            "ETag": etag,
+            "X-Frame-Time": datetime.fromtimestamp(captured_at).isoformat(timespec="milliseconds"),
+            "X-Frame-Age-Ms": str(int((time.time() - captured_at) * 1000)),
         }
-        return Response(content=result.stdout, media_type="image/jpeg", headers=headers)
-    except HTTPException:
-        raise
+        inm = request.headers.get("if-none-match")
+        if inm and etag in [tag.strip().removeprefix("W/") for tag in inm.split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(content=data, media_type="image/jpeg", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-        
+
+@router.get("/camera/status")
+async def get_camera_status():
+    """摄像头采集进程状态（连接状态、重连次数、最新画面时间）"""
+    return {"data": [worker.status() for worker in list(camera_capture.workers.values())]}
+
+@router.get("/screen_health")
+async def get_screen_health(limit: int = 100):
+    """屏幕健康检测：最新结果、最近检测记录与告警（摄像头画面与输出画面对比）"""
+    try:
+        limit = max(1, min(limit, 1000))
+        checks = db.fetch_all("SELECT * FROM screen_health_checks ORDER BY id DESC LIMIT ?", (limit,))
+        alerts = db.fetch_all("SELECT * FROM screen_health_alerts ORDER BY id DESC LIMIT 50")
+        return {"data": {"latest": screen_health.last_result, "checks": checks, "alerts": alerts}}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/status/current")
 async def get_current_status():
     """当前播放状态"""
@@ -673,19 +892,87 @@ async def get_current_status():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/preview/snapshot")
-async def get_preview_snapshot():
+async def get_preview_snapshot(request: Request):
+    """输出画面快照（有客户端请求时才采集；画面未变化时返回 304）"""
     try:
-        data = get_snapshot()
+        if note_snapshot_request():
+            command_bus.send("PREVIEW_DEMAND")
+        data, etag = get_snapshot_versioned()
+        headers = {"Cache-Control": "no-cache", "ETag": etag}
+        inm = request.headers.get("if-none-match")
+        if inm and etag in [tag.strip().removeprefix("W/") for tag in inm.split(",")]:
+            return Response(status_code=304, headers=headers)
         if not data:
-            return Response(status_code=204)
-        headers = {
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-        }
+            return Response(status_code=204, headers=headers)
         return Response(content=data, media_type="image/jpeg", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
         
+@router.get("/preview/stream.mjpg")
+async def get_preview_mjpeg():
+    """输出画面实时 MJPEG 流（multipart/x-mixed-replace，所有观看者共用一次编码）"""
+    async def parts():
+        async for jpeg in preview_stream.frames():
+            yield mjpeg_part(jpeg)
+
+    headers = {"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    return StreamingResponse(
+        parts(), media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}", headers=headers
+    )
+
+@router.websocket("/preview/ws")
+async def preview_websocket(websocket: WebSocket):
+    """输出画面实时流（WebSocket，每条二进制消息为一帧 JPEG；需 uvicorn 安装 websockets 支持）"""
+    await websocket.accept()
+
+    async def watch_close():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    async def send_frames():
+        async for jpeg in preview_stream.frames():
+            await websocket.send_bytes(jpeg)
+
+    # A static picture produces no frames, so the close has to be watched separately
+    tasks = {asyncio.create_task(send_frames()), asyncio.create_task(watch_close())}
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+HLS_FIRST_SEGMENT_TIMEOUT = 8.0
+
+@router.get("/preview/hls/live.m3u8")
+async def get_preview_hls_playlist():
+    """输出画面 HLS 直播列表（低码率，片段仅保存在内存中；有人观看时才编码）"""
+    if hls_preview.note_request():
+        command_bus.send("PREVIEW_DEMAND")
+    playlist = hls_preview.playlist()
+    if playlist is None:
+        # First viewer: wait for the encoder to cut its first segment
+        await run_in_threadpool(hls_preview.wait_ready, HLS_FIRST_SEGMENT_TIMEOUT)
+        playlist = hls_preview.playlist()
+    if playlist is None:
+        if not hls_preview.available:
+            raise HTTPException(status_code=503, detail="ffmpeg 不可用，无法生成 HLS 预览")
+        raise HTTPException(status_code=503, detail="HLS 预览尚未就绪")
+    return Response(
+        content=playlist,
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+@router.get("/preview/hls/{seq}.ts")
+async def get_preview_hls_segment(seq: int):
+    """HLS 预览片段"""
+    hls_preview.note_request()
+    data = hls_preview.segment(seq)
+    if data is None:
+        raise HTTPException(status_code=404, detail="片段已过期")
+    return Response(content=data, media_type="video/mp2t", headers={"Cache-Control": "max-age=60"})
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -764,24 +1051,26 @@ async def delete_schedule(schedule_id: int, user_id: int = Depends(get_current_u
 async def force_play_schedule(schedule_id: int, user_id: int = Depends(get_current_user)):
     """强制播放指定计划"""
     try:
-        command_bus.send("FORCE_PLAY", schedule_id)
-        return {"status": "success", "message": f"Command sent to play schedule {schedule_id}"}
+        ack = await _send_command("FORCE_PLAY", schedule_id)
+        return {"status": "success", "message": f"Command sent to play schedule {schedule_id}", "ack": ack}
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Schedule not found or its media is not ready")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
  
 @router.post("/control/scheduler/stop")
 async def stop_all_schedules(user_id: int = Depends(get_current_user)):
     try:
-        command_bus.send("STOP_ALL", None)
-        return {"status": "success"}
+        ack = await _send_command("STOP_ALL", None)
+        return {"status": "success", "ack": ack}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
  
 @router.post("/control/scheduler/start")
 async def start_all_schedules():
     try:
-        command_bus.send("START_ALL", None)
-        return {"status": "success"}
+        ack = await _send_command("START_ALL", None)
+        return {"status": "success", "ack": ack}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
  
@@ -0,0 +1,219 @@
+import mimetypes
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from starlette.responses import Response
+
+# Fallback streaming reads this much per worker-thread hop (vs 64 KB before)
+CHUNK_BYTES = 1024 * 1024
+# More ranges than this is treated as abuse and answered with the whole file
+MAX_RANGES = 16
+
+
+def file_etag(st):
+    """Strong validator from size and mtime; renditions are replaced atomically, so both change"""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_ranges(header, size):
+    """Parse a Range header into coalesced [(start, end_inclusive)].
+
+    None means "ignore the header" (absent, not bytes, malformed or too many
+    ranges); an empty list means every range is unsatisfiable.
+    """
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    ranges = []
+    for part in header.split("=", 1)[1].split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if first.strip() == "":
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(first)
+                if last.strip():
+                    end = int(last)
+                    if end < start:
+                        return None
+                    end = min(end, size - 1)
+                else:
+                    end = size - 1
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_list(value):
+    return [tag.strip() for tag in value.split(",")]
+
+
+def _http_date_matches(value, mtime, exact=False):
+    try:
+        ts = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) == int(ts) if exact else int(mtime) <= int(ts)
+
+
+def is_not_modified(headers, etag, mtime):
+    """RFC 9110 GET/HEAD revalidation: If-None-Match (weak compare) wins over If-Modified-Since"""
+    inm = headers.get("if-none-match")
+    if inm is not None:
+        tags = _etag_list(inm)
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+    ims = headers.get("if-modified-since")
+    return ims is not None and _http_date_matches(ims, mtime)
+
+
+def if_range_allows(headers, etag, mtime):
+    """If-Range: honour Range only if the client's copy is still current (strong compare)"""
+    value = headers.get("if-range")
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag
+    return _http_date_matches(value, mtime, exact=True)
+
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+
+class MediaFileResponse(Response):
+    """File response with single/multi Range, If-Range, ETag and 304 handling.
+
+    The body is streamed in large chunks read on a worker thread so the event
+    loop never blocks on disk I/O.
+    """
+
+    def __init__(self, path, stat_result, request_headers, method="GET", media_type=None, cache_control="no-cache"):
+        self.path = path
+        self.st = stat_result
+        self.send_body = method != "HEAD"
+        self.media_type = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+        self.background = None
+        self.ranges = []
+        self.boundary = None
+
+        size = stat_result.st_size
+        etag = file_etag(stat_result)
+        mtime = stat_result.st_mtime
+        headers = {
+            "accept-ranges": "bytes",
+            "cache-control": cache_control,
+            "etag": etag,
+            "last-modified": formatdate(mtime, usegmt=True),
+        }
+
+        status = 200
+        if is_not_modified(request_headers, etag, mtime):
+            status = 304
+        else:
+            ranges = parse_ranges(request_headers.get("range"), size)
+            if ranges is not None and if_range_allows(request_headers, etag, mtime):
+                if not ranges:
+                    status = 416
+                    headers["content-range"] = f"bytes */{size}"
+                    headers["content-length"] = "0"
+                else:
+                    status = 206
+                    self.ranges = ranges
+            if status == 200:
+                self.ranges = [(0, size - 1)] if size else []
+                headers["content-length"] = str(size)
+                headers["content-type"] = self.media_type
+            elif status == 206 and len(self.ranges) == 1:
+                start, end = self.ranges[0]
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+                headers["content-length"] = str(end - start + 1)
+                headers["content-type"] = self.media_type
+            elif status == 206:
+                self.boundary = uuid.uuid4().hex
+                headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+                headers["content-length"] = str(self._multipart_length())
+        if status in (304, 416):
+            self.ranges = []
+
+        self.status_code = status
+        self.init_headers(headers)
+
+    def _part_header(self, start, end):
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Type: {self.media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{self.st.st_size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing(self):
+        return f"--{self.boundary}--\r\n".encode("latin-1")
+
+    def _multipart_length(self):
+        total = len(self._closing())
+        for start, end in self.ranges:
+            total += len(self._part_header(start, end)) + (end - start + 1) + 2
+        return total
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.ranges:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        # Stop reading the file as soon as the client goes away (seeking video players abort a lot)
+        async with anyio.create_task_group() as tg:
+            async def watch_disconnect():
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        tg.cancel_scope.cancel()
+                        return
+
+            tg.start_soon(watch_disconnect)
+            await self._send_ranges(scope, send)
+            tg.cancel_scope.cancel()
+
+    async def _send_ranges(self, scope, send):
+        f = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            for i, (start, end) in enumerate(self.ranges):
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self._part_header(start, end), "more_body": True})
+                last_range = i == len(self.ranges) - 1
+                pos = start
+                while pos <= end:
+                    n = min(CHUNK_BYTES, end - pos + 1)
+                    data = await anyio.to_thread.run_sync(_read_at, f, pos, n)
+                    if not data:
+                        raise OSError(f"{self.path} shrank while being sent")
+                    pos += len(data)
+                    more = pos <= end or bool(self.boundary) or not last_range
+                    await send({"type": "http.response.body", "body": data, "more_body": more})
+                if self.boundary:
+                    await send({
+                        "type": "http.response.body",
+                        "body": b"\r\n" + (self._closing() if last_range else b""),
+                        "more_body": not last_range,
+                    })
+        finally:
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(f.close)
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+from utils.command_bus import command_bus
+from utils.config import config
+from utils.runtime_state import add_snapshot_listener, get_snapshot_versioned, note_snapshot_request
+
+MJPEG_BOUNDARY = "ledframe"
+# A viewer re-announces itself at least this often, which keeps capture awake
+DEMAND_REFRESH_SECONDS = 1.0
+
+
+def mjpeg_part(jpeg):
+    head = (
+        f"--{MJPEG_BOUNDARY}\r\n"
+        f"Content-Type: image/jpeg\r\n"
+        f"Content-Length: {len(jpeg)}\r\n\r\n"
+    ).encode("latin-1")
+    return head + jpeg + b"\r\n"
+
+
+class PreviewStream:
+    """Fans the shared output snapshot out to live viewers (MJPEG and WebSocket).
+
+    Frames are encoded once by OutputFrameCapture; every viewer only holds a
+    "newest version seen" marker and reads the current snapshot when it is
+    ready to send. A slow client therefore just skips frames: nothing is
+    queued per client and the capture loop never waits on a socket.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+        add_snapshot_listener(self._on_snapshot)
+
+    @property
+    def viewers(self):
+        return len(self._waiters)
+
+    def _on_snapshot(self):
+        # Called on the encoder thread
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def frames(self):
+        """JPEG frames for one viewer, newest only, at most preview.stream_fps per second"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        min_gap = 1.0 / float(config.get("preview.stream_fps", 5) or 5)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            sent_version = None
+            next_at = 0.0
+            while True:
+                event.clear()
+                if note_snapshot_request(stream=True):
+                    command_bus.send("PREVIEW_DEMAND")
+                data, version = get_snapshot_versioned()
+                if data and version != sent_version:
+                    delay = next_at - loop.time()
+                    if delay > 0:
+                        # Re-read after the pause so the freshest frame goes out
+                        await asyncio.sleep(delay)
+                        continue
+                    sent_version = version
+                    next_at = loop.time() + min_gap
+                    yield data
+                    continue
+                try:
+                    await asyncio.wait_for(event.wait(), DEMAND_REFRESH_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+# Global instance
+preview_stream = PreviewStream()
@@ -1,14 +1,16 @@
-from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-import mimetypes
+import stat
 import threading
 import uvicorn
 import os
 import sys
 from web.api import router as api_router
+from web.file_response import MediaFileResponse
 from utils.logger import logger
 from utils.config import WEB_DIR, MEDIA_DIR
 
@@ -30,83 +32,20 @@ templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 # Include API router
 app.include_router(api_router, prefix="/api")
 
-@app.get("/media_files/{file_path:path}")
-async def media_files(file_path: str, range: str = Header(None)):
+@app.api_route("/media_files/{file_path:path}", methods=["GET", "HEAD"])
+async def media_files(file_path: str, request: Request):
     base = MEDIA_DIR.resolve()
     full = (MEDIA_DIR / file_path).resolve()
     if base not in full.parents and full != base:
         raise HTTPException(status_code=404, detail="Not found")
-    if not full.exists() or not full.is_file():
+    try:
+        st = await run_in_threadpool(full.stat)
+    except OSError:
         raise HTTPException(status_code=404, detail="Not found")
-    
-    file_size = full.stat().st_size
-    media_type, _ = mimetypes.guess_type(str(full))
-    media_type = media_type or "application/octet-stream"
-
-    # Basic headers
-    headers = {
-        "Accept-Ranges": "bytes",
-        "Cache-Control": "no-store",
-    }
-
-    # Handle Range request manually for better compatibility
-    start = 0
-    end = file_size - 1
-    status_code = 200
-    content_length = file_size
-
-    if range:
-        try:
-            range_value = range.strip().replace("bytes=", "")
-            parts = range_value.split("-")
-            range_start = parts[0]
-            range_end = parts[1] if len(parts) > 1 else ""
-            
-            start = int(range_start) if range_start else 0
-            end = int(range_end) if range_end else file_size - 1
-            
-            if end >= file_size:
-                end = file_size - 1
-            
-            content_length = end - start + 1
-            status_code = 206
-            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
-        except Exception:
-            pass
-            
-    headers["Content-Length"] = str(content_length)
-
-    if not range:
-        return FileResponse(
-            path=str(full),
-            media_type=media_type,
-            headers=headers
-        )
-
-    def iterfile():
-        try:
-            with open(full, mode="rb") as file_like:
-                file_like.seek(start)
-                bytes_to_read = content_length
-                chunk_size = 1024 * 64
-                while bytes_to_read > 0:
-                    read_size = min(chunk_size, bytes_to_read)
-                    chunk = file_like.read(read_size)
-                    if not chunk:
-                        break
-                    yield chunk
-                    bytes_to_read -= len(chunk)
-        except (BrokenPipeError, ConnectionResetError):
-            return
-        except Exception:
-            return
-
-    return StreamingResponse(
-        iterfile(),
-        status_code=status_code,
-        headers=headers,
-        media_type=media_type
-    )
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="Not found")
+    # Range / multi-range / If-Range / ETag / 304 handling lives in MediaFileResponse
+    return MediaFileResponse(full, st, request.headers, method=request.method)
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):